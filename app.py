@@ -1,18 +1,28 @@
 from __future__ import annotations
 
 import logging
+from dataclasses import replace
 from pathlib import Path
 from threading import Event, Lock
 
 import gradio as gr
 
 from auto_asr.config import get_config_path, load_config, update_config
+from auto_asr.endpoint_limits import load_endpoint_limits
+from auto_asr.endpoint_pool import parse_endpoint_configs
 from auto_asr.funasr_asr import (
     download_funasr_model,
     preload_funasr_model,
     release_funasr_resources,
 )
+from auto_asr.funasr_pool import shutdown_funasr_pool
+from auto_asr.inference_server import (
+    get_inference_client,
+    restart_inference_server,
+    start_inference_server,
+)
 from auto_asr.model_hub import get_models_dir, set_hf_endpoint
+from auto_asr.model_residency import configure_model_residency, policy_from_config
 from auto_asr.pipeline import transcribe_to_subtitles
 from auto_asr.qwen3_asr import (
     Qwen3ASRConfig,
@@ -20,6 +30,7 @@ from auto_asr.qwen3_asr import (
     preload_qwen3_model,
     release_qwen3_resources,
 )
+from auto_asr.runtime_tuning import configure_runtime_tuning, runtime_report, tuning_from_config
 from auto_asr.subtitle_processing.pipeline import (
     process_subtitle_file,
     process_subtitle_file_multi,
@@ -38,6 +49,9 @@ logger = logging.getLogger(__name__)
 
 _SAVED_CONFIG = load_config()
 _CONFIG_PATH = get_config_path()
+# Per-endpoint RPM/TPM/audio-seconds budgets shared by ASR and subtitle LLM calls
+# (config-file only), e.g. {"https://api.openai.com/v1": {"rpm": 500, "audio_seconds_pm": 7200}}.
+load_endpoint_limits(_SAVED_CONFIG.get("endpoint_rate_limits"))
 
 
 def _str(v: object | None) -> str:
@@ -51,6 +65,13 @@ def _int(v: object | None, default: int) -> int:
         return default
 
 
+def _float(v: object | None, default: float) -> float:
+    try:
+        return float(v)  # type: ignore[arg-type]
+    except Exception:
+        return default
+
+
 def _clamp_int(v: int, lo: int, hi: int) -> int:
     return max(lo, min(hi, v))
 
@@ -129,6 +150,23 @@ if DEFAULT_FUNASR_DEVICE not in {"auto", "cpu", "cuda:0"}:
 DEFAULT_FUNASR_LANGUAGE = _str(_SAVED_CONFIG.get("funasr_language", "auto")).strip() or "auto"
 DEFAULT_FUNASR_USE_ITN = bool(_SAVED_CONFIG.get("funasr_use_itn", True))
 DEFAULT_FUNASR_ENABLE_PUNC = bool(_SAVED_CONFIG.get("funasr_enable_punc", True))
+# FunASR on CPU: worker processes for VAD regions, torch threads per worker (0 = cores/processes)
+# and per-worker CPU pinning (config-file only; no UI control).
+FUNASR_CPU_PROCESSES = _clamp_int(_int(_SAVED_CONFIG.get("funasr_cpu_processes"), 1), 1, 64)
+FUNASR_CPU_THREADS = _clamp_int(_int(_SAVED_CONFIG.get("funasr_cpu_threads"), 0), 0, 256)
+FUNASR_CPU_AFFINITY = bool(_SAVED_CONFIG.get("funasr_cpu_affinity", False))
+# int8 CPU inference per local backend (config-file only; no UI control; ignored on CUDA).
+FUNASR_QUANTIZE = bool(_SAVED_CONFIG.get("funasr_quantize", False))
+QWEN3_QUANTIZE = bool(_SAVED_CONFIG.get("qwen3_quantize", False))
+# Qwen3-ASR batches sized by audio seconds from measured memory use, with OOM backoff; the batch
+# size slider then caps the item count. 0 MB budget = free RAM/VRAM at job start
+# (config-file only; no UI control).
+QWEN3_AUTO_BATCH = bool(_SAVED_CONFIG.get("qwen3_auto_batch", False))
+QWEN3_BATCH_MEMORY_MB = max(0.0, _float(_SAVED_CONFIG.get("qwen3_batch_memory_mb"), 0.0))
+# Qwen3-ASR decode cap per batch: max(min tokens, region seconds x tokens/s); 0 tokens/s disables
+# (config-file only; no UI control).
+QWEN3_MAX_NEW_TOKENS_PER_S = max(0.0, _float(_SAVED_CONFIG.get("qwen3_max_new_tokens_per_s"), 15.0))
+QWEN3_MIN_NEW_TOKENS = _clamp_int(_int(_SAVED_CONFIG.get("qwen3_min_new_tokens"), 48), 1, 1024)
 
 DEFAULT_QWEN3_MODEL = _str(_SAVED_CONFIG.get("qwen3_model", "Qwen/Qwen3-ASR-1.7B")).strip()
 QWEN3_ASR_HF_URL = "https://huggingface.co/Qwen/Qwen3-ASR-1.7B"
@@ -182,6 +220,46 @@ DEFAULT_VAD_SPEECH_MERGE_GAP_MS = _clamp_int(
     _int(_SAVED_CONFIG.get("vad_speech_merge_gap_ms"), 100), 0, 2000
 )
 DEFAULT_API_CONCURRENCY = _clamp_int(_int(_SAVED_CONFIG.get("api_concurrency"), 4), 1, 16)
+DEFAULT_ADAPTIVE_CONCURRENCY = bool(_SAVED_CONFIG.get("adaptive_concurrency", True))
+# Upper bound for adaptive concurrency (config-file only; no UI control).
+API_CONCURRENCY_MAX = _clamp_int(_int(_SAVED_CONFIG.get("api_concurrency_max"), 16), 1, 64)
+DEFAULT_ASR_CACHE = bool(_SAVED_CONFIG.get("asr_cache", True))
+# Size budget of the on-disk ASR result cache (config-file only; no UI control).
+ASR_CACHE_MAX_MB = _clamp_int(_int(_SAVED_CONFIG.get("asr_cache_max_mb"), 256), 16, 10240)
+DEFAULT_PARTIAL_RESULTS = bool(_SAVED_CONFIG.get("partial_results", False))
+# Per-region retry policy for upstream ASR requests (config-file only; no UI control).
+REGION_MAX_ATTEMPTS = _clamp_int(_int(_SAVED_CONFIG.get("region_max_attempts"), 5), 1, 20)
+REGION_RETRY_BASE_S = max(0.0, min(60.0, _float(_SAVED_CONFIG.get("region_retry_base_s"), 1.0)))
+REGION_RETRY_CAP_S = max(0.0, min(600.0, _float(_SAVED_CONFIG.get("region_retry_cap_s"), 30.0)))
+DEFAULT_HEDGE_REQUESTS = bool(_SAVED_CONFIG.get("hedge_requests", False))
+DEFAULT_STREAM_ASR = bool(_SAVED_CONFIG.get("stream_asr", False))
+DEFAULT_SILENCE_COMPRESS = bool(_SAVED_CONFIG.get("silence_compress", False))
+DEFAULT_UPLOAD_TEMPO = max(1.0, min(2.0, _float(_SAVED_CONFIG.get("upload_tempo"), 1.0)))
+# Silence compression thresholds (config-file only; no UI control).
+SILENCE_COMPRESS_MIN_S = max(
+    0.5, min(30.0, _float(_SAVED_CONFIG.get("silence_compress_min_s"), 2.0))
+)
+SILENCE_COMPRESS_KEEP_S = max(
+    0.0, min(SILENCE_COMPRESS_MIN_S, _float(_SAVED_CONFIG.get("silence_compress_keep_s"), 0.5))
+)
+# Hedging thresholds (config-file only; no UI control).
+HEDGE_PERCENTILE = max(0.5, min(0.999, _float(_SAVED_CONFIG.get("hedge_percentile"), 0.95)))
+HEDGE_BUDGET_RATIO = max(0.0, min(1.0, _float(_SAVED_CONFIG.get("hedge_budget_ratio"), 0.1)))
+# Extra OpenAI-compatible ASR servers load-balanced with the main endpoint (config-file only):
+# [{"base_url": "http://10.0.0.2:8000/v1", "api_key": "...", "weight": 2}, ...]
+_OPENAI_ENDPOINTS_RAW = _SAVED_CONFIG.get("openai_endpoints")
+# Local models stay loaded between jobs until idle this long, within RAM/VRAM budgets
+# (config-file only; 0 = no limit).
+# Keys: model_idle_ttl_s, model_ram_budget_mb, model_vram_budget_mb.
+configure_model_residency(policy_from_config(_SAVED_CONFIG))
+# Host FunASR/Qwen3 in a separate daemon, e.g. "http://127.0.0.1:8766"; with autostart the UI
+# spawns it at launch if nothing answers there (config-file only; no UI control).
+INFERENCE_SERVER_URL = _str(_SAVED_CONFIG.get("inference_server_url", "")).strip().rstrip("/")
+INFERENCE_SERVER_AUTOSTART = bool(_SAVED_CONFIG.get("inference_server_autostart", False))
+# Torch threads per backend, interop threads, allocator env and post-load warm-up
+# (config-file only: runtime_funasr_threads, runtime_qwen3_threads, runtime_interop_threads,
+# runtime_allocator_env, runtime_warmup). Applied before torch is first imported below.
+configure_runtime_tuning(tuning_from_config(_SAVED_CONFIG))
 CONFIG_NOTE = f"配置文件：`{_CONFIG_PATH}`"
 
 
@@ -245,6 +323,7 @@ logger.info(
     bool(DEFAULT_OPENAI_API_KEY),
 )
 logger.info("auto-asr CUDA 检测: available=%s, details=%s", CUDA_AVAILABLE, CUDA_DETAILS)
+logger.info("auto-asr 运行时设置: %s", runtime_report())
 
 _CANCEL_LOCK = Lock()
 _CURRENT_CANCEL_EVENT: Event | None = None
@@ -280,6 +359,38 @@ def _resolve_qwen3_device_ui(device: str) -> str:
     return d
 
 
+def _preload_funasr(*, model: str, device: str, enable_punc: bool) -> None:
+    if INFERENCE_SERVER_URL:
+        get_inference_client(INFERENCE_SERVER_URL).preload(
+            backend="funasr",
+            options={
+                "model": model,
+                "device": device,
+                "enable_punc": enable_punc,
+                "quantize": FUNASR_QUANTIZE,
+            },
+        )
+        return
+    preload_funasr_model(
+        model=model, device=device, enable_punc=enable_punc, quantize=FUNASR_QUANTIZE
+    )
+
+
+def _preload_qwen3(cfg: Qwen3ASRConfig) -> None:
+    if INFERENCE_SERVER_URL:
+        get_inference_client(INFERENCE_SERVER_URL).preload(
+            backend="qwen3asr",
+            options={
+                "model": cfg.model,
+                "device": cfg.device,
+                "max_inference_batch_size": cfg.max_inference_batch_size,
+                "quantize": QWEN3_QUANTIZE,
+            },
+        )
+        return
+    preload_qwen3_model(cfg=replace(cfg, quantize=QWEN3_QUANTIZE))
+
+
 def load_funasr_model_ui(
     funasr_model: str,
     funasr_device: str,
@@ -287,7 +398,7 @@ def load_funasr_model_ui(
 ) -> str:
     resolved_device = _resolve_funasr_device_ui(funasr_device)
     try:
-        preload_funasr_model(
+        _preload_funasr(
             model=(funasr_model or "").strip(),
             device=resolved_device,
             enable_punc=bool(funasr_enable_punc),
@@ -329,7 +440,7 @@ def prepare_funasr_model_ui(
     try:
         # Download first so the UI can show a deterministic "project-local models" message.
         download_funasr_model(model=model_name, enable_punc=bool(funasr_enable_punc))
-        preload_funasr_model(
+        _preload_funasr(
             model=model_name,
             device=resolved_device,
             enable_punc=bool(funasr_enable_punc),
@@ -351,7 +462,7 @@ def load_qwen3_model_ui(
 ) -> str:
     resolved_device = _resolve_qwen3_device_ui(qwen3_device)
     try:
-        preload_qwen3_model(
+        _preload_qwen3(
             cfg=Qwen3ASRConfig(
                 model=(qwen3_model or "").strip() or "Qwen/Qwen3-ASR-1.7B",
                 device=resolved_device,
@@ -397,7 +508,7 @@ def prepare_qwen3_model_ui(
     model_id = (qwen3_model or "").strip() or "Qwen/Qwen3-ASR-1.7B"
     try:
         local_dir = download_qwen3_models(model=model_id)
-        preload_qwen3_model(
+        _preload_qwen3(
             cfg=Qwen3ASRConfig(
                 # Always load from local dir to avoid triggering a second download path.
                 model=str(local_dir),
@@ -416,8 +527,17 @@ def prepare_qwen3_model_ui(
 
 
 def release_cuda_ui() -> str:
+    if INFERENCE_SERVER_URL:
+        # Restarting the daemon is what actually returns its memory to the OS.
+        try:
+            restart_inference_server(INFERENCE_SERVER_URL)
+        except Exception as e:
+            logger.exception("重启本地推理服务失败")
+            return f"释放失败：{e}"
+        return f"已重启本地推理服务（{INFERENCE_SERVER_URL}），模型内存已随进程退出释放。"
     try:
         release_funasr_resources()
+        shutdown_funasr_pool()
         release_qwen3_resources()
     except Exception as e:
         logger.exception("释放显存失败")
@@ -516,6 +636,13 @@ def _auto_save_settings(
     vad_speech_merge_gap_ms: int,
     upload_audio_format: str,
     api_concurrency: int,
+    adaptive_concurrency: bool,
+    asr_cache: bool,
+    partial_results: bool,
+    hedge_requests: bool,
+    stream_asr: bool,
+    silence_compress: bool,
+    upload_tempo: float,
     hf_endpoint: str,
 ) -> None:
     api_key = (openai_api_key or "").strip()
@@ -551,6 +678,13 @@ def _auto_save_settings(
         "vad_max_segment_threshold_s": int(vad_max_segment_threshold_s),
         "vad_segment_threshold_s": int(vad_segment_threshold_s),
         "api_concurrency": int(api_concurrency),
+        "adaptive_concurrency": bool(adaptive_concurrency),
+        "asr_cache": bool(asr_cache),
+        "partial_results": bool(partial_results),
+        "hedge_requests": bool(hedge_requests),
+        "stream_asr": bool(stream_asr),
+        "silence_compress": bool(silence_compress),
+        "upload_tempo": float(upload_tempo),
         "hf_endpoint": (hf_endpoint or "").strip() or DEFAULT_HF_ENDPOINT,
     }
 
@@ -584,10 +718,18 @@ def run_asr(
     vad_speech_merge_gap_ms: int,
     upload_audio_format: str,
     api_concurrency: int,
+    adaptive_concurrency: bool,
+    asr_cache: bool,
+    partial_results: bool,
+    hedge_requests: bool,
+    stream_asr: bool,
+    silence_compress: bool,
+    upload_tempo: float,
     qwen3_model: str,
     qwen3_device: str,
     qwen3_max_inference_batch_size: int,
     hf_endpoint: str = DEFAULT_HF_ENDPOINT,
+    progress=gr.Progress(),  # noqa: B008 - gradio injects the tracker via this default
 ):
     if not audio_path:
         raise gr.Error("请先上传或录制一段音频。")
@@ -653,6 +795,13 @@ def run_asr(
         vad_speech_merge_gap_ms=vad_speech_merge_gap_ms,
         upload_audio_format=upload_audio_format,
         api_concurrency=api_concurrency,
+        adaptive_concurrency=adaptive_concurrency,
+        asr_cache=asr_cache,
+        partial_results=partial_results,
+        hedge_requests=hedge_requests,
+        stream_asr=stream_asr,
+        silence_compress=silence_compress,
+        upload_tempo=upload_tempo,
         hf_endpoint=hf_endpoint,
     )
 
@@ -677,9 +826,19 @@ def run_asr(
             funasr_language=(funasr_language or "").strip() or DEFAULT_FUNASR_LANGUAGE,
             funasr_use_itn=bool(funasr_use_itn),
             funasr_enable_punc=bool(funasr_enable_punc),
+            funasr_cpu_processes=FUNASR_CPU_PROCESSES,
+            funasr_cpu_threads=FUNASR_CPU_THREADS,
+            funasr_cpu_affinity=FUNASR_CPU_AFFINITY,
+            funasr_quantize=FUNASR_QUANTIZE,
             qwen3_model=resolved_qwen3_model,
             qwen3_device=(qwen3_device or "").strip() or DEFAULT_QWEN3_DEVICE,
             qwen3_max_inference_batch_size=resolved_qwen3_max_batch,
+            qwen3_quantize=QWEN3_QUANTIZE,
+            qwen3_auto_batch=QWEN3_AUTO_BATCH,
+            qwen3_batch_memory_mb=QWEN3_BATCH_MEMORY_MB,
+            qwen3_max_new_tokens_per_s=QWEN3_MAX_NEW_TOKENS_PER_S,
+            qwen3_min_new_tokens=QWEN3_MIN_NEW_TOKENS,
+            inference_server_url=INFERENCE_SERVER_URL or None,
             enable_vad=enable_vad,
             vad_segment_threshold_s=int(vad_segment_threshold_s),
             vad_max_segment_threshold_s=int(vad_max_segment_threshold_s),
@@ -693,6 +852,26 @@ def run_asr(
             upload_audio_format=(upload_audio_format or "").strip() or "wav",
             upload_mp3_bitrate_kbps=int(UPLOAD_MP3_BITRATE_KBPS),
             api_concurrency=int(api_concurrency),
+            adaptive_concurrency=bool(adaptive_concurrency),
+            api_concurrency_max=API_CONCURRENCY_MAX,
+            asr_cache=bool(asr_cache),
+            asr_cache_max_mb=ASR_CACHE_MAX_MB,
+            partial_results=bool(partial_results),
+            region_max_attempts=REGION_MAX_ATTEMPTS,
+            region_retry_base_s=REGION_RETRY_BASE_S,
+            region_retry_cap_s=REGION_RETRY_CAP_S,
+            hedge_requests=bool(hedge_requests),
+            hedge_percentile=HEDGE_PERCENTILE,
+            hedge_budget_ratio=HEDGE_BUDGET_RATIO,
+            openai_endpoints=parse_endpoint_configs(
+                _OPENAI_ENDPOINTS_RAW, default_api_key=(openai_api_key or "").strip()
+            ),
+            silence_compress=bool(silence_compress),
+            silence_compress_min_s=SILENCE_COMPRESS_MIN_S,
+            silence_compress_keep_s=SILENCE_COMPRESS_KEEP_S,
+            upload_tempo=float(upload_tempo),
+            stream_asr=bool(stream_asr),
+            on_progress=lambda frac, desc: progress(frac, desc=desc),
             cancel_event=cancel_event,
         )
     except Exception as e:
@@ -1238,6 +1417,17 @@ with gr.Blocks(
                     value=DEFAULT_UPLOAD_AUDIO_FORMAT,
                     label="上传音频格式",
                 )
+                silence_compress = gr.Checkbox(
+                    value=DEFAULT_SILENCE_COMPRESS,
+                    label="上传前压缩长静音（分段整段上传时去掉长停顿，字幕时间自动映射回原音频）",
+                )
+                upload_tempo = gr.Slider(
+                    minimum=1.0,
+                    maximum=1.5,
+                    value=min(1.5, DEFAULT_UPLOAD_TEMPO),
+                    step=0.05,
+                    label="上传前加速倍率（1.0 为关闭；清晰语音可用 1.25~1.5，字幕时间自动还原）",
+                )
 
             with gr.Accordion("性能", open=True):
                 api_concurrency = gr.Slider(
@@ -1245,7 +1435,28 @@ with gr.Blocks(
                     maximum=16,
                     value=DEFAULT_API_CONCURRENCY,
                     step=1,
-                    label="并发请求数",
+                    label="并发请求数（自适应开启时为初始值）",
+                )
+                adaptive_concurrency = gr.Checkbox(
+                    value=DEFAULT_ADAPTIVE_CONCURRENCY,
+                    label="自适应并发（延迟稳定时逐步提高并发，遇到 429/5xx 自动减半并重试）",
+                )
+                asr_cache = gr.Checkbox(
+                    value=DEFAULT_ASR_CACHE,
+                    label="复用转写缓存（相同音频段 + 相同参数不重复转写）",
+                )
+                partial_results = gr.Checkbox(
+                    value=DEFAULT_PARTIAL_RESULTS,
+                    label="部分结果模式（个别语音段重试后仍失败时跳过并记录，其余照常生成字幕）",
+                )
+                hedge_requests = gr.Checkbox(
+                    value=DEFAULT_HEDGE_REQUESTS,
+                    label="对冲慢请求（个别语音段明显慢于本次任务的 p95 时重复请求，取先返回者；"
+                    "会少量增加 API 调用）",
+                )
+                stream_asr = gr.Checkbox(
+                    value=DEFAULT_STREAM_ASR,
+                    label="流式转写（模型支持时边识别边在进度中显示文字；不支持时自动回退）",
                 )
 
     prepare_funasr_btn.click(
@@ -1546,6 +1757,13 @@ with gr.Blocks(
             vad_speech_merge_gap_ms,
             upload_audio_format,
             api_concurrency,
+            adaptive_concurrency,
+            asr_cache,
+            partial_results,
+            hedge_requests,
+            stream_asr,
+            silence_compress,
+            upload_tempo,
             qwen3_model,
             qwen3_device,
             qwen3_max_inference_batch_size,
@@ -1565,4 +1783,10 @@ with gr.Blocks(
 
 
 if __name__ == "__main__":
+    if INFERENCE_SERVER_URL and INFERENCE_SERVER_AUTOSTART:
+        try:
+            get_inference_client(INFERENCE_SERVER_URL).health()
+        except RuntimeError:
+            host, _, port = INFERENCE_SERVER_URL.split("://", 1)[-1].rpartition(":")
+            start_inference_server(host=host or "127.0.0.1", port=int(port))
     demo.launch(theme=THEME)
@@ -0,0 +1,203 @@
+"""Persistent ASR result cache.
+
+Maps hash(region PCM, backend, model, language, prompt, ...) -> `ASRResult` in a local sqlite
+file, so re-running a file (different output format, after a crash, ...) never transcribes an
+identical region twice. The cache is size-bounded with LRU eviction.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Any
+
+import numpy as np
+
+from auto_asr.config import get_cache_dir
+from auto_asr.openai_asr import ASRResult, ASRSegment
+
+logger = logging.getLogger(__name__)
+
+_CACHE_FILE_NAME = "asr_results.sqlite3"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# After exceeding the budget, evict down to this fraction so we don't evict on every insert.
+_EVICT_TARGET_RATIO = 0.9
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    entries: int
+    size_bytes: int
+
+
+def make_cache_key(
+    wav: np.ndarray,
+    *,
+    backend: str,
+    model: str,
+    language: str | None = None,
+    prompt: str | None = None,
+    sample_rate: int = 16000,
+    extra: dict[str, Any] | None = None,
+) -> str:
+    """Hash region audio + everything that can change the transcription."""
+    h = hashlib.sha256()
+    params = {
+        "backend": backend,
+        "model": model,
+        "language": language or "",
+        "prompt": prompt or "",
+        "sample_rate": int(sample_rate),
+        "extra": extra or {},
+    }
+    h.update(json.dumps(params, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8"))
+    h.update(b"\0")
+    h.update(np.ascontiguousarray(wav, dtype=np.float32).tobytes())
+    return h.hexdigest()
+
+
+def _dump_result(result: ASRResult) -> str:
+    return json.dumps(
+        {
+            "text": result.text,
+            "segments": [[s.start_s, s.end_s, s.text] for s in result.segments],
+        },
+        ensure_ascii=False,
+    )
+
+
+def _load_result(payload: str) -> ASRResult:
+    data = json.loads(payload)
+    segments = [
+        ASRSegment(start_s=float(s), end_s=float(e), text=str(t))
+        for (s, e, t) in data.get("segments", [])
+    ]
+    return ASRResult(text=str(data.get("text", "") or ""), segments=segments)
+
+
+class ASRResultCache:
+    """Thread-safe sqlite-backed LRU cache of `ASRResult`s."""
+
+    def __init__(self, path: Path, *, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.path = Path(path)
+        self.max_bytes = max(1, int(max_bytes))
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " payload TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_results_last_access ON results(last_access)"
+            )
+            self._conn.commit()
+            # Running total of `size`, so `put` doesn't sum the whole table.
+            self._size = self._sum_size_locked()
+
+    def get(self, key: str) -> ASRResult | None:
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._conn.execute(
+                "UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        try:
+            return _load_result(row[0])
+        except Exception as e:  # pragma: no cover
+            logger.info("ASR 缓存条目损坏，忽略: %s", e)
+            return None
+
+    def put(self, key: str, result: ASRResult) -> None:
+        payload = _dump_result(result)
+        size = len(payload.encode("utf-8")) + len(key)
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results(key, payload, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, payload, size, time.time()),
+            )
+            self._size += size - (int(old[0]) if old is not None else 0)
+            if self._size > self.max_bytes:
+                self._evict_locked()
+            self._conn.commit()
+
+    def _sum_size_locked(self) -> int:
+        return int(self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0])
+
+    def _evict_locked(self) -> None:
+        # Re-sync once over budget: another process may share the file.
+        total = self._sum_size_locked()
+        self._size = total
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * _EVICT_TARGET_RATIO)
+        evicted = 0
+        rows = self._conn.execute(
+            "SELECT key, size FROM results ORDER BY last_access ASC"
+        ).fetchall()
+        for key, size in rows:
+            if total <= target:
+                break
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= int(size)
+            evicted += 1
+        self._size = total
+        logger.info("ASR 缓存 LRU 淘汰: evicted=%d, size=%d bytes", evicted, total)
+
+    def clear(self) -> int:
+        with self._lock:
+            n = int(self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0])
+            self._conn.execute("DELETE FROM results")
+            self._conn.commit()
+            self._size = 0
+            self._conn.execute("VACUUM")
+        return n
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+            return CacheStats(
+                hits=self._hits, misses=self._misses, entries=int(entries), size_bytes=int(size)
+            )
+
+
+_CACHE: ASRResultCache | None = None
+_CACHE_LOCK = Lock()
+
+
+def get_asr_cache(*, max_bytes: int | None = None) -> ASRResultCache:
+    """Return the process-wide cache stored under the project cache dir."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ASRResultCache(
+                get_cache_dir() / _CACHE_FILE_NAME, max_bytes=max_bytes or DEFAULT_MAX_BYTES
+            )
+        elif max_bytes:
+            _CACHE.max_bytes = max(1, int(max_bytes))
+        return _CACHE
+
+
+__all__ = ["ASRResultCache", "CacheStats", "get_asr_cache", "make_cache_key"]
@@ -0,0 +1,202 @@
+"""Length-aware batching shared by the local backends.
+
+Batched inference pads every item to the longest one in its batch, so batching regions in
+chronological order (a 1 s region next to a 20 s one) spends most of the compute on padding.
+Sorting by length first keeps items of similar duration together; callers restore input order
+from the returned indices.
+
+`AutoBatchSizer` sizes batches by padded audio seconds instead of a fixed item count: it
+measures the memory each batch takes, grows the next batch to fit a memory budget, halves it
+after an allocation failure and remembers that ceiling per model/device/dtype for later jobs
+(persisted under the project cache dir, like the ASR capability probes).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from collections.abc import Sequence
+from pathlib import Path
+from threading import Lock
+from typing import Any
+
+from auto_asr.config import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Padded audio seconds of the first batch, before any memory has been measured.
+_INITIAL_BATCH_S = 60.0
+# Largest batch the sizer grows to, whatever the budget says.
+_MAX_BATCH_S = 1800.0
+# Share of the memory budget a batch may use (the measurement is a rough peak).
+_BUDGET_HEADROOM = 0.8
+
+# Safe padded-seconds ceiling learned from allocation failures, per (model, device, dtype) key.
+# Kept in memory and persisted; entries expire so a freed-up or upgraded device gets re-measured.
+_CEILINGS_FILE_NAME = "batch_ceilings.json"
+_CEILINGS_TTL_S = 7 * 24 * 3600
+_CEILINGS_LOCK = Lock()
+_CEILINGS: dict[str, dict[str, Any]] | None = None
+
+
+def _ceilings_path() -> Path:
+    return get_cache_dir() / _CEILINGS_FILE_NAME
+
+
+def _ceiling_key(key: tuple) -> str:
+    return "|".join(str(x) for x in key)
+
+
+def _load_ceilings_locked() -> dict[str, dict[str, Any]]:
+    global _CEILINGS
+    if _CEILINGS is None:
+        try:
+            data = json.loads(_ceilings_path().read_text(encoding="utf-8"))
+        except Exception:
+            data = {}
+        _CEILINGS = data if isinstance(data, dict) else {}
+    return _CEILINGS
+
+
+def plan_length_batches(
+    durations_s: Sequence[float], *, batch_size_s: float, max_batch_size: int
+) -> list[list[int]]:
+    """Group item indices into batches of similar length.
+
+    Items are taken shortest first, and a batch is closed once its padded size (items x longest
+    item) would exceed `batch_size_s` or it holds `max_batch_size` items. A single item longer
+    than `batch_size_s` still gets its own batch.
+    """
+    order = sorted(range(len(durations_s)), key=lambda i: durations_s[i])
+    limit = max(1, int(max_batch_size))
+    batches: list[list[int]] = []
+    cur: list[int] = []
+    for i in order:
+        if cur and (len(cur) >= limit or (len(cur) + 1) * durations_s[i] > batch_size_s):
+            batches.append(cur)
+            cur = []
+        cur.append(i)
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+def plan_sequential_batches(count: int, *, max_batch_size: int) -> list[list[int]]:
+    """Input-order batches of up to `max_batch_size` items (the unsorted baseline)."""
+    limit = max(1, int(max_batch_size))
+    return [list(range(i, min(count, i + limit))) for i in range(0, count, limit)]
+
+
+def padding_ratio(durations_s: Sequence[float], batches: Sequence[Sequence[int]]) -> float:
+    """Padded audio seconds over real audio seconds for `batches` (1.0 = no padding)."""
+    real = sum(float(durations_s[i]) for b in batches for i in b)
+    padded = sum(len(b) * max(float(durations_s[i]) for i in b) for b in batches if b)
+    return padded / real if real > 0 else 1.0
+
+
+def is_oom_error(e: BaseException) -> bool:
+    """True for allocation failures (torch CUDA OOM, `MemoryError`, allocator messages)."""
+    if isinstance(e, MemoryError) or type(e).__name__ == "OutOfMemoryError":
+        return True
+    msg = str(e).lower()
+    return "out of memory" in msg or "failed to allocate" in msg
+
+
+def remembered_batch_ceiling(key: tuple) -> float | None:
+    with _CEILINGS_LOCK:
+        entry = _load_ceilings_locked().get(_ceiling_key(key))
+    if not isinstance(entry, dict):
+        return None
+    if time.time() - float(entry.get("checked_at", 0) or 0) > _CEILINGS_TTL_S:
+        return None
+    try:
+        ceiling_s = float(entry.get("ceiling_s"))
+    except Exception:
+        return None
+    return ceiling_s if ceiling_s > 0 else None
+
+
+def _remember_batch_ceiling(key: tuple, ceiling_s: float) -> None:
+    prev = remembered_batch_ceiling(key)
+    with _CEILINGS_LOCK:
+        ceilings = _load_ceilings_locked()
+        ceilings[_ceiling_key(key)] = {
+            "ceiling_s": min(prev, ceiling_s) if prev else ceiling_s,
+            "checked_at": time.time(),
+        }
+        path = _ceilings_path()
+        tmp = path.with_suffix(".tmp")
+        try:
+            tmp.write_text(
+                json.dumps(ceilings, ensure_ascii=False, indent=2, sort_keys=True) + "\n",
+                encoding="utf-8",
+            )
+            os.replace(tmp, path)
+        except Exception as e:  # pragma: no cover
+            logger.info("保存批量上限缓存失败(忽略): %s", e)
+
+
+class AutoBatchSizer:
+    """Picks the padded audio seconds of each batch from measured memory use.
+
+    `memory_mb` is what batches may use on top of the loaded model. After every batch,
+    `observe` records its peak memory; the next batch is sized so that the worst MB per padded
+    second seen so far fits `memory_mb`, growing at most 2x per batch. `backoff` halves the
+    size after an allocation failure and stores the ceiling under `key`.
+    """
+
+    def __init__(self, key: tuple, *, memory_mb: float, initial_s: float = _INITIAL_BATCH_S):
+        self.key = key
+        self.memory_mb = max(0.0, float(memory_mb))
+        self.ceiling_s = remembered_batch_ceiling(key) or _MAX_BATCH_S
+        self.budget_s = max(1.0, min(self.ceiling_s, float(initial_s)))
+        self.mb_per_s = 0.0
+
+    def take(
+        self, durations_s: Sequence[float], order: Sequence[int], start: int, *, max_items: int
+    ) -> list[int]:
+        """Next batch from `order[start:]`: at least one item, padded size within the budget."""
+        batch: list[int] = []
+        longest = 0.0
+        for i in order[start:]:
+            longest_next = max(longest, float(durations_s[i]))
+            if batch and (
+                len(batch) >= max(1, int(max_items))
+                or (len(batch) + 1) * longest_next > self.budget_s
+            ):
+                break
+            batch.append(i)
+            longest = longest_next
+        return batch
+
+    def observe(self, batch_s: float, peak_mb: float) -> None:
+        if batch_s <= 0 or peak_mb <= 0:
+            return
+        self.mb_per_s = max(self.mb_per_s, float(peak_mb) / float(batch_s))
+        if self.memory_mb <= 0:
+            return
+        target = _BUDGET_HEADROOM * self.memory_mb / self.mb_per_s
+        self.budget_s = max(1.0, min(self.ceiling_s, target, self.budget_s * 2.0))
+
+    def backoff(self, batch_s: float) -> None:
+        self.ceiling_s = max(1.0, min(self.ceiling_s, float(batch_s) / 2.0))
+        self.budget_s = min(self.budget_s, self.ceiling_s)
+        _remember_batch_ceiling(self.key, self.ceiling_s)
+        logger.warning(
+            "批量推理内存不足，降低批量: key=%s, failed=%.0fs, ceiling=%.0fs",
+            self.key,
+            batch_s,
+            self.ceiling_s,
+        )
+
+
+__all__ = [
+    "AutoBatchSizer",
+    "is_oom_error",
+    "padding_ratio",
+    "plan_length_batches",
+    "plan_sequential_batches",
+    "remembered_batch_ceiling",
+]
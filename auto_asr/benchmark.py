@@ -0,0 +1,528 @@
+"""Offline benchmarks for upload/inference tuning.
+
+Usage:
+    python -m auto_asr.benchmark tempo AUDIO [--tempos 1.0,1.25,1.5] [--chunk-seconds 180]
+    python -m auto_asr.benchmark mock-server [--port 8765] [--latency-ms 300] [--throttle-rate 0.05]
+    python -m auto_asr.benchmark pipeline AUDIO [--processors optimize] [--concurrency 4]
+    python -m auto_asr.benchmark quantize AUDIO --backend funasr|qwen3asr [--model ...]
+    python -m auto_asr.benchmark qwen3-batching AUDIO [--batch-size 8] [--dry-run]
+
+`tempo` splits the audio into fixed chunks like the pipeline's default chunking (180 s) and
+speeds up / uploads each chunk separately. Numbers are normalized to one hour of input audio so
+runs on different files compare directly; upstream timings (and the time saved against tempo
+1.0) are only measured when an API key is given (`--api-key` or `OPENAI_API_KEY`).
+
+`pipeline` runs `transcribe_to_subtitles` (and optionally `process_subtitle_file_multi`) against
+the local mock endpoint (`auto_asr.mock_server`, started in a child process unless `--base-url`
+is given) and reports regions/s, upstream p50/p95 latency and the CPU time of this process.
+
+`quantize` transcribes the same fixed-length chunks on CPU with the float model and with int8
+(`auto_asr.quantization`), each in a fresh process so RSS is comparable, and reports load time,
+real-time factor, RSS and how much the int8 text differs from the float text.
+
+`qwen3-batching` splits the audio into VAD speech regions (seeded random 1-20 s regions when
+Silero VAD is unavailable) and compares chronological batches with length-bucketed ones: padding
+ratio always, and Qwen3-ASR inference time unless `--dry-run` is given.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import difflib
+import json
+import logging
+import multiprocessing as mp
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from auto_asr.audio_tools import (
+    WAV_SAMPLE_RATE,
+    change_tempo,
+    load_audio,
+    save_audio_file,
+    transcode_wav_to_mp3,
+)
+
+logger = logging.getLogger(__name__)
+
+_MIB = 1024.0 * 1024.0
+
+
+def _parse_floats(raw: str) -> list[float]:
+    return [float(x) for x in str(raw).split(",") if x.strip()]
+
+
+def _upload_size(wav: np.ndarray, tmp_dir: str, name: str, upload_format: str) -> tuple[str, int]:
+    wav_path = os.path.join(tmp_dir, f"{name}.wav")
+    save_audio_file(wav, wav_path)
+    path = wav_path
+    if upload_format == "mp3":
+        path = transcode_wav_to_mp3(
+            input_wav_path=wav_path, output_mp3_path=os.path.join(tmp_dir, f"{name}.mp3")
+        )
+    return path, os.path.getsize(path)
+
+
+def _cmd_tempo(args: argparse.Namespace) -> int:
+    wav = load_audio(args.audio)
+    if args.seconds:
+        wav = wav[: int(float(args.seconds) * WAV_SAMPLE_RATE)]
+    audio_s = len(wav) / float(WAV_SAMPLE_RATE)
+    if audio_s <= 0:
+        print("音频为空", file=sys.stderr)
+        return 1
+    per_hour = 3600.0 / audio_s
+
+    client = None
+    api_key = (args.api_key or os.environ.get("OPENAI_API_KEY") or "").strip()
+    if api_key:
+        from auto_asr.openai_asr import make_openai_client
+
+        client = make_openai_client(api_key=api_key, base_url=args.base_url)
+
+    chunk_samples = max(1, int(float(args.chunk_seconds) * WAV_SAMPLE_RATE))
+    chunks = [wav[i : i + chunk_samples] for i in range(0, len(wav), chunk_samples)]
+    tempos = _parse_floats(args.tempos)
+    if 1.0 not in tempos:
+        # Savings are measured against the unchanged upload.
+        tempos.insert(0, 1.0)
+
+    print(
+        f"audio={args.audio}, duration={audio_s:.1f}s, chunks={len(chunks)}"
+        f"(<= {float(args.chunk_seconds):.0f}s), upload_format={args.format}"
+    )
+    print("tempo  upload_MiB/h  saved_MiB/h  atempo_s/h  upstream_s/h  saved_s/h  segments")
+    base_bytes: int | None = None
+    base_upstream: float | None = None
+    with TemporaryDirectory(prefix="auto-asr-bench-") as tmp_dir:
+        for tempo in sorted(tempos, key=lambda t: t != 1.0):
+            size = 0
+            atempo_s = 0.0
+            upstream_s: float | None = None
+            segments = 0
+            for n, chunk in enumerate(chunks):
+                t0 = time.perf_counter()
+                fast = change_tempo(chunk, tempo)
+                atempo_s += time.perf_counter() - t0
+                path, chunk_bytes = _upload_size(
+                    fast, tmp_dir, f"tempo_{tempo:.2f}_{n}", args.format
+                )
+                size += chunk_bytes
+                if client is not None:
+                    from auto_asr.openai_asr import transcribe_file_verbose
+
+                    t0 = time.perf_counter()
+                    asr = transcribe_file_verbose(
+                        client,
+                        file_path=path,
+                        model=args.model,
+                        language=None if args.language == "auto" else args.language,
+                        prompt=None,
+                        audio_seconds=len(fast) / float(WAV_SAMPLE_RATE),
+                    )
+                    upstream_s = (upstream_s or 0.0) + time.perf_counter() - t0
+                    segments += len(asr.segments)
+            if tempo == 1.0:
+                base_bytes, base_upstream = size, upstream_s
+
+            upstream = saved = seg_text = "-"
+            if upstream_s is not None:
+                upstream = f"{upstream_s * per_hour:.1f}"
+                seg_text = str(segments)
+                if base_upstream is not None:
+                    saved = f"{(base_upstream - upstream_s) * per_hour:.1f}"
+            print(
+                f"{tempo:<5.2f}  {size * per_hour / _MIB:12.1f}  "
+                f"{((base_bytes or size) - size) * per_hour / _MIB:11.1f}  "
+                f"{atempo_s * per_hour:10.2f}  {upstream:>12}  {saved:>9}  {seg_text:>8}"
+            )
+    return 0
+
+
+def _mock_config(args: argparse.Namespace):
+    from auto_asr.mock_server import MockConfig
+
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        latency_per_audio_s_ms=args.latency_per_audio_s_ms,
+        jitter=args.jitter,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        retry_after_s=args.retry_after_s,
+        seed=args.seed,
+    )
+
+
+def _mock_args(args: argparse.Namespace) -> list[str]:
+    return [
+        f"--latency-ms={args.latency_ms}",
+        f"--latency-per-audio-s-ms={args.latency_per_audio_s_ms}",
+        f"--jitter={args.jitter}",
+        f"--throttle-rate={args.throttle_rate}",
+        f"--error-rate={args.error_rate}",
+        f"--retry-after-s={args.retry_after_s}",
+        f"--seed={args.seed}",
+    ]
+
+
+def _cmd_mock_server(args: argparse.Namespace) -> int:
+    from auto_asr.mock_server import MockServer
+
+    server = MockServer(_mock_config(args), host=args.host, port=args.port)
+    print(server.base_url, flush=True)
+    with contextlib.suppress(KeyboardInterrupt):
+        server.serve_forever()
+    return 0
+
+
+def _fetch_stats(base_url: str) -> dict:
+    root = base_url.rstrip("/").removesuffix("/v1")
+    with urllib.request.urlopen(f"{root}/stats", timeout=5) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return int(s.getsockname()[1])
+
+
+def _start_mock_process(args: argparse.Namespace) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}/v1"
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "auto_asr.benchmark",
+            "mock-server",
+            f"--port={port}",
+            *_mock_args(args),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 15.0
+    while time.monotonic() < deadline:
+        try:
+            _fetch_stats(base_url)
+            return proc, base_url
+        except Exception:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Mock 服务启动失败")
+
+
+def _route_line(name: str, stats: dict, route_suffix: str, wall_s: float) -> str:
+    entry: dict = {}
+    for route, value in stats.items():
+        if route.endswith(route_suffix):
+            entry = value
+    ok = int(entry.get("status", {}).get("200", 0))
+    return (
+        f"{name}: requests={entry.get('requests', 0)}, ok={ok}, "
+        f"rate={ok / max(1e-9, wall_s):.2f}/s, p50={entry.get('p50_ms', 0)}ms, "
+        f"p95={entry.get('p95_ms', 0)}ms, status={entry.get('status', {})}"
+    )
+
+
+def _cmd_pipeline(args: argparse.Namespace) -> int:
+    from auto_asr.pipeline import transcribe_to_subtitles
+    from auto_asr.subtitle_processing.pipeline import process_subtitle_file_multi
+
+    proc = None
+    base_url = args.base_url
+    if not base_url:
+        proc, base_url = _start_mock_process(args)
+    try:
+        with TemporaryDirectory(prefix="auto-asr-bench-") as tmp_dir:
+            cpu0, t0 = time.process_time(), time.perf_counter()
+            result = transcribe_to_subtitles(
+                input_audio_path=args.audio,
+                openai_api_key="mock",
+                openai_base_url=base_url,
+                output_format="srt",
+                model=args.model,
+                enable_vad=not args.no_vad,
+                timeline_strategy=args.strategy,
+                api_concurrency=args.concurrency,
+                asr_cache=False,
+                upload_tempo=args.upload_tempo,
+                outputs_dir=tmp_dir,
+            )
+            asr_wall, asr_cpu = time.perf_counter() - t0, time.process_time() - cpu0
+            stats = _fetch_stats(base_url)
+            print(f"asr: wall={asr_wall:.2f}s, cpu={asr_cpu:.2f}s")
+            print(_route_line("asr", stats, "/audio/transcriptions", asr_wall))
+
+            processors = [p for p in str(args.processors or "").split(",") if p.strip()]
+            if processors:
+                cpu0, t0 = time.process_time(), time.perf_counter()
+                process_subtitle_file_multi(
+                    result.subtitle_file_path,
+                    processors=processors,
+                    out_dir=tmp_dir,
+                    options_by_processor={p: {"concurrency": args.concurrency} for p in processors},
+                    llm_model=args.llm_model,
+                    openai_api_key="mock",
+                    openai_base_url=base_url,
+                )
+                llm_wall, llm_cpu = time.perf_counter() - t0, time.process_time() - cpu0
+                stats = _fetch_stats(base_url)
+                print(f"subtitle: wall={llm_wall:.2f}s, cpu={llm_cpu:.2f}s")
+                print(_route_line("llm", stats, "/chat/completions", llm_wall))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+    return 0
+
+
+def _quantize_run(
+    backend: str, model: str, quantize: bool, chunks: list[np.ndarray], language: str
+) -> dict:
+    """One benchmark variant; runs in its own process so RSS only reflects this model."""
+    from auto_asr.model_residency import process_rss_mb
+
+    rss_before = process_rss_mb()
+    t0 = time.perf_counter()
+    if backend == "funasr":
+        from auto_asr.funasr_asr import preload_funasr_model, transcribe_arrays_funasr
+
+        preload_funasr_model(model=model, device="cpu", quantize=quantize)
+        load_s = time.perf_counter() - t0
+        rss_loaded = process_rss_mb()
+        t0 = time.perf_counter()
+        results = transcribe_arrays_funasr(
+            wavs=chunks,
+            model=model,
+            device="cpu",
+            language=language,
+            use_itn=True,
+            enable_punc=True,
+            quantize=quantize,
+        )
+    else:
+        from auto_asr.qwen3_asr import Qwen3ASRConfig, preload_qwen3_model, transcribe_chunks_qwen3
+
+        cfg = Qwen3ASRConfig(model=model, device="cpu", quantize=quantize)
+        preload_qwen3_model(cfg)
+        load_s = time.perf_counter() - t0
+        rss_loaded = process_rss_mb()
+        t0 = time.perf_counter()
+        results = transcribe_chunks_qwen3(
+            chunks=chunks,
+            cfg=cfg,
+            language=None if language == "auto" else language,
+            sample_rate=WAV_SAMPLE_RATE,
+        )
+    return {
+        "load_s": load_s,
+        "infer_s": time.perf_counter() - t0,
+        "model_mb": rss_loaded - rss_before,
+        "rss_mb": process_rss_mb(),
+        "text": "\n".join(r.text for r in results),
+    }
+
+
+def _text_diff(a: str, b: str) -> float:
+    """Share of characters that differ (0 = identical), from difflib's similarity ratio."""
+    if not a and not b:
+        return 0.0
+    return 1.0 - difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def _cmd_quantize(args: argparse.Namespace) -> int:
+    wav = load_audio(args.audio)
+    if args.seconds:
+        wav = wav[: int(float(args.seconds) * WAV_SAMPLE_RATE)]
+    audio_s = len(wav) / float(WAV_SAMPLE_RATE)
+    if audio_s <= 0:
+        print("音频为空", file=sys.stderr)
+        return 1
+    step = max(1, int(float(args.chunk_s) * WAV_SAMPLE_RATE))
+    chunks = [wav[i : i + step] for i in range(0, len(wav), step)]
+    model = args.model or (
+        "iic/SenseVoiceSmall" if args.backend == "funasr" else "Qwen/Qwen3-ASR-1.7B"
+    )
+
+    print(f"audio={args.audio}, duration={audio_s:.1f}s, backend={args.backend}, model={model}")
+    print("variant  load_s    RTF  model_MiB  rss_MiB  text_diff")
+    baseline = ""
+    for quantize in (False, True):
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as ex:
+            res = ex.submit(
+                _quantize_run, args.backend, model, quantize, chunks, args.language
+            ).result()
+        if not quantize:
+            baseline = res["text"]
+        print(
+            f"{'int8' if quantize else 'float':<7}  {res['load_s']:6.1f}  "
+            f"{res['infer_s'] / audio_s:5.3f}  {res['model_mb']:9.0f}  {res['rss_mb']:7.0f}  "
+            f"{_text_diff(baseline, res['text']) * 100:8.2f}%"
+        )
+    return 0
+
+
+def _benchmark_regions(wav: np.ndarray, seed: int) -> tuple[list[np.ndarray], str]:
+    from auto_asr.audio_tools import process_vad_speech
+    from auto_asr.vad_split import get_vad_model
+
+    vad_model = get_vad_model()
+    if vad_model is not None:
+        regions = process_vad_speech(wav, vad_model, max_utterance_s=20, merge_gap_ms=300)
+        if regions:
+            return [w for (_s, _e, w) in regions], "vad"
+    rng = np.random.default_rng(seed)
+    out: list[np.ndarray] = []
+    pos = 0
+    while pos < len(wav):
+        n = int(rng.uniform(1.0, 20.0) * WAV_SAMPLE_RATE)
+        out.append(wav[pos : pos + n])
+        pos += n
+    return out, "random"
+
+
+def _cmd_qwen3_batching(args: argparse.Namespace) -> int:
+    from auto_asr.batching import padding_ratio, plan_length_batches, plan_sequential_batches
+
+    wav = load_audio(args.audio)
+    if args.seconds:
+        wav = wav[: int(float(args.seconds) * WAV_SAMPLE_RATE)]
+    audio_s = len(wav) / float(WAV_SAMPLE_RATE)
+    chunks, source = _benchmark_regions(wav, args.seed)
+    if not chunks:
+        print("音频为空", file=sys.stderr)
+        return 1
+    durations = [len(c) / float(WAV_SAMPLE_RATE) for c in chunks]
+    sequential = plan_sequential_batches(len(chunks), max_batch_size=args.batch_size)
+    bucketed = plan_length_batches(
+        durations, batch_size_s=float("inf"), max_batch_size=args.batch_size
+    )
+    print(
+        f"audio={args.audio}, duration={audio_s:.1f}s, regions={len(chunks)}({source}), "
+        f"batch_size={args.batch_size}"
+    )
+    print(
+        f"padding: chronological={padding_ratio(durations, sequential):.2f}x, "
+        f"bucketed={padding_ratio(durations, bucketed):.2f}x"
+    )
+    if args.dry_run:
+        return 0
+
+    from auto_asr.qwen3_asr import Qwen3ASRConfig, preload_qwen3_model, transcribe_chunks_qwen3
+
+    cfg = Qwen3ASRConfig(
+        model=args.model, device=args.device, max_inference_batch_size=args.batch_size
+    )
+    preload_qwen3_model(cfg)
+    timings: dict[bool, float] = {}
+    texts: dict[bool, str] = {}
+    for bucketing in (False, True):
+        t0 = time.perf_counter()
+        results = transcribe_chunks_qwen3(
+            chunks=chunks,
+            cfg=cfg,
+            language=None,
+            sample_rate=WAV_SAMPLE_RATE,
+            length_bucketing=bucketing,
+        )
+        timings[bucketing] = time.perf_counter() - t0
+        texts[bucketing] = "\n".join(r.text for r in results)
+        print(
+            f"{'bucketed' if bucketing else 'chronological'}: infer={timings[bucketing]:.2f}s, "
+            f"RTF={timings[bucketing] / audio_s:.3f}"
+        )
+    print(
+        f"speedup={timings[False] / max(1e-9, timings[True]):.2f}x, "
+        f"text_diff={_text_diff(texts[False], texts[True]) * 100:.2f}%"
+    )
+    return 0
+
+
+def _add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--latency-per-audio-s-ms", type=float, default=20.0)
+    parser.add_argument("--jitter", type=float, default=0.3, help="延迟对数正态分布的 sigma")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="返回 429 的比例")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的比例")
+    parser.add_argument("--retry-after-s", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m auto_asr.benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    tempo = sub.add_parser("tempo", help="上传前加速：每小时音频的上传体积与耗时")
+    tempo.add_argument("audio")
+    tempo.add_argument("--tempos", default="1.0,1.25,1.5")
+    tempo.add_argument("--format", choices=["wav", "mp3"], default="wav")
+    tempo.add_argument("--seconds", type=float, default=0.0, help="只取前 N 秒（0 为整段）")
+    tempo.add_argument(
+        "--chunk-seconds", type=float, default=180.0, help="按流水线默认分段切块上传（秒）"
+    )
+    tempo.add_argument("--base-url", default=None)
+    tempo.add_argument("--api-key", default=None)
+    tempo.add_argument("--model", default="whisper-1")
+    tempo.add_argument("--language", default="auto")
+    tempo.set_defaults(func=_cmd_tempo)
+
+    mock = sub.add_parser("mock-server", help="启动本地 OpenAI 兼容 Mock 服务")
+    mock.add_argument("--host", default="127.0.0.1")
+    mock.add_argument("--port", type=int, default=8765)
+    _add_mock_arguments(mock)
+    mock.set_defaults(func=_cmd_mock_server)
+
+    pipe = sub.add_parser("pipeline", help="对 Mock 服务跑完整转写/字幕处理流程")
+    pipe.add_argument("audio")
+    pipe.add_argument("--base-url", default=None, help="使用已运行的 Mock 服务")
+    pipe.add_argument("--strategy", choices=["vad_speech", "chunk"], default="vad_speech")
+    pipe.add_argument("--no-vad", action="store_true")
+    pipe.add_argument("--concurrency", type=int, default=4)
+    pipe.add_argument("--upload-tempo", type=float, default=1.0)
+    pipe.add_argument("--model", default="whisper-1")
+    pipe.add_argument("--processors", default="", help="例如 optimize,translate")
+    pipe.add_argument("--llm-model", default="gpt-4o-mini")
+    _add_mock_arguments(pipe)
+    pipe.set_defaults(func=_cmd_pipeline)
+
+    quant = sub.add_parser("quantize", help="本地模型 float 与 int8 的速度/内存/文本差异对比")
+    quant.add_argument("audio")
+    quant.add_argument("--backend", choices=["funasr", "qwen3asr"], default="funasr")
+    quant.add_argument("--model", default="")
+    quant.add_argument("--language", default="auto")
+    quant.add_argument("--seconds", type=float, default=120.0, help="只取前 N 秒（0 为整段）")
+    quant.add_argument("--chunk-s", type=float, default=20.0)
+    quant.set_defaults(func=_cmd_quantize)
+
+    qb = sub.add_parser("qwen3-batching", help="Qwen3-ASR 按时长分桶批处理与按时间顺序批处理对比")
+    qb.add_argument("audio")
+    qb.add_argument("--model", default="Qwen/Qwen3-ASR-1.7B")
+    qb.add_argument("--device", default="auto")
+    qb.add_argument("--batch-size", type=int, default=8)
+    qb.add_argument("--seconds", type=float, default=600.0, help="只取前 N 秒（0 为整段）")
+    qb.add_argument("--seed", type=int, default=0)
+    qb.add_argument("--dry-run", action="store_true", help="只计算填充比例，不加载模型")
+    qb.set_defaults(func=_cmd_qwen3_batching)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    args = build_parser().parse_args(argv)
+    return int(args.func(args) or 0)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -6,6 +6,7 @@ from pathlib import Path
 from typing import Any
 
 _CONFIG_FILE_NAME = ".auto_asr_config.json"
+_CACHE_DIR_NAME = ".auto_asr_cache"
 
 
 def get_config_path() -> Path:
@@ -14,6 +15,13 @@ def get_config_path() -> Path:
     return root / _CONFIG_FILE_NAME
 
 
+def get_cache_dir() -> Path:
+    # Project-local runtime caches (capability probes, results, ...). Safe to delete.
+    path = get_config_path().parent / _CACHE_DIR_NAME
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
 def load_config() -> dict[str, Any]:
     path = get_config_path()
     if not path.exists():
@@ -67,4 +75,11 @@ def delete_config() -> bool:
     return True
 
 
-__all__ = ["delete_config", "get_config_path", "load_config", "save_config", "update_config"]
+__all__ = [
+    "delete_config",
+    "get_cache_dir",
+    "get_config_path",
+    "load_config",
+    "save_config",
+    "update_config",
+]
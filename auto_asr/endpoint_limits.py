@@ -0,0 +1,227 @@
+"""Process-wide request/token/audio budgets per OpenAI-compatible endpoint.
+
+ASR uploads and subtitle LLM calls often hit the same base URL, and several jobs can run at the
+same time. Provider limits are per account/endpoint, so the budget has to be shared: every
+request first takes from the endpoint's token buckets (requests/min, tokens/min, audio-seconds/min)
+and a 429 pauses the whole endpoint, not just the caller that saw it.
+
+Limits are opt-in via the config file (`endpoint_rate_limits`); endpoints without limits are not
+throttled at all.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+from threading import Condition, Event, Lock
+from typing import Any
+
+from auto_asr.llm.client import normalize_base_url
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+# Config key that applies to every endpoint without its own entry.
+WILDCARD = "*"
+
+
+@dataclass(frozen=True)
+class EndpointLimits:
+    rpm: float | None = None
+    tpm: float | None = None
+    audio_seconds_pm: float | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return any(v is not None and v > 0 for v in (self.rpm, self.tpm, self.audio_seconds_pm))
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding at most one minute of budget."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = max(1e-9, float(per_minute))
+        self._rate_s = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate_s)
+        self._updated = now
+
+    def wait_time_s(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 if it is available now)."""
+        self._refill(now)
+        # A single request larger than a minute's budget is let through once the bucket is full.
+        amount = min(float(amount), self.capacity)
+        if self._tokens >= amount:
+            return 0.0
+        return (amount - self._tokens) / self._rate_s
+
+    def take(self, amount: float) -> None:
+        self._tokens -= min(float(amount), self.capacity)
+
+
+class EndpointLimiter:
+    """Blocking limiter for one endpoint; safe to share across threads and jobs."""
+
+    def __init__(self, endpoint: str, limits: EndpointLimits) -> None:
+        self.endpoint = endpoint
+        self.limits = limits
+        self._cond = Condition()
+        self._requests = TokenBucket(limits.rpm) if limits.rpm else None
+        self._tokens = TokenBucket(limits.tpm) if limits.tpm else None
+        self._audio = TokenBucket(limits.audio_seconds_pm) if limits.audio_seconds_pm else None
+        self._paused_until = 0.0
+        self._waits = 0
+        self._waited_s = 0.0
+
+    def acquire(
+        self,
+        *,
+        requests: float = 1.0,
+        tokens: float = 0.0,
+        audio_s: float = 0.0,
+        cancel_event: Event | None = None,
+    ) -> float:
+        """Block until the request fits every budget; returns the time spent waiting."""
+        wants = [
+            (self._requests, requests),
+            (self._tokens, tokens),
+            (self._audio, audio_s),
+        ]
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise RuntimeError("已停止转写。")
+                now = time.monotonic()
+                wait_s = self._paused_until - now
+                for bucket, amount in wants:
+                    if bucket is not None and amount > 0:
+                        wait_s = max(wait_s, bucket.wait_time_s(amount, now))
+                if wait_s <= 0:
+                    for bucket, amount in wants:
+                        if bucket is not None and amount > 0:
+                            bucket.take(amount)
+                    break
+                # Wake up periodically to observe cancellation.
+                self._cond.wait(timeout=min(0.5, wait_s))
+            waited = time.monotonic() - started
+            if waited > 0.05:
+                self._waits += 1
+                self._waited_s += waited
+        return waited
+
+    def pause(self, seconds: float | None) -> None:
+        """Hold every caller of this endpoint back, e.g. after a 429 with `Retry-After`."""
+        if seconds is None or seconds <= 0:
+            return
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + float(seconds))
+        logger.info("端点限流暂停: endpoint=%s, %.1fs", self.endpoint, float(seconds))
+
+    def stats(self) -> tuple[int, float]:
+        """(number of waits, total seconds waited) since creation."""
+        with self._cond:
+            return self._waits, self._waited_s
+
+
+_LIMITS: dict[str, EndpointLimits] = {}
+_LIMITERS: dict[str, EndpointLimiter] = {}
+_LOCK = Lock()
+
+
+def _endpoint_key(base_url: str | None) -> str:
+    url = (base_url or "").strip()
+    if not url or url == WILDCARD:
+        return url or DEFAULT_BASE_URL
+    return normalize_base_url(url)
+
+
+def set_endpoint_limits(base_url: str | None, limits: EndpointLimits | None) -> None:
+    """Set (or clear, with None) the budget for an endpoint; `"*"` sets the default."""
+    key = _endpoint_key(base_url)
+    with _LOCK:
+        if limits is None or not limits.enabled:
+            _LIMITS.pop(key, None)
+        else:
+            _LIMITS[key] = limits
+        # Rebuild limiters lazily with the new limits.
+        if key == WILDCARD:
+            _LIMITERS.clear()
+        else:
+            _LIMITERS.pop(key, None)
+
+
+def load_endpoint_limits(config: Mapping[str, Any] | None) -> int:
+    """Load `{"<base_url>|*": {"rpm": .., "tpm": .., "audio_seconds_pm": ..}}` from config.
+
+    Invalid entries are skipped. Returns the number of endpoints configured.
+    """
+    if not isinstance(config, Mapping):
+        return 0
+    count = 0
+    for url, raw in config.items():
+        if not isinstance(raw, Mapping):
+            continue
+        values: dict[str, float | None] = {}
+        for name in ("rpm", "tpm", "audio_seconds_pm"):
+            try:
+                v = raw.get(name)
+                values[name] = float(v) if v not in (None, "") and float(v) > 0 else None
+            except Exception:
+                values[name] = None
+        limits = EndpointLimits(**values)
+        if limits.enabled:
+            set_endpoint_limits(str(url), limits)
+            count += 1
+    return count
+
+
+def get_endpoint_limiter(base_url: Any) -> EndpointLimiter | None:
+    """Return the shared limiter for `base_url` (str or httpx.URL), or None if unlimited."""
+    key = _endpoint_key(str(base_url) if base_url is not None else None)
+    with _LOCK:
+        limiter = _LIMITERS.get(key)
+        if limiter is not None:
+            return limiter
+        limits = _LIMITS.get(key) or _LIMITS.get(WILDCARD)
+        if limits is None:
+            return None
+        limiter = EndpointLimiter(key, limits)
+        _LIMITERS[key] = limiter
+    logger.info(
+        "端点限速已启用: endpoint=%s, rpm=%s, tpm=%s, audio_seconds_pm=%s",
+        key,
+        limits.rpm,
+        limits.tpm,
+        limits.audio_seconds_pm,
+    )
+    return limiter
+
+
+def estimate_chat_tokens(messages: Any) -> int:
+    """Rough token estimate for a chat request (prompt + a completion of similar size).
+
+    Subtitle prompts are mostly CJK, where one character is roughly one token, so count chars
+    rather than guessing a tokenizer; this errs on the side of staying under the TPM budget.
+    """
+    chars = 0
+    for m in messages or []:
+        content = m.get("content") if isinstance(m, Mapping) else getattr(m, "content", None)
+        chars += len(str(content or ""))
+    return max(1, math.ceil(chars * 2))
+
+
+__all__ = [
+    "EndpointLimiter",
+    "EndpointLimits",
+    "estimate_chat_tokens",
+    "get_endpoint_limiter",
+    "load_endpoint_limits",
+    "set_endpoint_limits",
+]
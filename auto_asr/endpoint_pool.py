@@ -0,0 +1,202 @@
+"""Load balancing of ASR uploads across several OpenAI-compatible endpoints.
+
+Routing is least-outstanding-requests (weighted), with passive health tracking: an endpoint that
+fails several requests in a row (5xx / network errors) is ejected for a while and then gets a
+probe request; each repeated ejection lasts longer, until the endpoint has served a run of
+requests in a row again. 4xx errors (including 429) are the caller's
+concern and don't count against an endpoint's health.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, TypeVar
+
+from openai import OpenAI
+
+from auto_asr.rate_control import is_retryable_error, status_code_of
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+DEFAULT_EJECT_AFTER = 3
+DEFAULT_EJECT_S = 30.0
+MAX_EJECT_S = 300.0
+# Successes in a row after which a re-admitted endpoint's ejection backoff starts over.
+DEFAULT_RECOVER_AFTER = 20
+
+
+@dataclass(frozen=True)
+class EndpointConfig:
+    base_url: str
+    api_key: str
+    weight: float = 1.0
+
+
+@dataclass(frozen=True)
+class EndpointStats:
+    base_url: str
+    requests: int
+    failures: int
+    ejections: int
+    ejected: bool
+
+
+def parse_endpoint_configs(raw: Any, *, default_api_key: str = "") -> list[EndpointConfig]:
+    """Parse `[{"base_url": .., "api_key": .., "weight": ..}, ...]` (a plain URL string also works).
+
+    Entries without a base URL are skipped; a missing key falls back to `default_api_key`.
+    """
+    if not isinstance(raw, (list, tuple)):
+        return []
+    out: list[EndpointConfig] = []
+    for item in raw:
+        if isinstance(item, str):
+            item = {"base_url": item}
+        if not isinstance(item, dict):
+            continue
+        base_url = str(item.get("base_url") or "").strip()
+        if not base_url:
+            continue
+        api_key = str(item.get("api_key") or "").strip() or default_api_key
+        try:
+            weight = float(item.get("weight", 1.0))
+        except Exception:
+            weight = 1.0
+        out.append(EndpointConfig(base_url=base_url, api_key=api_key, weight=max(0.01, weight)))
+    return out
+
+
+def _is_health_failure(err: BaseException) -> bool:
+    code = status_code_of(err)
+    if code is not None:
+        return code >= 500
+    return is_retryable_error(err)
+
+
+class _Member:
+    def __init__(self, cfg: EndpointConfig, client: OpenAI) -> None:
+        self.cfg = cfg
+        self.client = client
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        # Doubles the next ejection; reset after `recover_after` successes in a row.
+        self.backoff_level = 0
+        self.consecutive_successes = 0
+        self.requests = 0
+        self.failures = 0
+
+
+class EndpointPool:
+    """Routes requests across endpoints; thread-safe."""
+
+    def __init__(
+        self,
+        clients: Sequence[tuple[EndpointConfig, OpenAI]],
+        *,
+        eject_after: int = DEFAULT_EJECT_AFTER,
+        eject_s: float = DEFAULT_EJECT_S,
+        max_eject_s: float = MAX_EJECT_S,
+        recover_after: int = DEFAULT_RECOVER_AFTER,
+    ) -> None:
+        if not clients:
+            raise ValueError("endpoint pool is empty")
+        self._members = [_Member(cfg, client) for (cfg, client) in clients]
+        self._eject_after = max(1, int(eject_after))
+        self._eject_s = max(0.0, float(eject_s))
+        self._max_eject_s = max(self._eject_s, float(max_eject_s))
+        self._recover_after = max(1, int(recover_after))
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def _acquire(self) -> _Member:
+        now = time.monotonic()
+        with self._lock:
+            healthy = [m for m in self._members if m.ejected_until <= now]
+            if healthy:
+                # Weighted least-outstanding; recent failures make an endpoint less attractive
+                # so retries tend to land elsewhere.
+                member = min(
+                    healthy,
+                    key=lambda m: (m.outstanding + 1) / m.cfg.weight * (1 + m.consecutive_failures),
+                )
+            else:
+                # Everything is ejected: keep going with the one that comes back soonest.
+                member = min(self._members, key=lambda m: m.ejected_until)
+            member.outstanding += 1
+            member.requests += 1
+            return member
+
+    def _release(self, member: _Member, error: BaseException | None = None) -> None:
+        with self._lock:
+            member.outstanding = max(0, member.outstanding - 1)
+            if error is None:
+                if member.ejections and member.consecutive_failures:
+                    logger.info("ASR 端点已恢复: %s", member.cfg.base_url)
+                member.consecutive_failures = 0
+                member.consecutive_successes += 1
+                if member.backoff_level and member.consecutive_successes >= self._recover_after:
+                    # Stable again: a later outage starts from the base ejection time.
+                    member.backoff_level = 0
+                return
+            if not _is_health_failure(error):
+                return
+            member.failures += 1
+            member.consecutive_successes = 0
+            if member.ejected_until > time.monotonic():
+                # Requests already in flight when it was ejected; don't extend the ejection.
+                return
+            member.consecutive_failures += 1
+            if member.consecutive_failures < self._eject_after:
+                return
+            duration = min(self._max_eject_s, self._eject_s * (2.0**member.backoff_level))
+            member.ejections += 1
+            member.backoff_level += 1
+            # One probe request is let through once this expires; another failure re-ejects.
+            member.consecutive_failures = self._eject_after - 1
+            member.ejected_until = time.monotonic() + duration
+        logger.warning(
+            "ASR 端点连续失败，暂时摘除 %.0fs: %s, 原因: %s", duration, member.cfg.base_url, error
+        )
+
+    def call(self, fn: Callable[[OpenAI], R]) -> R:
+        """Run `fn(client)` against the chosen endpoint and record the outcome."""
+        member = self._acquire()
+        try:
+            out = fn(member.client)
+        except Exception as e:
+            self._release(member, e)
+            raise
+        self._release(member)
+        return out
+
+    def stats(self) -> list[EndpointStats]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                EndpointStats(
+                    base_url=m.cfg.base_url,
+                    requests=m.requests,
+                    failures=m.failures,
+                    ejections=m.ejections,
+                    ejected=m.ejected_until > now,
+                )
+                for m in self._members
+            ]
+
+
+__all__ = [
+    "EndpointConfig",
+    "EndpointPool",
+    "EndpointStats",
+    "parse_endpoint_configs",
+]
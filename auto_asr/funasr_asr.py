@@ -1,15 +1,24 @@
 from __future__ import annotations
 
-import contextlib
 import inspect
 import logging
 import re
+import time
+from collections.abc import Callable, Sequence
+from contextlib import AbstractContextManager
 from dataclasses import dataclass
-from gc import collect as gc_collect
+from threading import Event
 from typing import Any
 
+import numpy as np
+
+from auto_asr.audio_tools import WAV_SAMPLE_RATE
+from auto_asr.batching import plan_length_batches
 from auto_asr.funasr_models import get_remote_code_candidates, is_funasr_nano, resolve_model_dir
+from auto_asr.model_residency import get_model_residency
 from auto_asr.openai_asr import ASRResult, ASRSegment
+from auto_asr.quantization import OnnxSenseVoiceModel, find_onnx_int8, quantize_dynamic_int8
+from auto_asr.runtime_tuning import apply_backend_threads, get_runtime_tuning
 
 logger = logging.getLogger(__name__)
 
@@ -23,9 +32,13 @@ class FunASRConfig:
     language: str
     use_itn: bool
     enable_punc: bool = True
+    # int8 inference on CPU (see `auto_asr.quantization`); ignored on CUDA.
+    quantize: bool = False
 
 
-_MODEL_CACHE: dict[tuple[str, str, bool], Any] = {}
+# Loaded models live in the shared residency registry under this owner, keyed by
+# (model, device, punc, quantize).
+_OWNER = "funasr"
 
 
 def _needs_trust_remote_code(model: str) -> bool:
@@ -123,7 +136,77 @@ def _filter_kwargs(func: Any, kwargs: dict[str, Any]) -> dict[str, Any]:
         return kwargs
 
 
+def _model_key(cfg: FunASRConfig) -> tuple:
+    return (cfg.model, cfg.device, bool(cfg.enable_punc), bool(cfg.quantize))
+
+
 def _make_model(cfg: FunASRConfig) -> Any:
+    """Return the resident model for `cfg`, loading it (once, even under concurrency) if needed."""
+    return get_model_residency().get_or_load(
+        _OWNER, _model_key(cfg), lambda: _load_model(cfg), device=cfg.device
+    )
+
+
+def _use_model(cfg: FunASRConfig) -> AbstractContextManager[Any]:
+    """`_make_model`, leased for one inference call so it isn't evicted while the call runs."""
+    return get_model_residency().use(
+        _OWNER, _model_key(cfg), lambda: _load_model(cfg), device=cfg.device
+    )
+
+
+def _load_model(cfg: FunASRConfig) -> Any:
+    apply_backend_threads("funasr")
+    model = _load_maybe_quantized(cfg)
+    if get_runtime_tuning().warmup:
+        _warmup(model)
+    return model
+
+
+def _warmup(model_obj: Any) -> None:
+    """One pass over 1 s of silence, so lazy initialization isn't billed to the first region."""
+    started = time.monotonic()
+    gen_kwargs: dict[str, Any] = {
+        "input": np.zeros(WAV_SAMPLE_RATE, dtype=np.float32),
+        "fs": WAV_SAMPLE_RATE,
+        "cache": {},
+        "language": "auto",
+        "use_itn": True,
+    }
+    try:
+        model_obj.generate(**_filter_kwargs(model_obj.generate, gen_kwargs))
+    except Exception as e:
+        logger.warning("FunASR 预热失败(已忽略): %s", e)
+        return
+    logger.info("FunASR 预热完成: %.2fs", time.monotonic() - started)
+
+
+def _load_maybe_quantized(cfg: FunASRConfig) -> Any:
+    if not cfg.quantize:
+        return _load_auto_model(cfg)
+    if str(cfg.device).startswith("cuda"):
+        logger.warning("FunASR int8 量化仅支持 CPU，已按原精度加载: device=%s", cfg.device)
+        return _load_auto_model(cfg)
+
+    model_dir = resolve_model_dir(cfg.model)
+    onnx_path = find_onnx_int8(model_dir) if "sensevoice" in cfg.model.lower() else None
+    if onnx_path:
+        try:
+            model = OnnxSenseVoiceModel(model_dir)
+        except Exception as e:
+            logger.warning("FunASR ONNX int8 加载失败，改用动态量化: %s", e)
+        else:
+            logger.info("FunASR 使用 ONNX int8 模型: %s", onnx_path)
+            if cfg.enable_punc:
+                logger.info("ONNX int8 模型不加载标点模型，enable_punc 在此路径无效")
+            return model
+
+    model = _load_auto_model(cfg)
+    count = quantize_dynamic_int8(model)
+    logger.info("FunASR 动态 int8 量化完成: model=%s, linear_layers=%d", cfg.model, count)
+    return model
+
+
+def _load_auto_model(cfg: FunASRConfig) -> Any:
     """
     Create a FunASR AutoModel with some sensible defaults.
 
@@ -133,10 +216,6 @@ def _make_model(cfg: FunASRConfig) -> Any:
 
     enable_punc = bool(cfg.enable_punc)
 
-    key = (cfg.model, cfg.device, enable_punc)
-    if key in _MODEL_CACHE:
-        return _MODEL_CACHE[key]
-
     AutoModel = _import_funasr()
     model_dir_or_id = resolve_model_dir(cfg.model)
     trust_remote_code = _needs_trust_remote_code(cfg.model)
@@ -187,8 +266,6 @@ def _make_model(cfg: FunASRConfig) -> Any:
                     raise
                 last_exc = e2
             else:
-                _MODEL_CACHE[key] = model
-                logger.info("FunASR 模型已加载: model=%s, device=%s, punc=%s", *key)
                 return model
 
         # Retry 2: try remote_code candidates (best-effort).
@@ -201,13 +278,9 @@ def _make_model(cfg: FunASRConfig) -> Any:
                 _raise_if_missing_tokenizers_deps(e3)
                 last_exc = e3
                 continue
-            _MODEL_CACHE[key] = model
-            logger.info("FunASR 模型已加载: model=%s, device=%s, punc=%s", *key)
             return model
 
         raise last_exc from None
-    _MODEL_CACHE[key] = model
-    logger.info("FunASR 模型已加载: model=%s, device=%s, punc=%s", *key)
     return model
 
 
@@ -561,30 +634,84 @@ def _extract_segments_from_result(res: Any, *, duration_s: float) -> tuple[str,
     return "", []
 
 
-def transcribe_file_funasr(
+def _make_config(
     *,
-    file_path: str,
     model: str,
     device: str,
     language: str,
     use_itn: bool,
     enable_punc: bool,
-    duration_s: float,
-) -> ASRResult:
+    quantize: bool = False,
+) -> FunASRConfig:
     cfg = FunASRConfig(
         model=(model or "").strip(),
         device=(device or "").strip(),
         language=(language or "").strip() or "auto",
         use_itn=bool(use_itn),
         enable_punc=bool(enable_punc),
+        quantize=bool(quantize),
     )
     if not cfg.model:
         raise RuntimeError("请先选择 FunASR 本地模型。")
+    return cfg
+
+
+def transcribe_file_funasr(
+    *,
+    file_path: str,
+    model: str,
+    device: str,
+    language: str,
+    use_itn: bool,
+    enable_punc: bool,
+    duration_s: float,
+    quantize: bool = False,
+) -> ASRResult:
+    cfg = _make_config(
+        model=model,
+        device=device,
+        language=language,
+        use_itn=use_itn,
+        enable_punc=enable_punc,
+        quantize=quantize,
+    )
+    return _transcribe_whole(cfg, file_path, duration_s=duration_s)
 
-    model_obj = _make_model(cfg)
 
+def transcribe_wav_funasr(
+    *,
+    wav: np.ndarray,
+    model: str,
+    device: str,
+    language: str,
+    use_itn: bool,
+    enable_punc: bool,
+    quantize: bool = False,
+) -> ASRResult:
+    """Like `transcribe_file_funasr`, for audio already decoded to 16 kHz mono float32.
+
+    Saves FunASR a second decode of the input (and the extra copy of the waveform it holds).
+    """
+    cfg = _make_config(
+        model=model,
+        device=device,
+        language=language,
+        use_itn=use_itn,
+        enable_punc=enable_punc,
+        quantize=quantize,
+    )
+    return _transcribe_whole(
+        cfg,
+        np.ascontiguousarray(wav, dtype=np.float32),
+        duration_s=len(wav) / float(WAV_SAMPLE_RATE),
+    )
+
+
+def _transcribe_whole(
+    cfg: FunASRConfig, audio: str | np.ndarray, *, duration_s: float
+) -> ASRResult:
     gen_kwargs: dict[str, Any] = {
-        "input": file_path,
+        "input": audio,
         "cache": {},
         "language": cfg.language,
         "use_itn": bool(cfg.use_itn),
@@ -597,20 +724,111 @@ def transcribe_file_funasr(
         gen_kwargs["batch_size_s"] = 1
         gen_kwargs["batch_size"] = 1
         logger.info("FunASR-Nano: disable batch decoding: batch_size_s=1, batch_size=1")
-    try:
-        res = model_obj.generate(**_filter_kwargs(model_obj.generate, gen_kwargs))
-    except Exception as e:
-        raise RuntimeError(f"FunASR 推理失败({type(e).__name__}): {e}") from e
+    if isinstance(audio, np.ndarray):
+        gen_kwargs["fs"] = WAV_SAMPLE_RATE
+    with _use_model(cfg) as model_obj:
+        apply_backend_threads("funasr")
+        try:
+            res = model_obj.generate(**_filter_kwargs(model_obj.generate, gen_kwargs))
+        except Exception as e:
+            raise RuntimeError(f"FunASR 推理失败({type(e).__name__}): {e}") from e
 
     text, segments = _extract_segments_from_result(res, duration_s=duration_s)
     return ASRResult(text=text, segments=segments)
 
 
+def transcribe_arrays_funasr(
+    *,
+    wavs: Sequence[np.ndarray],
+    model: str,
+    device: str,
+    language: str,
+    use_itn: bool,
+    enable_punc: bool,
+    batch_size_s: float = 60.0,
+    max_batch_size: int = 64,
+    quantize: bool = False,
+    cancel_event: Event | None = None,
+    on_result: Callable[[int, ASRResult], None] | None = None,
+) -> list[ASRResult]:
+    """Transcribe in-memory 16 kHz mono regions, passing them to `generate` as batched lists.
+
+    Regions are batched by length (see `plan_length_batches`) so short ones aren't padded to the
+    longest region of the file; results come back in input order. `on_result(index, result)`
+    fires as each batch finishes (e.g. to cache results before a later batch fails).
+    """
+    cfg = _make_config(
+        model=model,
+        device=device,
+        language=language,
+        use_itn=use_itn,
+        enable_punc=enable_punc,
+        quantize=quantize,
+    )
+
+    if is_funasr_nano(cfg.model):
+        # No batch decoding support (see `transcribe_file_funasr`); still skips the disk round trip.
+        max_batch_size = 1
+
+    base_kwargs: dict[str, Any] = {
+        "cache": {},
+        "language": cfg.language,
+        "use_itn": bool(cfg.use_itn),
+        "fs": WAV_SAMPLE_RATE,
+    }
+
+    def _generate(model_obj: Any, items: list[np.ndarray]) -> Any:
+        gen_kwargs = dict(base_kwargs, input=items, batch_size=len(items))
+        try:
+            return model_obj.generate(**_filter_kwargs(model_obj.generate, gen_kwargs))
+        except Exception as e:
+            raise RuntimeError(f"FunASR 推理失败({type(e).__name__}): {e}") from e
+
+    durations = [len(w) / float(WAV_SAMPLE_RATE) for w in wavs]
+    results: list[ASRResult | None] = [None] * len(wavs)
+    todo = [i for i, d in enumerate(durations) if d > 0]
+    for i, d in enumerate(durations):
+        if d <= 0:
+            results[i] = ASRResult(text="", segments=[])
+
+    batches = plan_length_batches(
+        [durations[i] for i in todo],
+        batch_size_s=float(batch_size_s),
+        max_batch_size=max_batch_size,
+    )
+    logger.info(
+        "FunASR 批量推理: regions=%d, batches=%d, batch_size_s=%s, max_batch=%d",
+        len(todo),
+        len(batches),
+        batch_size_s,
+        max_batch_size,
+    )
+    # Leased for the whole loop: idle eviction must not drop the model between batches.
+    with _use_model(cfg) as model_obj:
+        apply_backend_threads("funasr")
+        for batch in batches:
+            if cancel_event is not None and cancel_event.is_set():
+                raise RuntimeError("已停止转写。")
+            idxs = [todo[j] for j in batch]
+            items = [np.ascontiguousarray(wavs[i], dtype=np.float32) for i in idxs]
+            res = _generate(model_obj, items)
+            if not isinstance(res, list) or len(res) != len(items):
+                # Unexpected output shape for this model: fall back to one region per call.
+                res = [(_generate(model_obj, [x]) or [None])[0] for x in items]
+            for i, item in zip(idxs, res, strict=True):
+                text, segments = _extract_segments_from_result([item], duration_s=durations[i])
+                results[i] = ASRResult(text=text, segments=segments)
+                if on_result is not None:
+                    on_result(i, results[i])
+    return [r if r is not None else ASRResult(text="", segments=[]) for r in results]
+
+
 def preload_funasr_model(
     *,
     model: str,
     device: str,
     enable_punc: bool = True,
+    quantize: bool = False,
 ) -> None:
     """
     Preload a FunASR model into process memory (and cache it) to reduce first-run latency.
@@ -621,6 +839,7 @@ def preload_funasr_model(
         language="auto",
         use_itn=True,
         enable_punc=bool(enable_punc),
+        quantize=bool(quantize),
     )
     if not cfg.model:
         raise RuntimeError("请先选择 FunASR 本地模型。")
@@ -655,24 +874,12 @@ def download_funasr_model(
 
 
 def release_funasr_resources() -> None:
-    """Best-effort release FunASR model CPU/GPU memory for this process."""
-
-    cached = len(_MODEL_CACHE)
-    _MODEL_CACHE.clear()
-
-    # Drop Python references first.
-    with contextlib.suppress(Exception):
-        gc_collect()
+    """Best-effort release FunASR model CPU/GPU memory for this process.
 
-    # Drop CUDA allocator caches if available.
-    with contextlib.suppress(Exception):
-        import torch  # type: ignore
-
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-            with contextlib.suppress(Exception):
-                torch.cuda.ipc_collect()
+    Models otherwise stay resident between jobs (see `auto_asr.model_residency`).
+    """
 
+    cached = get_model_residency().release(_OWNER)
     logger.info("FunASR 资源清理完成: cleared_models=%d", cached)
 
 
@@ -680,5 +887,7 @@ __all__ = [
     "download_funasr_model",
     "preload_funasr_model",
     "release_funasr_resources",
+    "transcribe_arrays_funasr",
     "transcribe_file_funasr",
+    "transcribe_wav_funasr",
 ]
@@ -0,0 +1,235 @@
+"""Multi-process CPU inference for FunASR.
+
+One FunASR model instance in the UI process runs regions strictly in order (Fun-ASR-Nano even
+one region per `generate` call), so a many-core server mostly idles. `FunASRProcessPool` starts
+`processes` worker processes (spawned, so no torch state is forked), each with its own model and
+a fixed torch thread count; optionally each worker is pinned to its own slice of CPU cores.
+
+Regions are grouped into length batches in the parent and sent to workers through the
+executor's task queue; results come back as `ASRResult`s, in input order. The pool stays alive
+between jobs (the worker models stay loaded) until its settings change or it is shut down.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing as mp
+import os
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, replace
+from threading import Event, Lock
+from typing import Any
+
+import numpy as np
+
+from auto_asr.audio_tools import WAV_SAMPLE_RATE
+from auto_asr.batching import plan_length_batches
+from auto_asr.funasr_asr import preload_funasr_model, transcribe_arrays_funasr
+from auto_asr.model_residency import ResidencyPolicy, configure_model_residency
+from auto_asr.openai_asr import ASRResult
+from auto_asr.runtime_tuning import RuntimeTuning, configure_runtime_tuning, get_runtime_tuning
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class FunASRPoolConfig:
+    model: str
+    processes: int
+    # torch intra-op threads per worker; 0 splits the usable cores evenly across workers.
+    threads_per_process: int = 0
+    enable_punc: bool = True
+    cpu_affinity: bool = False
+    quantize: bool = False
+
+
+def _usable_cores() -> list[int]:
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except Exception:
+        return list(range(os.cpu_count() or 1))
+
+
+def resolve_threads_per_process(processes: int, threads_per_process: int = 0) -> int:
+    if int(threads_per_process) > 0:
+        return int(threads_per_process)
+    return max(1, len(_usable_cores()) // max(1, int(processes)))
+
+
+def _worker_init(
+    cfg: FunASRPoolConfig, threads: int, counter: Any, cores: list[int], tuning: RuntimeTuning
+) -> None:
+    with counter.get_lock():
+        index = int(counter.value)
+        counter.value += 1
+
+    # Set before torch initializes its thread pools (torch is first imported by the model load).
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    if cfg.cpu_affinity and cores:
+        start = (index * threads) % len(cores)
+        mine = [cores[(start + i) % len(cores)] for i in range(min(threads, len(cores)))]
+        try:
+            os.sched_setaffinity(0, mine)
+        except Exception as e:
+            logger.warning("FunASR 工作进程绑定 CPU 失败(已忽略): %s", e)
+    # No idle TTL: the worker's model lives as long as the pool (shut down on settings change).
+    configure_model_residency(ResidencyPolicy(idle_ttl_s=0.0))
+    # The parent's tuning (warm-up, allocator env), with this worker's thread count.
+    configure_runtime_tuning(
+        replace(tuning, funasr_threads=threads, interop_threads=tuning.interop_threads or 1)
+    )
+
+    started = time.monotonic()
+    preload_funasr_model(
+        model=cfg.model, device="cpu", enable_punc=cfg.enable_punc, quantize=cfg.quantize
+    )
+    logger.info(
+        "FunASR 工作进程就绪: index=%d, pid=%d, threads=%d, load=%.1fs",
+        index,
+        os.getpid(),
+        threads,
+        time.monotonic() - started,
+    )
+
+
+def _worker_transcribe(
+    wavs: list[np.ndarray], cfg: FunASRPoolConfig, language: str, use_itn: bool
+) -> list[ASRResult]:
+    return transcribe_arrays_funasr(
+        wavs=wavs,
+        model=cfg.model,
+        device="cpu",
+        language=language,
+        use_itn=use_itn,
+        enable_punc=cfg.enable_punc,
+        quantize=cfg.quantize,
+    )
+
+
+class FunASRProcessPool:
+    """A set of CPU worker processes, each holding its own FunASR model."""
+
+    def __init__(self, cfg: FunASRPoolConfig) -> None:
+        self.cfg = cfg
+        self.threads = resolve_threads_per_process(cfg.processes, cfg.threads_per_process)
+        self.broken = False
+        ctx = mp.get_context("spawn")
+        self._executor = ProcessPoolExecutor(
+            max_workers=max(1, int(cfg.processes)),
+            mp_context=ctx,
+            initializer=_worker_init,
+            initargs=(
+                cfg,
+                self.threads,
+                ctx.Value("i", 0),
+                _usable_cores(),
+                get_runtime_tuning(),
+            ),
+        )
+        logger.info(
+            "FunASR CPU 进程池已启动: model=%s, processes=%d, threads=%d, affinity=%s",
+            cfg.model,
+            cfg.processes,
+            self.threads,
+            cfg.cpu_affinity,
+        )
+
+    def transcribe(
+        self,
+        wavs: Sequence[np.ndarray],
+        *,
+        language: str,
+        use_itn: bool,
+        batch_size_s: float = 60.0,
+        max_batch_size: int = 16,
+        cancel_event: Event | None = None,
+        on_result: Callable[[int, ASRResult], None] | None = None,
+    ) -> list[ASRResult]:
+        """Transcribe 16 kHz mono regions across the workers; same contract as
+        `transcribe_arrays_funasr` (results in input order, `on_result` as batches finish)."""
+        durations = [len(w) / float(WAV_SAMPLE_RATE) for w in wavs]
+        # Smaller batches than in-process inference, so every worker gets work on short files.
+        limit = max(1, min(int(max_batch_size), -(-len(wavs) // max(1, self.cfg.processes))))
+        batches = plan_length_batches(durations, batch_size_s=batch_size_s, max_batch_size=limit)
+        # Longest batches first: the tail of the job is then made of short ones.
+        batches.sort(key=lambda b: -sum(durations[i] for i in b))
+        logger.info(
+            "FunASR 多进程推理: regions=%d, batches=%d, processes=%d",
+            len(wavs),
+            len(batches),
+            self.cfg.processes,
+        )
+
+        results: list[ASRResult | None] = [None] * len(wavs)
+        pending: dict[Future, list[int]] = {}
+        for batch in batches:
+            fut = self._executor.submit(
+                _worker_transcribe,
+                [np.ascontiguousarray(wavs[i], dtype=np.float32) for i in batch],
+                self.cfg,
+                language,
+                bool(use_itn),
+            )
+            pending[fut] = batch
+        try:
+            while pending:
+                done, _ = wait(list(pending), timeout=0.5, return_when=FIRST_COMPLETED)
+                if cancel_event is not None and cancel_event.is_set():
+                    raise RuntimeError("已停止转写。")
+                for fut in done:
+                    batch = pending.pop(fut)
+                    for i, res in zip(batch, fut.result(), strict=True):
+                        results[i] = res
+                        if on_result is not None:
+                            on_result(i, res)
+        except BrokenProcessPool as e:
+            # A worker died (OOM kill, crash in native code); the next job starts a fresh pool.
+            self.broken = True
+            raise RuntimeError(f"FunASR 工作进程异常退出: {e}") from e
+        finally:
+            for fut in pending:
+                fut.cancel()
+        return [r if r is not None else ASRResult(text="", segments=[]) for r in results]
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_POOL: FunASRProcessPool | None = None
+_POOL_LOCK = Lock()
+
+
+def get_funasr_pool(cfg: FunASRPoolConfig) -> FunASRProcessPool:
+    """Shared pool for `cfg`; a pool with different settings is shut down and replaced."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None and (_POOL.broken or _POOL.cfg != cfg):
+            _POOL.shutdown()
+            _POOL = None
+        if _POOL is None:
+            _POOL = FunASRProcessPool(cfg)
+        return _POOL
+
+
+def shutdown_funasr_pool() -> bool:
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is None:
+        return False
+    pool.shutdown()
+    logger.info("FunASR CPU 进程池已关闭")
+    return True
+
+
+__all__ = [
+    "FunASRPoolConfig",
+    "FunASRProcessPool",
+    "get_funasr_pool",
+    "resolve_threads_per_process",
+    "shutdown_funasr_pool",
+]
@@ -0,0 +1,117 @@
+"""Process-wide pooled OpenAI clients.
+
+ASR uploads and subtitle LLM calls often target the same OpenAI-compatible endpoint. Creating a
+new `OpenAI` client per job (or per worker thread) throws away keep-alive connections and repeats
+TLS handshakes, so we keep one client per (base_url, api_key) and share it across jobs/threads.
+"""
+
+from __future__ import annotations
+
+import logging
+import weakref
+from threading import Lock
+
+import httpx
+from openai import DefaultHttpxClient, OpenAI
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 16
+KEEPALIVE_EXPIRY_S = 60.0
+
+# (base_url, api_key) -> (client, pool_size)
+_CLIENTS: dict[tuple[str, str], tuple[OpenAI, int]] = {}
+_LOCK = Lock()
+
+
+def _http2_available() -> bool:
+    # httpx only speaks HTTP/2 when the optional `h2` package is installed.
+    try:
+        import h2  # type: ignore  # noqa: F401
+    except Exception:
+        return False
+    return True
+
+
+_HTTP2 = _http2_available()
+
+
+def _client_key(*, api_key: str, base_url: str | None) -> tuple[str, str]:
+    return ((base_url or "").strip().rstrip("/"), (api_key or "").strip())
+
+
+def _make_http_client(pool_size: int) -> httpx.Client:
+    limits = httpx.Limits(
+        max_connections=int(pool_size),
+        max_keepalive_connections=int(pool_size),
+        keepalive_expiry=KEEPALIVE_EXPIRY_S,
+    )
+    return DefaultHttpxClient(limits=limits, http2=_HTTP2)
+
+
+def get_openai_client(
+    *,
+    api_key: str,
+    base_url: str | None = None,
+    max_connections: int | None = None,
+) -> OpenAI:
+    """Return the shared client for (base_url, api_key), creating it on first use.
+
+    `max_connections` should match the caller's concurrency. If a caller needs a larger pool
+    than the cached client has, the client is replaced by a bigger one (in-flight requests keep
+    using the old client; its connections are closed once nothing references it any more).
+    Callers should pass `base_url` normalized with `normalize_base_url`, so ASR and LLM calls to
+    the same endpoint share one client.
+    """
+    key = _client_key(api_key=api_key, base_url=base_url)
+    wanted = max(1, int(max_connections or DEFAULT_MAX_CONNECTIONS))
+
+    with _LOCK:
+        cached = _CLIENTS.get(key)
+        if cached is not None and cached[1] >= wanted:
+            return cached[0]
+
+        pool_size = max(wanted, DEFAULT_MAX_CONNECTIONS, cached[1] if cached else 0)
+        kwargs: dict[str, object] = {
+            "api_key": key[1],
+            "http_client": _make_http_client(pool_size),
+        }
+        if key[0]:
+            kwargs["base_url"] = key[0]
+        client = OpenAI(**kwargs)  # type: ignore[arg-type]
+        _CLIENTS[key] = (client, pool_size)
+        if cached is not None:
+            # Jobs still holding the old client keep it alive; close its sockets after them.
+            weakref.finalize(cached[0], _close_quietly, cached[0]._client)
+
+    logger.info(
+        "OpenAI 连接池已创建: base_url=%s, pool_size=%d, http2=%s",
+        key[0] or "(default)",
+        pool_size,
+        _HTTP2,
+    )
+    return client
+
+
+def _close_quietly(http_client: httpx.Client) -> None:
+    try:
+        http_client.close()
+    except Exception as e:  # pragma: no cover
+        logger.info("关闭旧的 OpenAI 连接池失败(忽略): %s", e)
+
+
+def close_openai_clients() -> int:
+    """Close all pooled clients (e.g. on shutdown). Returns the number of clients closed."""
+    with _LOCK:
+        clients = [c for (c, _size) in _CLIENTS.values()]
+        _CLIENTS.clear()
+
+    for c in clients:
+        try:
+            c.close()
+        except Exception as e:  # pragma: no cover
+            logger.info("关闭 OpenAI 客户端失败(忽略): %s", e)
+    return len(clients)
+
+
+__all__ = ["DEFAULT_MAX_CONNECTIONS", "close_openai_clients", "get_openai_client"]
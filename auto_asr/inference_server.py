@@ -0,0 +1,440 @@
+"""Out-of-process host for the local ASR backends (FunASR / Qwen3-ASR).
+
+Loading FunASR or Qwen3-ASR in the Gradio process leaves it with a multi-GB RSS that
+`gc.collect()` and `torch.cuda.empty_cache()` rarely give back, and a crash in native model
+code takes the whole UI down. With `inference_server_url` set, the pipeline sends PCM regions
+to this daemon instead; memory is reclaimed by restarting it, and a crash only fails the job.
+
+Usage:
+    python -m auto_asr.inference_server [--host 127.0.0.1] [--port 8766]
+
+HTTP API (stdlib server, one thread per request):
+- `POST /v1/transcribe`: body is one JSON header line, then the regions as concatenated
+  little-endian float32 16 kHz mono PCM. The header holds `backend` (funasr / qwen3asr),
+  `mode` (regions / whole), `lengths` (samples per region) and backend `options`.
+  Returns `{"results": [{"text": ..., "segments": [[start_s, end_s, text], ...]}, ...]}`.
+- `GET /health`: pid, RSS and resident models.
+- `POST /preload`: JSON `{"backend": ..., "options": {...}}`; loads the model without audio.
+- `POST /release`: drop all resident models (the process stays up).
+- `POST /shutdown`: exit the process.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event
+from typing import Any
+
+import httpx
+import numpy as np
+
+from auto_asr.audio_tools import WAV_SAMPLE_RATE
+from auto_asr.config import load_config
+from auto_asr.model_residency import (
+    configure_model_residency,
+    get_model_residency,
+    policy_from_config,
+    process_rss_mb,
+)
+from auto_asr.openai_asr import ASRResult, ASRSegment
+from auto_asr.runtime_tuning import configure_runtime_tuning, runtime_report, tuning_from_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8766
+# Audio per request when sending regions: bounds request size and lets a cancel take effect
+# between requests.
+_REQUEST_AUDIO_S = 300.0
+
+
+def _result_to_json(result: ASRResult) -> dict[str, Any]:
+    return {
+        "text": result.text,
+        "segments": [[s.start_s, s.end_s, s.text] for s in result.segments],
+    }
+
+
+def _result_from_json(data: dict[str, Any]) -> ASRResult:
+    segments = [
+        ASRSegment(start_s=float(s), end_s=float(e), text=str(t))
+        for (s, e, t) in data.get("segments", [])
+    ]
+    return ASRResult(text=str(data.get("text", "") or ""), segments=segments)
+
+
+def _split_pcm(body: bytes, lengths: Sequence[int]) -> list[np.ndarray]:
+    pcm = np.frombuffer(body, dtype="<f4")
+    if len(pcm) != sum(int(n) for n in lengths):
+        raise ValueError(f"PCM 长度不匹配: got={len(pcm)}, expected={sum(lengths)}")
+    out: list[np.ndarray] = []
+    offset = 0
+    for n in lengths:
+        out.append(pcm[offset : offset + int(n)])
+        offset += int(n)
+    return out
+
+
+def _resolve_funasr_device(device: str) -> str:
+    if (device or "").strip().lower() not in {"", "auto"}:
+        return device
+    try:
+        import torch  # type: ignore
+
+        if torch.cuda.is_available():
+            return "cuda:0"
+    except Exception:
+        pass
+    return "cpu"
+
+
+def _run(header: dict[str, Any], wavs: list[np.ndarray]) -> list[ASRResult]:
+    backend = str(header.get("backend") or "")
+    mode = str(header.get("mode") or "regions")
+    opts = dict(header.get("options") or {})
+    if backend == "funasr":
+        from auto_asr.funasr_asr import transcribe_arrays_funasr, transcribe_wav_funasr
+
+        common = {
+            "model": str(opts.get("model") or ""),
+            "device": _resolve_funasr_device(str(opts.get("device") or "auto")),
+            "language": str(opts.get("language") or "auto"),
+            "use_itn": bool(opts.get("use_itn", True)),
+            "enable_punc": bool(opts.get("enable_punc", True)),
+            "quantize": bool(opts.get("quantize", False)),
+        }
+        if mode == "whole":
+            return [transcribe_wav_funasr(wav=w, **common) for w in wavs]
+        return transcribe_arrays_funasr(wavs=wavs, **common)
+    if backend == "qwen3asr":
+        from auto_asr.qwen3_asr import Qwen3ASRConfig, transcribe_chunks_qwen3
+
+        cfg = Qwen3ASRConfig(
+            model=str(opts.get("model") or "Qwen/Qwen3-ASR-1.7B"),
+            device=str(opts.get("device") or "auto"),
+            max_inference_batch_size=max(1, int(opts.get("max_inference_batch_size") or 8)),
+            quantize=bool(opts.get("quantize", False)),
+            auto_batch=bool(opts.get("auto_batch", False)),
+            batch_memory_mb=max(0.0, float(opts.get("batch_memory_mb") or 0.0)),
+            max_new_tokens_per_s=max(0.0, float(opts.get("max_new_tokens_per_s", 15.0))),
+            min_new_tokens=max(1, int(opts.get("min_new_tokens") or 48)),
+        )
+        return transcribe_chunks_qwen3(
+            chunks=wavs,
+            cfg=cfg,
+            language=opts.get("language") or None,
+            sample_rate=WAV_SAMPLE_RATE,
+        )
+    raise ValueError(f"不支持的 backend: {backend!r}")
+
+
+def _preload(header: dict[str, Any]) -> None:
+    backend = str(header.get("backend") or "")
+    opts = dict(header.get("options") or {})
+    if backend == "funasr":
+        from auto_asr.funasr_asr import preload_funasr_model
+
+        preload_funasr_model(
+            model=str(opts.get("model") or ""),
+            device=_resolve_funasr_device(str(opts.get("device") or "auto")),
+            enable_punc=bool(opts.get("enable_punc", True)),
+            quantize=bool(opts.get("quantize", False)),
+        )
+    elif backend == "qwen3asr":
+        from auto_asr.qwen3_asr import Qwen3ASRConfig, preload_qwen3_model
+
+        preload_qwen3_model(
+            Qwen3ASRConfig(
+                model=str(opts.get("model") or "Qwen/Qwen3-ASR-1.7B"),
+                device=str(opts.get("device") or "auto"),
+                max_inference_batch_size=max(1, int(opts.get("max_inference_batch_size") or 8)),
+                quantize=bool(opts.get("quantize", False)),
+            )
+        )
+    else:
+        raise ValueError(f"不支持的 backend: {backend!r}")
+
+
+class InferenceServer:
+    """HTTP daemon hosting local models; `serve_forever()` blocks until `/shutdown`."""
+
+    def __init__(self, *, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> None:
+        self._httpd = ThreadingHTTPServer((host, int(port)), self._make_handler())
+        self._httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:
+                logger.debug("inference-server: " + format, *args)
+
+            def _send_json(self, status: int, obj: Any) -> None:
+                data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self) -> None:
+                if self.path.rstrip("/") != "/health":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                residency = get_model_residency()
+                self._send_json(
+                    200,
+                    {
+                        "pid": os.getpid(),
+                        "rss_mb": round(process_rss_mb(), 1),
+                        "models": [asdict(m) for m in residency.snapshot()],
+                        "load_stats": asdict(residency.load_stats()),
+                    },
+                )
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length > 0 else b""
+                route = self.path.split("?", 1)[0].rstrip("/")
+                if route == "/release":
+                    self._send_json(200, {"released": get_model_residency().release()})
+                elif route == "/shutdown":
+                    self._send_json(200, {"pid": os.getpid()})
+                    threading.Thread(target=server._httpd.shutdown, daemon=True).start()
+                elif route == "/preload":
+                    self._preload(body)
+                elif route == "/v1/transcribe":
+                    self._transcribe(body)
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def _preload(self, body: bytes) -> None:
+                try:
+                    header = json.loads(body.decode("utf-8") or "{}")
+                    _preload(header)
+                except Exception as e:
+                    logger.exception("加载模型失败")
+                    self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+                    return
+                self._send_json(200, {"ok": True})
+
+            def _transcribe(self, body: bytes) -> None:
+                started = time.monotonic()
+                line, _, pcm = body.partition(b"\n")
+                try:
+                    header = json.loads(line.decode("utf-8"))
+                    wavs = _split_pcm(pcm, header.get("lengths") or [])
+                except Exception as e:
+                    self._send_json(400, {"error": f"请求格式错误: {e}"})
+                    return
+                try:
+                    results = _run(header, wavs)
+                except Exception as e:
+                    logger.exception("推理失败: backend=%s", header.get("backend"))
+                    self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+                    return
+                logger.info(
+                    "推理完成: backend=%s, mode=%s, regions=%d, audio=%.1fs, %.2fs",
+                    header.get("backend"),
+                    header.get("mode"),
+                    len(wavs),
+                    sum(len(w) for w in wavs) / float(WAV_SAMPLE_RATE),
+                    time.monotonic() - started,
+                )
+                self._send_json(200, {"results": [_result_to_json(r) for r in results]})
+
+        return Handler
+
+    def serve_forever(self) -> None:
+        logger.info("本地推理服务已启动: %s, pid=%d", self.base_url, os.getpid())
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+            logger.info("本地推理服务已退出")
+
+
+class InferenceClient:
+    """Client for `InferenceServer`; thread-safe (one pooled httpx client)."""
+
+    def __init__(self, base_url: str, *, timeout_s: float = 3600.0) -> None:
+        self.base_url = str(base_url).rstrip("/")
+        self._http = httpx.Client(timeout=httpx.Timeout(timeout_s, connect=5.0))
+
+    def _post(self, path: str, content: bytes = b"") -> dict[str, Any]:
+        try:
+            resp = self._http.post(f"{self.base_url}{path}", content=content)
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"本地推理服务不可用({self.base_url}): {e}") from e
+        try:
+            data = resp.json()
+        except Exception:
+            data = {"error": resp.text[:500]}
+        if resp.status_code != 200:
+            raise RuntimeError(f"本地推理服务返回错误({resp.status_code}): {data.get('error')}")
+        return data
+
+    def health(self) -> dict[str, Any]:
+        try:
+            resp = self._http.get(f"{self.base_url}/health", timeout=5.0)
+            resp.raise_for_status()
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"本地推理服务不可用({self.base_url}): {e}") from e
+        return resp.json()
+
+    def preload(self, *, backend: str, options: dict[str, Any]) -> None:
+        body = json.dumps({"backend": backend, "options": options}, ensure_ascii=False)
+        self._post("/preload", body.encode("utf-8"))
+
+    def release(self) -> int:
+        return int(self._post("/release").get("released", 0))
+
+    def shutdown(self) -> None:
+        self._post("/shutdown")
+
+    def transcribe(
+        self,
+        wavs: Sequence[np.ndarray],
+        *,
+        backend: str,
+        options: dict[str, Any],
+        mode: str = "regions",
+        cancel_event: Event | None = None,
+        on_result: Callable[[int, ASRResult], None] | None = None,
+    ) -> list[ASRResult]:
+        """Send regions in requests of up to ~5 minutes of audio; results in input order."""
+        results: list[ASRResult] = []
+        i = 0
+        while i < len(wavs):
+            if cancel_event is not None and cancel_event.is_set():
+                raise RuntimeError("已停止转写。")
+            j, audio = i, 0
+            while j < len(wavs) and (
+                j == i or audio + len(wavs[j]) <= _REQUEST_AUDIO_S * WAV_SAMPLE_RATE
+            ):
+                audio += len(wavs[j])
+                j += 1
+            part = [np.ascontiguousarray(w, dtype="<f4") for w in wavs[i:j]]
+            header = {
+                "backend": backend,
+                "mode": mode,
+                "lengths": [len(w) for w in part],
+                "options": options,
+            }
+            body = json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n"
+            body += b"".join(w.tobytes() for w in part)
+            data = self._post("/v1/transcribe", body)
+            batch = [_result_from_json(r) for r in data.get("results", [])]
+            if len(batch) != len(part):
+                raise RuntimeError(f"本地推理服务返回数量不符: {len(batch)} != {len(part)}")
+            for k, res in enumerate(batch, start=i):
+                results.append(res)
+                if on_result is not None:
+                    on_result(k, res)
+            i = j
+        return results
+
+
+_CLIENTS: dict[str, InferenceClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_inference_client(base_url: str) -> InferenceClient:
+    """Shared client per server URL (keeps the connection pool across jobs)."""
+    key = str(base_url).strip().rstrip("/")
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _CLIENTS[key] = InferenceClient(key)
+        return client
+
+
+def start_inference_server(*, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> str:
+    """Spawn the daemon as a child process and wait until it answers; returns its base URL."""
+    base_url = f"http://{host}:{int(port)}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "auto_asr.inference_server", f"--host={host}", f"--port={port}"]
+    )
+    client = InferenceClient(base_url)
+    deadline = time.monotonic() + 30.0
+    while time.monotonic() < deadline:
+        try:
+            client.health()
+            logger.info("本地推理服务已就绪: %s, pid=%d", base_url, proc.pid)
+            return base_url
+        except RuntimeError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"本地推理服务启动失败: {base_url}")
+
+
+def restart_inference_server(base_url: str) -> str:
+    """Stop the daemon at `base_url` (if running) and start a fresh one on the same address.
+
+    Process exit is what actually returns the model memory to the OS.
+    """
+    client = InferenceClient(base_url)
+    try:
+        pid = int(client.health().get("pid") or 0)
+        client.shutdown()
+        logger.info("已停止本地推理服务: pid=%d", pid)
+    except RuntimeError as e:
+        logger.info("本地推理服务未运行，直接启动: %s", e)
+    host_port = base_url.split("://", 1)[-1].rstrip("/")
+    host, _, port = host_port.rpartition(":")
+    deadline = time.monotonic() + 10.0
+    while time.monotonic() < deadline:
+        try:
+            client.health()
+        except RuntimeError:
+            break
+        time.sleep(0.1)
+    return start_inference_server(host=host or "127.0.0.1", port=int(port or DEFAULT_PORT))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m auto_asr.inference_server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    # Same `runtime_*` and `model_*` settings as the UI process (threads, allocator env,
+    # warm-up; model idle TTL and RAM/VRAM budgets).
+    config = load_config()
+    configure_runtime_tuning(tuning_from_config(config))
+    configure_model_residency(policy_from_config(config))
+    logger.info("运行时设置: %s", runtime_report())
+    InferenceServer(host=args.host, port=args.port).serve_forever()
+    return 0
+
+
+__all__ = [
+    "DEFAULT_PORT",
+    "InferenceClient",
+    "InferenceServer",
+    "get_inference_client",
+    "restart_inference_server",
+    "start_inference_server",
+]
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
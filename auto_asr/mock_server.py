@@ -0,0 +1,291 @@
+"""Local stand-in for an OpenAI-compatible ASR/LLM endpoint, for offline benchmarking.
+
+Implements just enough of the API for this project:
+- `POST /v1/audio/transcriptions` (json / text / verbose_json, optional `stream=true` SSE)
+- `POST /v1/chat/completions`
+- `GET /stats` (request counts and latency percentiles per route; not part of the OpenAI API)
+
+Outputs are deterministic: transcriptions are one numbered segment every `segment_s` seconds of
+uploaded audio, and chat replies echo the first JSON object found in the last user message (so
+the subtitle processors' validation passes) or the message itself. Latency is drawn from a
+lognormal distribution around `latency_ms` (+ `latency_per_audio_s_ms` per audio second), and
+429/500 responses can be injected at fixed rates; the random stream is seeded.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import wave
+from dataclasses import dataclass
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+
+
+@dataclass(frozen=True)
+class MockConfig:
+    latency_ms: float = 300.0
+    # Extra latency per second of uploaded audio (transcriptions only).
+    latency_per_audio_s_ms: float = 20.0
+    # Lognormal sigma of the latency multiplier; 0 makes latency fixed.
+    jitter: float = 0.3
+    throttle_rate: float = 0.0
+    error_rate: float = 0.0
+    retry_after_s: float = 1.0
+    segment_s: float = 5.0
+    # Used when the upload is not a WAV file (bytes per second of compressed audio).
+    assumed_bytes_per_s: float = 24000.0
+    seed: int = 0
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def _audio_seconds(data: bytes, assumed_bytes_per_s: float) -> float:
+    try:
+        with wave.open(io.BytesIO(data), "rb") as w:
+            return w.getnframes() / float(w.getframerate() or 1)
+    except Exception:
+        return len(data) / max(1.0, float(assumed_bytes_per_s))
+
+
+def _parse_multipart(content_type: str, body: bytes) -> dict[str, bytes]:
+    msg = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+    )
+    fields: dict[str, bytes] = {}
+    for part in msg.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if name:
+            fields[str(name)] = part.get_payload(decode=True) or b""
+    return fields
+
+
+def _echo_reply(messages: Any) -> str:
+    last = ""
+    for m in messages or []:
+        if isinstance(m, dict) and m.get("role") == "user":
+            last = str(m.get("content") or "")
+    match = _JSON_OBJECT.search(last)
+    if match:
+        try:
+            obj = json.loads(match.group(0))
+        except Exception:
+            obj = None
+        if isinstance(obj, dict):
+            return json.dumps(obj, ensure_ascii=False)
+    return last
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._latencies: dict[str, list[float]] = {}
+        self._statuses: dict[str, dict[str, int]] = {}
+
+    def record(self, route: str, status: int, latency_s: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(route, []).append(latency_s)
+            counts = self._statuses.setdefault(route, {})
+            counts[str(status)] = counts.get(str(status), 0) + 1
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                route: {
+                    "requests": len(lat),
+                    "status": dict(self._statuses.get(route, {})),
+                    "p50_ms": round(_percentile(lat, 0.5) * 1000.0, 1),
+                    "p95_ms": round(_percentile(lat, 0.95) * 1000.0, 1),
+                }
+                for route, lat in self._latencies.items()
+            }
+
+
+class MockServer:
+    """Threaded mock endpoint; use `start()`/`stop()` or run `serve_forever()` directly."""
+
+    def __init__(self, config: MockConfig | None = None, *, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MockConfig()
+        self.stats = _Stats()
+        self._rng = random.Random(self.config.seed)
+        self._rng_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._httpd = ThreadingHTTPServer((host, int(port)), self._make_handler())
+        self._httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _draw(self) -> tuple[float, float]:
+        with self._rng_lock:
+            return self._rng.random(), self._rng.lognormvariate(0.0, max(0.0, self.config.jitter))
+
+    def _make_handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:
+                logger.debug("mock: " + format, *args)
+
+            def _send(self, status: int, body: bytes, content_type: str, **headers: str) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in headers.items():
+                    self.send_header(k.replace("_", "-"), v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_json(self, status: int, obj: Any, **headers: str) -> None:
+                data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self._send(status, data, "application/json", **headers)
+
+            def do_GET(self) -> None:
+                if self.path.rstrip("/") == "/stats":
+                    self._send_json(200, server.stats.snapshot())
+                    return
+                self._send_json(404, {"error": {"message": "not found"}})
+
+            def do_POST(self) -> None:
+                started = time.monotonic()
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length > 0 else b""
+                route = self.path.split("?", 1)[0].rstrip("/")
+                status = 200
+                try:
+                    if route.endswith("/audio/transcriptions"):
+                        status = self._transcriptions(body)
+                    elif route.endswith("/chat/completions"):
+                        status = self._chat(body)
+                    else:
+                        status = 404
+                        self._send_json(404, {"error": {"message": "not found"}})
+                finally:
+                    server.stats.record(route, status, time.monotonic() - started)
+
+            def _inject(self, audio_s: float = 0.0) -> int | None:
+                cfg = server.config
+                roll, factor = server._draw()
+                delay_s = (cfg.latency_ms + cfg.latency_per_audio_s_ms * audio_s) / 1000.0
+                time.sleep(max(0.0, delay_s * factor))
+                if roll < cfg.throttle_rate:
+                    self._send_json(
+                        429,
+                        {"error": {"message": "rate limited (mock)", "type": "rate_limit"}},
+                        Retry_After=f"{cfg.retry_after_s:g}",
+                    )
+                    return 429
+                if roll < cfg.throttle_rate + cfg.error_rate:
+                    self._send_json(500, {"error": {"message": "internal error (mock)"}})
+                    return 500
+                return None
+
+            def _transcriptions(self, body: bytes) -> int:
+                fields = _parse_multipart(self.headers.get("Content-Type", ""), body)
+                audio_s = _audio_seconds(fields.get("file", b""), server.config.assumed_bytes_per_s)
+                injected = self._inject(audio_s)
+                if injected is not None:
+                    return injected
+
+                step = max(0.5, float(server.config.segment_s))
+                count = max(1, math.ceil(audio_s / step))
+                segments = [
+                    {
+                        "id": i,
+                        "start": round(i * step, 3),
+                        "end": round(min(audio_s, (i + 1) * step), 3),
+                        "text": f"segment {i + 1}",
+                    }
+                    for i in range(count)
+                ]
+                text = " ".join(s["text"] for s in segments)
+
+                fmt = fields.get("response_format", b"json").decode("utf-8", "ignore")
+                if fields.get("stream", b"").decode("utf-8", "ignore").lower() == "true":
+                    events = [
+                        {"type": "transcript.text.delta", "delta": s["text"] + " "}
+                        for s in segments
+                    ]
+                    events.append({"type": "transcript.text.done", "text": text})
+                    sse = "".join(f"data: {json.dumps(e)}\n\n" for e in events) + "data: [DONE]\n\n"
+                    self._send(200, sse.encode("utf-8"), "text/event-stream")
+                elif fmt == "text":
+                    self._send(200, text.encode("utf-8"), "text/plain; charset=utf-8")
+                elif fmt == "verbose_json":
+                    payload = {"duration": audio_s, "text": text, "segments": segments}
+                    self._send_json(200, {"task": "transcribe", **payload})
+                else:
+                    self._send_json(200, {"text": text})
+                return 200
+
+            def _chat(self, body: bytes) -> int:
+                try:
+                    req = json.loads(body.decode("utf-8") or "{}")
+                except Exception:
+                    self._send_json(400, {"error": {"message": "invalid json"}})
+                    return 400
+                injected = self._inject()
+                if injected is not None:
+                    return injected
+                content = _echo_reply(req.get("messages"))
+                self._send_json(
+                    200,
+                    {
+                        "id": "chatcmpl-mock",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": str(req.get("model") or "mock"),
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": content},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                    },
+                )
+                return 200
+
+        return Handler
+
+    def serve_forever(self) -> None:
+        logger.info("Mock 服务已启动: %s", self.base_url)
+        self._httpd.serve_forever()
+
+    def start(self) -> MockServer:
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+__all__ = ["MockConfig", "MockServer"]
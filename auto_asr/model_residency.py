@@ -0,0 +1,450 @@
+"""Keep local ASR models warm between jobs, within an idle TTL and a RAM/VRAM budget.
+
+FunASR and Qwen3-ASR weights take seconds to minutes to load, so models stay resident after a
+job instead of being released in the pipeline. Residency is bounded by:
+- an idle TTL: a model not used for `idle_ttl_s` is dropped (checked by a background sweeper and
+  after each job);
+- a memory budget per device kind (RAM for CPU models, VRAM for CUDA ones): loading a model that
+  doesn't fit evicts the least recently used models of that kind first.
+
+Both backends share one registry, so the budget and LRU order span all local models. Loads are
+single-flight per key: concurrent callers (two jobs, or a preload click during a job) wait for
+the load already in progress instead of loading a second copy.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+import time
+from collections.abc import Callable, Iterator, Mapping
+from dataclasses import dataclass
+from gc import collect as gc_collect
+from threading import Event, Lock, Thread
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IDLE_TTL_S = 600.0
+
+
+@dataclass(frozen=True)
+class ResidencyPolicy:
+    # 0 disables the corresponding limit.
+    idle_ttl_s: float = DEFAULT_IDLE_TTL_S
+    max_ram_mb: float = 0.0
+    max_vram_mb: float = 0.0
+
+
+def policy_from_config(config: Mapping[str, Any]) -> ResidencyPolicy:
+    """Read the `model_*` keys of the saved config (invalid values fall back to defaults)."""
+
+    def _mb(key: str, default: float) -> float:
+        try:
+            value = config.get(key)
+            return max(0.0, float(default if value is None else value))
+        except Exception:
+            return default
+
+    return ResidencyPolicy(
+        idle_ttl_s=_mb("model_idle_ttl_s", DEFAULT_IDLE_TTL_S),
+        max_ram_mb=_mb("model_ram_budget_mb", 0.0),
+        max_vram_mb=_mb("model_vram_budget_mb", 0.0),
+    )
+
+
+@dataclass(frozen=True)
+class ResidentModel:
+    owner: str
+    key: tuple
+    device: str
+    size_mb: float
+    idle_s: float
+    load_s: float
+
+
+@dataclass(frozen=True)
+class LoadStats:
+    loads: int
+    failures: int
+    # Callers that waited for another caller's load instead of loading themselves.
+    coalesced: int
+    load_s_total: float
+    last_load_s: float
+
+
+class _Entry:
+    def __init__(
+        self, owner: str, key: tuple, model: Any, device: str, size_mb: float, load_s: float
+    ) -> None:
+        self.owner = owner
+        self.key = key
+        self.model = model
+        self.device = device
+        self.size_mb = size_mb
+        self.load_s = load_s
+        self.last_used = time.monotonic()
+        # Leases held by running inference calls (see `ModelResidency.use`).
+        self.pins = 0
+
+    @property
+    def vram(self) -> bool:
+        return str(self.device).startswith("cuda")
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = Event()
+        self.model: Any = None
+        self.error: BaseException | None = None
+
+
+def torch_modules(model: Any) -> list[Any]:
+    """nn.Modules held by `model` itself or one attribute level down (wrappers like AutoModel)."""
+    try:
+        import torch  # type: ignore
+    except Exception:
+        return []
+    found: list[Any] = []
+    candidates = [model]
+    with contextlib.suppress(Exception):
+        candidates.extend(vars(model).values())
+    for obj in candidates:
+        if isinstance(obj, torch.nn.Module) and all(obj is not m for m in found):
+            found.append(obj)
+    return found
+
+
+def estimate_model_mb(model: Any) -> float:
+    """Best-effort size of a model's parameters and buffers in MiB (0 if unknown)."""
+    total = 0
+    seen: set[int] = set()
+    for module in torch_modules(model):
+        with contextlib.suppress(Exception):
+            for t in (*module.parameters(), *module.buffers()):
+                if id(t) in seen:
+                    continue
+                seen.add(id(t))
+                total += t.numel() * t.element_size()
+    return total / (1024.0 * 1024.0)
+
+
+def process_rss_mb() -> float:
+    """Resident set size of this process in MiB (Linux; 0 elsewhere)."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0)
+    except Exception:
+        return 0.0
+
+
+def available_memory_mb(device: str) -> float:
+    """Free memory for new allocations in MiB: CUDA free memory for cuda devices, otherwise
+    `MemAvailable` (Linux). 0 if unknown."""
+    if str(device).startswith("cuda"):
+        try:
+            import torch  # type: ignore
+
+            free, _total = torch.cuda.mem_get_info(torch.device(device))
+            return free / (1024.0 * 1024.0)
+        except Exception:
+            return 0.0
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024.0
+    except Exception:
+        pass
+    return 0.0
+
+
+def free_device_memory() -> None:
+    """Collect garbage and return cached CUDA allocator blocks to the driver (best-effort)."""
+    with contextlib.suppress(Exception):
+        gc_collect()
+    with contextlib.suppress(Exception):
+        import torch  # type: ignore
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+            with contextlib.suppress(Exception):
+                torch.cuda.ipc_collect()
+
+
+class ModelResidency:
+    """Registry of loaded models keyed by (owner, key); thread-safe."""
+
+    def __init__(self, policy: ResidencyPolicy | None = None) -> None:
+        self._policy = policy or ResidencyPolicy()
+        self._entries: dict[tuple[str, tuple], _Entry] = {}
+        self._loading: dict[tuple[str, tuple], _Flight] = {}
+        self._lock = Lock()
+        self._sweeper: Thread | None = None
+        self._loads = 0
+        self._failures = 0
+        self._coalesced = 0
+        self._load_s_total = 0.0
+        self._last_load_s = 0.0
+
+    @property
+    def policy(self) -> ResidencyPolicy:
+        return self._policy
+
+    def set_policy(self, policy: ResidencyPolicy) -> None:
+        self._policy = policy
+        logger.info(
+            "模型驻留策略: idle_ttl=%ss, max_ram=%sMB, max_vram=%sMB",
+            policy.idle_ttl_s,
+            policy.max_ram_mb,
+            policy.max_vram_mb,
+        )
+        self.evict_idle()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, owner: str, key: tuple) -> Any | None:
+        with self._lock:
+            entry = self._entries.get((owner, key))
+            if entry is None:
+                return None
+            entry.last_used = time.monotonic()
+            return entry.model
+
+    def get_or_load(self, owner: str, key: tuple, loader: Callable[[], Any], *, device: str) -> Any:
+        """Return the resident model, calling `loader` at most once per key at a time.
+
+        Callers arriving while the same key is loading wait for that load; if it fails, they get
+        the same error rather than starting another multi-GB load.
+        """
+        k = (owner, key)
+        with self._lock:
+            entry = self._entries.get(k)
+            if entry is not None:
+                entry.last_used = time.monotonic()
+                return entry.model
+            flight = self._loading.get(k)
+            leader = flight is None
+            if flight is None:
+                flight = _Flight()
+                self._loading[k] = flight
+
+        if not leader:
+            logger.info("模型正在由其他任务加载，等待: owner=%s, key=%s", owner, key)
+            started = time.monotonic()
+            flight.done.wait()
+            with self._lock:
+                self._coalesced += 1
+            if flight.error is not None:
+                raise flight.error
+            logger.info("等待模型加载完成: owner=%s, %.1fs", owner, time.monotonic() - started)
+            return flight.model
+
+        started = time.monotonic()
+        try:
+            model = loader()
+            load_s = time.monotonic() - started
+            self.put(owner, key, model, device=device, load_s=load_s)
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(k, None)
+                self._failures += 1
+            flight.error = e
+            flight.done.set()
+            raise
+        with self._lock:
+            self._loading.pop(k, None)
+            self._loads += 1
+            self._load_s_total += load_s
+            self._last_load_s = load_s
+        flight.model = model
+        flight.done.set()
+        return model
+
+    @contextlib.contextmanager
+    def use(
+        self, owner: str, key: tuple, loader: Callable[[], Any], *, device: str
+    ) -> Iterator[Any]:
+        """`get_or_load`, with the model leased until the block exits.
+
+        Idle and budget eviction skip leased models, so a call running longer than the idle TTL
+        keeps its model registered (and the next job doesn't load a second copy). The idle clock
+        restarts when the lease ends.
+        """
+        model = self.get_or_load(owner, key, loader, device=device)
+        with self._lock:
+            entry = self._entries.get((owner, key))
+            if entry is not None and entry.model is model:
+                entry.pins += 1
+            else:
+                entry = None
+        try:
+            yield model
+        finally:
+            if entry is not None:
+                with self._lock:
+                    entry.pins -= 1
+                    entry.last_used = time.monotonic()
+
+    def load_stats(self) -> LoadStats:
+        with self._lock:
+            return LoadStats(
+                loads=self._loads,
+                failures=self._failures,
+                coalesced=self._coalesced,
+                load_s_total=self._load_s_total,
+                last_load_s=self._last_load_s,
+            )
+
+    def put(
+        self,
+        owner: str,
+        key: tuple,
+        model: Any,
+        *,
+        device: str,
+        size_mb: float | None = None,
+        load_s: float = 0.0,
+    ) -> None:
+        """Register a loaded model; LRU models of the same device kind make room if needed."""
+        size = float(size_mb) if size_mb is not None else estimate_model_mb(model)
+        entry = _Entry(owner, key, model, device, size, float(load_s))
+        with self._lock:
+            self._entries[(owner, key)] = entry
+            evicted = self._enforce_budget_locked(keep=entry)
+        self._drop(evicted, reason="超出内存预算")
+        self._ensure_sweeper()
+        logger.info(
+            "模型已驻留: owner=%s, device=%s, size=%.0fMB, load=%.1fs, resident=%d",
+            owner,
+            device,
+            size,
+            float(load_s),
+            len(self),
+        )
+
+    def _enforce_budget_locked(self, *, keep: _Entry) -> list[_Entry]:
+        budget = self._policy.max_vram_mb if keep.vram else self._policy.max_ram_mb
+        if budget <= 0:
+            return []
+        same_kind = sorted(
+            (e for e in self._entries.values() if e.vram == keep.vram),
+            key=lambda e: e.last_used,
+        )
+        used = sum(e.size_mb for e in same_kind)
+        evicted: list[_Entry] = []
+        for e in same_kind:
+            if used <= budget:
+                break
+            if e is keep or e.pins > 0:
+                continue
+            self._entries.pop((e.owner, e.key), None)
+            used -= e.size_mb
+            evicted.append(e)
+        if used > budget:
+            logger.warning(
+                "模型大小超出预算，仍保留当前模型: owner=%s, %.0fMB > %.0fMB",
+                keep.owner,
+                used,
+                budget,
+            )
+        return evicted
+
+    def evict_idle(self) -> int:
+        ttl = float(self._policy.idle_ttl_s)
+        if ttl <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            idle = [k for k, e in self._entries.items() if not e.pins and now - e.last_used >= ttl]
+            idle = [self._entries.pop(k) for k in idle]
+        count = len(idle)
+        self._drop(idle, reason="空闲超时")
+        return count
+
+    def release(self, owner: str | None = None) -> int:
+        """Drop every model (or only `owner`'s) right away."""
+        with self._lock:
+            dropped = [k for k in self._entries if owner is None or k[0] == owner]
+            dropped = [self._entries.pop(k) for k in dropped]
+        count = len(dropped)
+        # Free allocator caches even when nothing was resident (e.g. after a failed load).
+        self._drop(dropped, reason="手动释放", force_free=True)
+        return count
+
+    def snapshot(self) -> list[ResidentModel]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                ResidentModel(
+                    owner=e.owner,
+                    key=e.key,
+                    device=e.device,
+                    size_mb=e.size_mb,
+                    idle_s=now - e.last_used,
+                    load_s=e.load_s,
+                )
+                for e in sorted(self._entries.values(), key=lambda e: e.last_used)
+            ]
+
+    def _drop(self, entries: list[_Entry], *, reason: str, force_free: bool = False) -> None:
+        # Only plain values outlive this line, so clearing `entries` drops the last references
+        # to the models before the collector runs. Callers must not keep entries in locals.
+        dropped = [(e.owner, e.device, e.size_mb) for e in entries]
+        entries.clear()
+        for owner, device, size_mb in dropped:
+            logger.info(
+                "卸载模型(%s): owner=%s, device=%s, size=%.0fMB", reason, owner, device, size_mb
+            )
+        if dropped or force_free:
+            free_device_memory()
+
+    def _ensure_sweeper(self) -> None:
+        with self._lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+            self._sweeper = Thread(target=self._sweep_loop, name="model-residency", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            ttl = float(self._policy.idle_ttl_s)
+            time.sleep(max(5.0, min(60.0, ttl / 4.0)) if ttl > 0 else 60.0)
+            with contextlib.suppress(Exception):
+                self.evict_idle()
+            if not len(self):
+                with self._lock:
+                    if not self._entries:
+                        self._sweeper = None
+                        return
+
+
+_RESIDENCY = ModelResidency()
+
+
+def get_model_residency() -> ModelResidency:
+    return _RESIDENCY
+
+
+def configure_model_residency(policy: ResidencyPolicy) -> None:
+    _RESIDENCY.set_policy(policy)
+
+
+__all__ = [
+    "LoadStats",
+    "ModelResidency",
+    "ResidencyPolicy",
+    "ResidentModel",
+    "available_memory_mb",
+    "configure_model_residency",
+    "estimate_model_mb",
+    "free_device_memory",
+    "get_model_residency",
+    "policy_from_config",
+    "process_rss_mb",
+    "torch_modules",
+]
@@ -1,11 +1,24 @@
 from __future__ import annotations
 
+import contextlib
+import json
 import logging
+import os
+import time
+from collections.abc import Callable
 from dataclasses import dataclass
+from pathlib import Path
+from threading import Event, Lock
 from typing import Any
 
 from openai import OpenAI
 
+from auto_asr.config import get_cache_dir
+from auto_asr.endpoint_limits import get_endpoint_limiter
+from auto_asr.http_pool import get_openai_client
+from auto_asr.llm.client import normalize_base_url
+from auto_asr.rate_control import is_retryable_error, is_throttle_error, retry_after_s
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,15 +35,92 @@ class ASRResult:
     segments: list[ASRSegment]
 
 
-def make_openai_client(*, api_key: str, base_url: str | None = None) -> OpenAI:
+def make_openai_client(
+    *, api_key: str, base_url: str | None = None, max_connections: int | None = None
+) -> OpenAI:
     api_key = (api_key or "").strip()
     if not api_key:
         raise RuntimeError("请在 Web UI 中填写 OpenAI API Key。")
 
-    base_url = (base_url or "").strip() or None
-    if base_url:
-        return OpenAI(api_key=api_key, base_url=base_url)
-    return OpenAI(api_key=api_key)
+    # Normalized like the subtitle LLM client, so both share one pooled client per endpoint.
+    base_url = normalize_base_url(base_url) if (base_url or "").strip() else None
+    # Shared per (base_url, api_key): keep-alive connections survive across jobs.
+    return get_openai_client(api_key=api_key, base_url=base_url, max_connections=max_connections)
+
+
+# Capability probe cache: which response formats an endpoint/model accepts.
+#
+# Many OpenAI-compatible servers reject `verbose_json`; without this cache every region would be
+# uploaded twice (verbose_json attempt + plain text fallback). Entries are kept in memory and
+# persisted under the project cache dir; they expire so upgraded endpoints get re-probed.
+_CAPS_FILE_NAME = "openai_asr_capabilities.json"
+_CAPS_TTL_S = 7 * 24 * 3600
+_CAPS_LOCK = Lock()
+_CAPS: dict[str, dict[str, Any]] | None = None
+
+
+def _caps_path() -> Path:
+    return get_cache_dir() / _CAPS_FILE_NAME
+
+
+def _load_caps_locked() -> dict[str, dict[str, Any]]:
+    global _CAPS
+    if _CAPS is None:
+        try:
+            data = json.loads(_caps_path().read_text(encoding="utf-8"))
+        except Exception:
+            data = {}
+        _CAPS = data if isinstance(data, dict) else {}
+    return _CAPS
+
+
+def _capability_key(client: OpenAI, model: str) -> str:
+    base_url = str(getattr(client, "base_url", "") or "").rstrip("/")
+    return f"{base_url}|{model}"
+
+
+def _get_capability(key: str, name: str) -> Any:
+    with _CAPS_LOCK:
+        entry = _load_caps_locked().get(key)
+        if not isinstance(entry, dict):
+            return None
+        checked_at = float(entry.get("checked_at", 0) or 0)
+        if time.time() - checked_at > _CAPS_TTL_S:
+            return None
+        return entry.get(name)
+
+
+def _set_capability(key: str, name: str, value: Any) -> None:
+    with _CAPS_LOCK:
+        caps = _load_caps_locked()
+        entry = caps.get(key)
+        if not isinstance(entry, dict):
+            entry = {}
+        # Refresh `checked_at` even when the value is unchanged, or the entry expires for good.
+        entry[name] = value
+        entry["checked_at"] = time.time()
+        caps[key] = entry
+
+        path = _caps_path()
+        tmp = path.with_suffix(".tmp")
+        try:
+            tmp.write_text(
+                json.dumps(caps, ensure_ascii=False, indent=2, sort_keys=True) + "\n",
+                encoding="utf-8",
+            )
+            os.replace(tmp, path)
+        except Exception as e:  # pragma: no cover
+            logger.info("保存 ASR 能力缓存失败(忽略): %s", e)
+    logger.info("ASR 能力缓存更新: %s -> %s=%s", key, name, value)
+
+
+def reset_asr_capabilities() -> None:
+    """Forget all probed capabilities (in memory and on disk)."""
+    global _CAPS
+    with _CAPS_LOCK:
+        _CAPS = {}
+        with contextlib.suppress(Exception):
+            _caps_path().unlink(missing_ok=True)
 
 
 def _as_float(value: Any, default: float = 0.0) -> float:
@@ -48,6 +138,37 @@ def _extract_field(obj: Any, key: str, default: Any = None) -> Any:
     return getattr(obj, key, default)
 
 
+def _stream_text(
+    create: Callable[..., Any],
+    *,
+    upload: tuple[str, bytes],
+    base_params: dict[str, Any],
+    on_partial_text: Callable[[str], None],
+) -> str | None:
+    """Consume a streamed transcription; returns None if the endpoint sent no stream events."""
+    parts: list[str] = []
+    final: str | None = None
+    events = 0
+    stream = create(file=upload, stream=True, **base_params)
+    for event in stream:
+        events += 1
+        if _extract_field(event, "type", "") == "transcript.text.done":
+            final = str(_extract_field(event, "text", "") or "")
+            continue
+        delta = _extract_field(event, "delta", None)
+        if delta is None:
+            # Some OpenAI-compatible servers stream chat-completion style chunks instead.
+            choices = _extract_field(event, "choices", None) or []
+            if choices:
+                delta = _extract_field(_extract_field(choices[0], "delta"), "content")
+        if delta:
+            parts.append(str(delta))
+            on_partial_text("".join(parts))
+    if events == 0:
+        return None
+    return final if final is not None else "".join(parts)
+
+
 def transcribe_file_verbose(
     client: OpenAI,
     *,
@@ -55,10 +176,22 @@ def transcribe_file_verbose(
     model: str = "whisper-1",
     language: str | None = None,
     prompt: str | None = None,
+    audio_seconds: float | None = None,
+    on_partial_text: Callable[[str], None] | None = None,
+    cancel_event: Event | None = None,
 ) -> ASRResult:
     """
     Prefer verbose_json to get per-segment timestamps (better for SRT/VTT generation).
-    Falls back to plain text if the SDK/endpoint does not support it.
+    Falls back to plain text if the SDK/endpoint does not support it; the outcome is cached per
+    (base_url, model) so later calls go straight to the supported format.
+
+    Every upload goes through the endpoint's shared rate budget (if configured); pass
+    `audio_seconds` so audio-seconds-per-minute limits can be enforced. Setting `cancel_event`
+    ends a wait for that budget right away.
+
+    With `on_partial_text`, the request is streamed (`stream=True`) and the text so far is
+    reported as deltas arrive. Streamed results carry no segment timestamps. Endpoints that
+    reject streaming fall back to the normal request, and that is remembered like the format.
     """
     base_params: dict[str, Any] = {"model": model}
     if language:
@@ -66,25 +199,78 @@ def transcribe_file_verbose(
     if prompt:
         base_params["prompt"] = prompt
 
-    used_verbose_json = True
-    with open(file_path, "rb") as f:
+    # Read the file once up front: retries/fallbacks re-send the same bytes, and a hedged copy
+    # still in flight after its job ends never touches the (possibly removed) temp dir.
+    upload = (Path(file_path).name, Path(file_path).read_bytes())
+
+    cap_key = _capability_key(client, model)
+    known_format = _get_capability(cap_key, "response_format")
+    endpoint = get_endpoint_limiter(client.base_url)
+
+    def _create(**params: Any) -> Any:
+        if endpoint is not None:
+            endpoint.acquire(audio_s=float(audio_seconds or 0.0), cancel_event=cancel_event)
+        try:
+            return client.audio.transcriptions.create(**params)
+        except Exception as e:
+            if endpoint is not None and is_throttle_error(e):
+                endpoint.pause(retry_after_s(e))
+            raise
+
+    stream_rejected = False
+    if on_partial_text is not None and _get_capability(cap_key, "stream") is not False:
+        try:
+            streamed = _stream_text(
+                _create,
+                upload=upload,
+                base_params=base_params,
+                on_partial_text=on_partial_text,
+            )
+        except Exception as e:
+            if is_retryable_error(e):
+                raise
+            stream_rejected = True
+            logger.info("上游不支持流式转写或请求失败，改用普通请求。原因: %s", e)
+        else:
+            if streamed is not None:
+                if _get_capability(cap_key, "stream") is None:
+                    _set_capability(cap_key, "stream", True)
+                return ASRResult(text=streamed, segments=[])
+            stream_rejected = True
+            logger.info("上游未返回流式事件，改用普通请求。")
+
+    used_verbose_json = known_format != "text"
+    if not used_verbose_json:
+        # Probed before: this endpoint/model only accepts plain text. Skip the doomed upload.
+        resp = _create(file=upload, **base_params)
+    else:
         try:
             params = dict(base_params)
             params.update(
                 {
-                    "file": f,
+                    "file": upload,
                     "response_format": "verbose_json",
                     "timestamp_granularities": ["segment"],
                 }
             )
-            resp = client.audio.transcriptions.create(**params)
+            resp = _create(**params)
         except Exception as e:
+            if is_retryable_error(e):
+                # Throttling/5xx/network errors say nothing about format support; let the
+                # caller retry instead of re-uploading the file as plain text.
+                raise
             used_verbose_json = False
             logger.info(
-                "上游不支持 verbose_json/segment timestamps 或请求失败，降级为纯文本。原因: %s", e
+                "上游不支持 verbose_json/segment timestamps 或请求失败，降级为纯文本。原因: %s",
+                e,
             )
-            f.seek(0)
-            resp = client.audio.transcriptions.create(file=f, **base_params)
+            resp = _create(file=upload, **base_params)
+            # Only remember "text" once plain text actually worked; otherwise the failure
+            # was likely about the file itself, not the response format.
+            _set_capability(cap_key, "response_format", "text")
+        else:
+            if known_format is None:
+                _set_capability(cap_key, "response_format", "verbose_json")
 
     text = _extract_field(resp, "text", "") or ""
 
@@ -101,4 +287,7 @@ def transcribe_file_verbose(
             )
     if used_verbose_json and not segments:
         logger.info("verbose_json 返回里没有 segments 字段（可能被上游忽略）。")
+    if stream_rejected:
+        # Like the format probe: only remember once the non-streamed request actually worked.
+        _set_capability(cap_key, "stream", False)
     return ASRResult(text=text, segments=segments)
@@ -1,23 +1,45 @@
 from __future__ import annotations
 
+import json
 import logging
 import os
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections.abc import Callable, Sequence
 from dataclasses import dataclass
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from threading import Event
-from threading import local as thread_local
-from typing import Any
+from threading import Event, Lock
+from typing import Any, TypeVar
 
 import numpy as np
-
-from auto_asr.audio_tools import load_audio, process_vad_speech, transcode_wav_to_mp3
-from auto_asr.funasr_asr import release_funasr_resources, transcribe_file_funasr
+from openai import OpenAI
+
+from auto_asr.asr_cache import ASRResultCache, CacheStats, get_asr_cache, make_cache_key
+from auto_asr.audio_tools import (
+    change_tempo,
+    load_audio,
+    process_vad_speech,
+    transcode_wav_to_mp3,
+)
+from auto_asr.endpoint_pool import EndpointConfig, EndpointPool
+from auto_asr.funasr_asr import (
+    transcribe_arrays_funasr,
+    transcribe_wav_funasr,
+)
 from auto_asr.funasr_models import is_funasr_nano
-from auto_asr.openai_asr import make_openai_client, transcribe_file_verbose
-from auto_asr.qwen3_asr import Qwen3ASRConfig, release_qwen3_resources, transcribe_chunks_qwen3
+from auto_asr.funasr_pool import FunASRPoolConfig, get_funasr_pool
+from auto_asr.inference_server import InferenceClient, get_inference_client
+from auto_asr.model_residency import LoadStats, get_model_residency
+from auto_asr.openai_asr import (
+    ASRResult,
+    ASRSegment,
+    make_openai_client,
+    transcribe_file_verbose,
+)
+from auto_asr.qwen3_asr import Qwen3ASRConfig, transcribe_chunks_qwen3
+from auto_asr.rate_control import AIMDLimiter
+from auto_asr.region_executor import HedgePolicy, HedgeStats, RetryPolicy, run_region_tasks
+from auto_asr.silence_compress import OffsetMap, compress_silence
 from auto_asr.subtitles import SubtitleLine, compose_srt, compose_txt, compose_vtt
 from auto_asr.vad_split import (
     WAV_SAMPLE_RATE,
@@ -28,6 +50,8 @@ from auto_asr.vad_split import (
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 def _resolve_funasr_device(device: str) -> str:
     d = (device or "").strip().lower()
@@ -43,6 +67,33 @@ def _resolve_funasr_device(device: str) -> str:
     return device
 
 
+@dataclass(frozen=True)
+class _UploadUnit:
+    """One upstream request in the chunk path: a whole chunk or one VAD region inside it."""
+
+    name: str
+    label: str
+    start_sample: int
+    end_sample: int
+    wav: np.ndarray
+    # Set when long silences were cut out of `wav` before upload.
+    offset_map: OffsetMap | None = None
+
+    @property
+    def start_s(self) -> float:
+        return self.start_sample / float(WAV_SAMPLE_RATE)
+
+    @property
+    def end_s(self) -> float:
+        return self.end_sample / float(WAV_SAMPLE_RATE)
+
+    def to_abs_s(self, t: float) -> float:
+        """Map a time in the uploaded audio back to the original timeline."""
+        if self.offset_map is not None:
+            t = self.offset_map.to_original(t)
+        return self.start_s + t
+
+
 @dataclass(frozen=True)
 class PipelineResult:
     preview_text: str
@@ -51,6 +102,125 @@ class PipelineResult:
     debug: str
 
 
+@dataclass(frozen=True)
+class FailedRegion:
+    """A region that still failed after all retries (partial-result mode)."""
+
+    index: int
+    start_s: float
+    end_s: float
+    attempts: int
+    error: str
+
+
+def _failure_recorder(
+    spans: Sequence[tuple[float, float]], failures: list[FailedRegion]
+) -> Callable[[int, BaseException, int], ASRResult]:
+    def _on_failure(idx: int, err: BaseException, attempts: int) -> ASRResult:
+        start_s, end_s = spans[idx]
+        failures.append(
+            FailedRegion(index=idx, start_s=start_s, end_s=end_s, attempts=attempts, error=str(err))
+        )
+        return ASRResult(text="", segments=[])
+
+    return _on_failure
+
+
+def _write_failed_regions(
+    out_path: Path, input_audio_path: str, failures: list[FailedRegion]
+) -> Path:
+    failed_path = out_path.with_name(f"{out_path.stem}.failed.json")
+    data = {
+        "input_audio_path": input_audio_path,
+        "subtitle_file_path": str(out_path),
+        "failed_regions": [
+            {
+                "index": f.index,
+                "start_s": round(f.start_s, 3),
+                "end_s": round(f.end_s, 3),
+                "attempts": f.attempts,
+                "error": f.error,
+            }
+            for f in sorted(failures, key=lambda x: x.index)
+        ],
+    }
+    _write_text(failed_path, json.dumps(data, ensure_ascii=False, indent=2))
+    logger.warning("%d 个片段转写失败，已生成部分结果；失败段记录: %s", len(failures), failed_path)
+    return failed_path
+
+
+def _failure_debug(
+    failed_path: Path | None, failures: list[FailedRegion], cache: ASRResultCache | None
+) -> str:
+    if failed_path is None:
+        return "failed_regions=0"
+    if cache is None:
+        return f"failed_regions={len(failures)}({failed_path.name})"
+    # Successful regions are in the ASR cache, so re-running the same file only retries these.
+    return f"failed_regions={len(failures)}({failed_path.name}; 重新运行同一文件仅重试失败段)"
+
+
+def _hedge_debug(hedge: HedgePolicy | None, stats: list[HedgeStats]) -> str:
+    if hedge is None:
+        return "hedge=off"
+    issued = sum(x.issued for x in stats)
+    won = sum(x.won for x in stats)
+    saved_s = sum(x.saved_s for x in stats)
+    return (
+        f"hedge=on(p{int(hedge.percentile * 100)}, issued={issued}, won={won}, "
+        f"saved~{saved_s:.1f}s)"
+    )
+
+
+def _pool_debug(pool: EndpointPool | None) -> str:
+    if pool is None:
+        return "endpoints=1"
+    parts = [
+        f"{s.base_url or '(default)'}:req={s.requests},fail={s.failures},eject={s.ejections}"
+        for s in pool.stats()
+    ]
+    return f"endpoints={len(pool)}({'; '.join(parts)})"
+
+
+class _ProgressReporter:
+    """Forwards region completions and streamed partial text to the caller's progress callback."""
+
+    def __init__(self, callback: Callable[[float, str], None], total: int) -> None:
+        self._callback = callback
+        self._total = max(1, int(total))
+        self._done = 0
+        self._lock = Lock()
+
+    def region_done(self) -> None:
+        with self._lock:
+            self._done += 1
+            done = self._done
+        self._emit(f"已完成 {done}/{self._total}")
+
+    def partial(self, label: str, text: str) -> None:
+        tail = text.strip().replace("\n", " ")[-120:]
+        self._emit(f"{label}: {tail}")
+
+    def _emit(self, message: str) -> None:
+        try:
+            self._callback(min(1.0, self._done / self._total), message)
+        except Exception as e:  # pragma: no cover
+            logger.debug("进度回调失败(忽略): %s", e)
+
+
+def _rescale_result(asr: ASRResult, scale: float) -> ASRResult:
+    """Map segment times of a tempo-changed upload back to the original audio."""
+    if scale == 1.0 or not asr.segments:
+        return asr
+    return ASRResult(
+        text=asr.text,
+        segments=[
+            ASRSegment(start_s=s.start_s * scale, end_s=s.end_s * scale, text=s.text)
+            for s in asr.segments
+        ],
+    )
+
+
 def _safe_stem(path: str) -> str:
     stem = Path(path).stem
     # Avoid empty/odd filenames in outputs.
@@ -67,6 +237,94 @@ def _check_cancel(cancel_event: Event | None) -> None:
         raise RuntimeError("已停止转写。")
 
 
+def _cached_transcribe(
+    cache: ASRResultCache | None, key: str | None, fn: Callable[[], ASRResult]
+) -> ASRResult:
+    if cache is None or key is None:
+        return fn()
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+    res = fn()
+    cache.put(key, res)
+    return res
+
+
+def _run_cached_region_tasks(
+    tasks: Sequence[T],
+    worker: Callable[[T], ASRResult],
+    *,
+    cache: ASRResultCache | None,
+    keys: Sequence[str | None],
+    on_result: Callable[[int, ASRResult], None] | None = None,
+    on_failure: Callable[[int, BaseException, int], ASRResult] | None = None,
+    **kwargs: Any,
+) -> list[ASRResult]:
+    """`run_region_tasks` that serves cache hits directly and only submits the misses.
+
+    Hits never reach the limiter, so they don't inflate its latency/throughput view.
+    """
+    results: dict[int, ASRResult] = {}
+    if cache is not None:
+        for i, key in enumerate(keys):
+            hit = cache.get(key) if key is not None else None
+            if hit is not None:
+                results[i] = hit
+                if on_result is not None:
+                    on_result(i, hit)
+    todo = [i for i in range(len(tasks)) if i not in results]
+    if todo:
+
+        def _run(i: int) -> ASRResult:
+            res = worker(tasks[i])
+            # Store from the worker thread so finished regions survive a later fatal error.
+            key = keys[i]
+            if cache is not None and key is not None:
+                cache.put(key, res)
+            return res
+
+        fresh = run_region_tasks(
+            todo,
+            _run,
+            on_result=((lambda j, res: on_result(todo[j], res)) if on_result is not None else None),
+            on_failure=(
+                (lambda j, err, attempts: on_failure(todo[j], err, attempts))
+                if on_failure is not None
+                else None
+            ),
+            **kwargs,
+        )
+        for i, res in zip(todo, fresh, strict=True):
+            results[i] = res
+    return [results[i] for i in range(len(tasks))]
+
+
+def _cache_debug(cache: ASRResultCache | None, before: CacheStats | None) -> str:
+    if cache is None or before is None:
+        return "asr_cache=off"
+    now = cache.stats()
+    return (
+        f"asr_cache=on(hits={now.hits - before.hits}, misses={now.misses - before.misses}, "
+        f"entries={now.entries})"
+    )
+
+
+def _model_debug(before: LoadStats, server: InferenceClient | None = None) -> str:
+    if server is not None:
+        try:
+            rss = f"{float(server.health().get('rss_mb') or 0):.0f}MB"
+        except Exception:
+            rss = "unknown"
+        return f"inference_server={server.base_url}(rss={rss})"
+    residency = get_model_residency()
+    now = residency.load_stats()
+    loads = now.loads - before.loads
+    return (
+        f"model_loads={loads}(load_s={now.load_s_total - before.load_s_total:.1f}, "
+        f"waited={now.coalesced - before.coalesced}), resident_models={len(residency)}"
+    )
+
+
 def transcribe_to_subtitles(
     *,
     input_audio_path: str,
@@ -83,10 +341,26 @@ def transcribe_to_subtitles(
     funasr_language: str = "auto",
     funasr_use_itn: bool = True,
     funasr_enable_punc: bool = True,
+    # >1 runs VAD regions on that many CPU worker processes (device=cpu only).
+    funasr_cpu_processes: int = 1,
+    funasr_cpu_threads: int = 0,
+    funasr_cpu_affinity: bool = False,
+    # int8 CPU inference (see `auto_asr.quantization`); ignored on CUDA.
+    funasr_quantize: bool = False,
     # Qwen3-ASR local inference (Transformers backend via qwen-asr)
     qwen3_model: str = "Qwen/Qwen3-ASR-1.7B",
     qwen3_device: str = "auto",
     qwen3_max_inference_batch_size: int = 8,
+    qwen3_quantize: bool = False,
+    # Batch by audio seconds from measured memory use instead of a fixed count (0 MB = free
+    # memory at job start); `qwen3_max_inference_batch_size` then caps the item count.
+    qwen3_auto_batch: bool = False,
+    qwen3_batch_memory_mb: float = 0.0,
+    # Generation cap per batch from region duration (see `Qwen3ASRConfig`); 0 tokens/s disables.
+    qwen3_max_new_tokens_per_s: float = 15.0,
+    qwen3_min_new_tokens: int = 48,
+    # Run FunASR/Qwen3 in a separate daemon (see `auto_asr.inference_server`) instead of here.
+    inference_server_url: str | None = None,
     enable_vad: bool = True,
     vad_segment_threshold_s: int = 120,
     vad_max_segment_threshold_s: int = 180,
@@ -100,6 +374,24 @@ def transcribe_to_subtitles(
     upload_audio_format: str = "wav",
     upload_mp3_bitrate_kbps: int = 192,
     api_concurrency: int = 4,
+    adaptive_concurrency: bool = True,
+    api_concurrency_max: int = 16,
+    asr_cache: bool = True,
+    asr_cache_max_mb: int = 256,
+    partial_results: bool = False,
+    region_max_attempts: int = 5,
+    region_retry_base_s: float = 1.0,
+    region_retry_cap_s: float = 30.0,
+    hedge_requests: bool = False,
+    hedge_percentile: float = 0.95,
+    hedge_budget_ratio: float = 0.1,
+    openai_endpoints: list[EndpointConfig] | None = None,
+    silence_compress: bool = False,
+    silence_compress_min_s: float = 2.0,
+    silence_compress_keep_s: float = 0.5,
+    upload_tempo: float = 1.0,
+    stream_asr: bool = False,
+    on_progress: Callable[[float, str], None] | None = None,
     outputs_dir: str = "outputs",
     cancel_event: Event | None = None,
 ) -> PipelineResult:
@@ -112,6 +404,7 @@ def transcribe_to_subtitles(
     if upload_audio_format not in {"wav", "mp3"}:
         raise ValueError("upload_audio_format must be one of: wav, mp3")
     api_concurrency = max(1, int(api_concurrency))
+    api_concurrency_max = max(api_concurrency, int(api_concurrency_max))
 
     logger.info(
         "开始转写: backend=%s, file=%s, format=%s, model=%s, language=%s, vad=%s, "
@@ -134,17 +427,109 @@ def transcribe_to_subtitles(
     )
     _check_cancel(cancel_event)
 
+    # Identical regions (same audio + request parameters) are served from the on-disk cache.
+    cache = get_asr_cache(max_bytes=int(asr_cache_max_mb) * 1024 * 1024) if asr_cache else None
+    cache_before = cache.stats() if cache is not None else None
+    model_before = get_model_residency().load_stats()
+    server = get_inference_client(inference_server_url) if inference_server_url else None
+
     if asr_backend == "funasr":
         try:
             _check_cancel(cancel_event)
-            wav_for_duration = load_audio(input_audio_path)
-            duration_s = len(wav_for_duration) / float(WAV_SAMPLE_RATE)
+            # Decoded once: duration, VAD, the cache key and whole-file inference all use it.
+            wav = load_audio(input_audio_path)
+            duration_s = len(wav) / float(WAV_SAMPLE_RATE)
 
-            resolved_device = _resolve_funasr_device(funasr_device)
+            # With an inference server, "auto" is resolved on the server's hardware.
+            resolved_device = funasr_device if server else _resolve_funasr_device(funasr_device)
             lang = (funasr_language or "").strip() or "auto"
             if language:
                 # if user set language in UI, prefer it over funasr_language
                 lang = language
+
+            def _funasr_key(wav_part: np.ndarray) -> str | None:
+                if cache is None:
+                    return None
+                return make_cache_key(
+                    wav_part,
+                    backend="funasr",
+                    model=funasr_model,
+                    language=lang,
+                    extra={
+                        "use_itn": bool(funasr_use_itn),
+                        "punc": bool(funasr_enable_punc),
+                        # Only present when on, so float-model entries keep their keys.
+                        **({"int8": True} if funasr_quantize else {}),
+                    },
+                )
+
+            use_pool = server is None and resolved_device == "cpu" and int(funasr_cpu_processes) > 1
+            server_options = {
+                "model": funasr_model,
+                "device": resolved_device,
+                "language": lang,
+                "use_itn": bool(funasr_use_itn),
+                "enable_punc": bool(funasr_enable_punc),
+                "quantize": bool(funasr_quantize),
+            }
+
+            def _funasr_regions(
+                regions: Sequence[tuple[int, int, np.ndarray]],
+            ) -> list[ASRResult]:
+                """Cached results for hits; misses go to FunASR as in-memory, batched arrays."""
+                keys = [_funasr_key(wav_region) for (_s, _e, wav_region) in regions]
+                results: list[ASRResult | None] = [
+                    cache.get(k) if cache is not None and k is not None else None for k in keys
+                ]
+                missing = [i for i, r in enumerate(results) if r is None]
+                if missing:
+
+                    def _store(j: int, res: ASRResult) -> None:
+                        i = missing[j]
+                        results[i] = res
+                        if cache is not None and keys[i] is not None:
+                            cache.put(keys[i], res)
+
+                    if server is not None:
+                        server.transcribe(
+                            [regions[i][2] for i in missing],
+                            backend="funasr",
+                            options=server_options,
+                            cancel_event=cancel_event,
+                            on_result=_store,
+                        )
+                    elif use_pool:
+                        pool = get_funasr_pool(
+                            FunASRPoolConfig(
+                                model=funasr_model,
+                                processes=int(funasr_cpu_processes),
+                                threads_per_process=int(funasr_cpu_threads),
+                                enable_punc=bool(funasr_enable_punc),
+                                cpu_affinity=bool(funasr_cpu_affinity),
+                                quantize=bool(funasr_quantize),
+                            )
+                        )
+                        pool.transcribe(
+                            [regions[i][2] for i in missing],
+                            language=lang,
+                            use_itn=bool(funasr_use_itn),
+                            cancel_event=cancel_event,
+                            on_result=_store,
+                        )
+                    else:
+                        transcribe_arrays_funasr(
+                            wavs=[regions[i][2] for i in missing],
+                            model=funasr_model,
+                            device=resolved_device,
+                            language=lang,
+                            use_itn=bool(funasr_use_itn),
+                            enable_punc=bool(funasr_enable_punc),
+                            quantize=bool(funasr_quantize),
+                            cancel_event=cancel_event,
+                            on_result=_store,
+                        )
+                return [r if r is not None else ASRResult(text="", segments=[]) for r in results]
+
             _check_cancel(cancel_event)
 
             # FunASR-Nano 长音频如果整段推理, 容易因注意力矩阵过大导致 CUDA OOM.
@@ -162,7 +547,7 @@ def transcribe_to_subtitles(
                     )
                 else:
                     regions = process_vad_speech(
-                        wav_for_duration,
+                        wav,
                         vad_model,
                         max_utterance_s=int(vad_speech_max_utterance_s),
                         merge_gap_ms=int(vad_speech_merge_gap_ms),
@@ -183,46 +568,34 @@ def transcribe_to_subtitles(
                             int(vad_speech_merge_gap_ms),
                         )
 
-                        with TemporaryDirectory(prefix="auto-asr-funasr-") as tmp_dir:
-                            for idx, (start_sample, end_sample, wav_region) in enumerate(regions):
-                                _check_cancel(cancel_event)
-                                region_wav_path = os.path.join(tmp_dir, f"region_{idx:06d}.wav")
-                                save_audio_file(wav_region, region_wav_path)
-
-                                region_dur_s = (end_sample - start_sample) / float(WAV_SAMPLE_RATE)
-                                seg_asr = transcribe_file_funasr(
-                                    file_path=region_wav_path,
-                                    model=funasr_model,
-                                    device=resolved_device,
-                                    language=lang,
-                                    use_itn=bool(funasr_use_itn),
-                                    enable_punc=bool(funasr_enable_punc),
-                                    duration_s=region_dur_s,
-                                )
+                        region_results = _funasr_regions(regions)
+                        for (start_sample, end_sample, _wav), seg_asr in zip(
+                            regions, region_results, strict=True
+                        ):
+                            region_dur_s = (end_sample - start_sample) / float(WAV_SAMPLE_RATE)
+                            seg_text = (seg_asr.text or "").strip()
+                            if seg_text:
+                                full_text_parts.append(seg_text)
 
-                                seg_text = (seg_asr.text or "").strip()
-                                if seg_text:
-                                    full_text_parts.append(seg_text)
-
-                                if output_format in {"srt", "vtt"}:
-                                    offset_s = start_sample / float(WAV_SAMPLE_RATE)
-                                    if seg_asr.segments:
-                                        for seg in seg_asr.segments:
-                                            subtitle_lines.append(
-                                                SubtitleLine(
-                                                    start_s=offset_s + seg.start_s,
-                                                    end_s=offset_s + seg.end_s,
-                                                    text=seg.text,
-                                                )
-                                            )
-                                    else:
+                            if output_format in {"srt", "vtt"}:
+                                offset_s = start_sample / float(WAV_SAMPLE_RATE)
+                                if seg_asr.segments:
+                                    for seg in seg_asr.segments:
                                         subtitle_lines.append(
                                             SubtitleLine(
-                                                start_s=offset_s,
-                                                end_s=offset_s + max(region_dur_s, 0.01),
-                                                text=seg_text or seg_asr.text,
+                                                start_s=offset_s + seg.start_s,
+                                                end_s=offset_s + seg.end_s,
+                                                text=seg.text,
                                             )
                                         )
+                                else:
+                                    subtitle_lines.append(
+                                        SubtitleLine(
+                                            start_s=offset_s,
+                                            end_s=offset_s + max(region_dur_s, 0.01),
+                                            text=seg_text or seg_asr.text,
+                                        )
+                                    )
 
                         subtitle_lines.sort(key=lambda x: (x.start_s, x.end_s))
                         full_text = "\n".join([t for t in full_text_parts if t]).strip()
@@ -247,8 +620,12 @@ def transcribe_to_subtitles(
                         seg_count = len(subtitle_lines) if output_format in {"srt", "vtt"} else 0
                         debug = (
                             f"backend=funasr, model={funasr_model}, device={resolved_device}, "
+                            f"cpu_processes={funasr_cpu_processes if use_pool else 1}, "
+                            f"int8={'on' if funasr_quantize else 'off'}, "
                             f"segments={seg_count}, duration_s={duration_s:.2f}, "
-                            "vad_speech_fallback=on(force=nano)"
+                            "vad_speech_fallback=on(force=nano), "
+                            f"{_cache_debug(cache, cache_before)}, "
+                            f"{_model_debug(model_before, server)}"
                         )
                         logger.info(
                             "转写完成(funasr/nano_vad_speech): out=%s, segments=%d, duration=%.2fs",
@@ -264,15 +641,22 @@ def transcribe_to_subtitles(
                         )
                     logger.info("VAD 未检测到语音段，将尝试整段推理(可能 OOM)。")
 
-            asr = transcribe_file_funasr(
-                file_path=input_audio_path,
-                model=funasr_model,
-                device=resolved_device,
-                language=lang,
-                use_itn=bool(funasr_use_itn),
-                enable_punc=bool(funasr_enable_punc),
-                duration_s=duration_s,
-            )
+            def _funasr_whole() -> ASRResult:
+                if server is not None:
+                    return server.transcribe(
+                        [wav], backend="funasr", options=server_options, mode="whole"
+                    )[0]
+                return transcribe_wav_funasr(
+                    wav=wav,
+                    model=funasr_model,
+                    device=resolved_device,
+                    language=lang,
+                    use_itn=bool(funasr_use_itn),
+                    enable_punc=bool(funasr_enable_punc),
+                    quantize=bool(funasr_quantize),
+                )
+
+            asr = _cached_transcribe(cache, _funasr_key(wav), _funasr_whole)
 
             subtitle_lines: list[SubtitleLine] = []
             full_text_parts: list[str] = []
@@ -292,7 +676,7 @@ def transcribe_to_subtitles(
                     logger.info("FunASR segments=0 且 VAD 模型不可用，降级为整段字幕。")
                 else:
                     regions = process_vad_speech(
-                        wav_for_duration,
+                        wav,
                         vad_model,
                         max_utterance_s=int(vad_speech_max_utterance_s),
                         merge_gap_ms=int(vad_speech_merge_gap_ms),
@@ -310,45 +694,33 @@ def transcribe_to_subtitles(
                             int(vad_speech_max_utterance_s),
                             int(vad_speech_merge_gap_ms),
                         )
-                        with TemporaryDirectory(prefix="auto-asr-funasr-") as tmp_dir:
-                            for idx, (start_sample, end_sample, wav_region) in enumerate(regions):
-                                _check_cancel(cancel_event)
-                                region_wav_path = os.path.join(tmp_dir, f"region_{idx:06d}.wav")
-                                save_audio_file(wav_region, region_wav_path)
-
-                                region_dur_s = (end_sample - start_sample) / float(WAV_SAMPLE_RATE)
-                                seg_asr = transcribe_file_funasr(
-                                    file_path=region_wav_path,
-                                    model=funasr_model,
-                                    device=resolved_device,
-                                    language=lang,
-                                    use_itn=bool(funasr_use_itn),
-                                    enable_punc=bool(funasr_enable_punc),
-                                    duration_s=region_dur_s,
-                                )
-
-                                seg_text = (seg_asr.text or "").strip()
-                                if seg_text:
-                                    full_text_parts.append(seg_text)
-
-                                offset_s = start_sample / float(WAV_SAMPLE_RATE)
-                                if seg_asr.segments:
-                                    for seg in seg_asr.segments:
-                                        subtitle_lines.append(
-                                            SubtitleLine(
-                                                start_s=offset_s + seg.start_s,
-                                                end_s=offset_s + seg.end_s,
-                                                text=seg.text,
-                                            )
-                                        )
-                                else:
+                        region_results = _funasr_regions(regions)
+                        for (start_sample, end_sample, _wav), seg_asr in zip(
+                            regions, region_results, strict=True
+                        ):
+                            region_dur_s = (end_sample - start_sample) / float(WAV_SAMPLE_RATE)
+                            seg_text = (seg_asr.text or "").strip()
+                            if seg_text:
+                                full_text_parts.append(seg_text)
+
+                            offset_s = start_sample / float(WAV_SAMPLE_RATE)
+                            if seg_asr.segments:
+                                for seg in seg_asr.segments:
                                     subtitle_lines.append(
                                         SubtitleLine(
-                                            start_s=offset_s,
-                                            end_s=offset_s + max(region_dur_s, 0.01),
-                                            text=seg_text or seg_asr.text,
+                                            start_s=offset_s + seg.start_s,
+                                            end_s=offset_s + seg.end_s,
+                                            text=seg.text,
                                         )
                                     )
+                            else:
+                                subtitle_lines.append(
+                                    SubtitleLine(
+                                        start_s=offset_s,
+                                        end_s=offset_s + max(region_dur_s, 0.01),
+                                        text=seg_text or seg_asr.text,
+                                    )
+                                )
                     else:
                         logger.info("VAD 未检测到语音段，降级为整段字幕。")
 
@@ -392,8 +764,11 @@ def transcribe_to_subtitles(
             seg_count = len(subtitle_lines) if output_format in {"srt", "vtt"} else 0
             debug = (
                 f"backend=funasr, model={funasr_model}, device={resolved_device}, "
+                f"cpu_processes={funasr_cpu_processes if use_pool else 1}, "
+                f"int8={'on' if funasr_quantize else 'off'}, "
                 f"segments={seg_count}, duration_s={duration_s:.2f}, "
-                f"vad_speech_fallback={'on' if used_vad_speech_fallback else 'off'}"
+                f"vad_speech_fallback={'on' if used_vad_speech_fallback else 'off'}, "
+                f"{_cache_debug(cache, cache_before)}, {_model_debug(model_before, server)}"
             )
             logger.info(
                 "转写完成(funasr): out=%s, segments=%d, duration=%.2fs, vad_speech_fallback=%s",
@@ -409,8 +784,9 @@ def transcribe_to_subtitles(
                 debug=debug,
             )
         finally:
+            # Models stay warm for the next job; only ones past their idle TTL are dropped.
             try:
-                release_funasr_resources()
+                get_model_residency().evict_idle()
             except Exception as e:  # pragma: no cover
                 logger.info("FunASR 资源清理失败(忽略): %s", e)
 
@@ -456,23 +832,91 @@ def transcribe_to_subtitles(
                 model=(qwen3_model or "").strip() or "Qwen/Qwen3-ASR-1.7B",
                 device=(qwen3_device or "").strip() or "auto",
                 max_inference_batch_size=max(1, int(qwen3_max_inference_batch_size)),
+                quantize=bool(qwen3_quantize),
+                auto_batch=bool(qwen3_auto_batch),
+                batch_memory_mb=max(0.0, float(qwen3_batch_memory_mb)),
+                max_new_tokens_per_s=max(0.0, float(qwen3_max_new_tokens_per_s)),
+                min_new_tokens=max(1, int(qwen3_min_new_tokens)),
             )
 
             wavs = [w for (_s, _e, w) in regions]
-            results = transcribe_chunks_qwen3(
-                chunks=wavs,
-                cfg=cfg,
-                language=language or None,
-                sample_rate=WAV_SAMPLE_RATE,
-            )
+            results: dict[int, ASRResult] = {}
+            keys: dict[int, str] = {}
+            if cache is not None:
+                for i, w in enumerate(wavs):
+                    keys[i] = make_cache_key(
+                        w,
+                        backend="qwen3asr",
+                        model=cfg.model,
+                        language=language,
+                        extra={
+                            # Decodes are cut off at the per-batch token cap.
+                            "max_new_tokens": cfg.max_new_tokens,
+                            "max_new_tokens_per_s": cfg.max_new_tokens_per_s,
+                            "min_new_tokens": cfg.min_new_tokens,
+                            **({"int8": True} if cfg.quantize else {}),
+                        },
+                    )
+                    hit = cache.get(keys[i])
+                    if hit is not None:
+                        results[i] = hit
+            todo = [i for i in range(len(wavs)) if i not in results]
+            reporter: _ProgressReporter | None = None
+            if on_progress is not None:
+                reporter = _ProgressReporter(on_progress, len(wavs))
+                # Cache hits count as done up front.
+                for _ in range(len(wavs) - len(todo)):
+                    reporter.region_done()
+
+            def _store(j: int, res: ASRResult) -> None:
+                # Cached as each micro-batch finishes, so a stopped job keeps its finished
+                # regions and a rerun only transcribes the rest.
+                i = todo[j]
+                results[i] = res
+                if cache is not None:
+                    cache.put(keys[i], res)
+                if reporter is not None:
+                    reporter.region_done()
+
+            if todo:
+                logger.info(
+                    "Qwen3-ASR 待转写: regions=%d, cached=%d", len(todo), len(wavs) - len(todo)
+                )
+                if server is not None:
+                    server.transcribe(
+                        [wavs[i] for i in todo],
+                        backend="qwen3asr",
+                        options={
+                            "model": cfg.model,
+                            "device": cfg.device,
+                            "max_inference_batch_size": cfg.max_inference_batch_size,
+                            "quantize": cfg.quantize,
+                            "auto_batch": cfg.auto_batch,
+                            "batch_memory_mb": cfg.batch_memory_mb,
+                            "max_new_tokens_per_s": cfg.max_new_tokens_per_s,
+                            "min_new_tokens": cfg.min_new_tokens,
+                            "language": language or None,
+                        },
+                        cancel_event=cancel_event,
+                        on_result=_store,
+                    )
+                else:
+                    transcribe_chunks_qwen3(
+                        chunks=[wavs[i] for i in todo],
+                        cfg=cfg,
+                        language=language or None,
+                        sample_rate=WAV_SAMPLE_RATE,
+                        cancel_event=cancel_event,
+                        on_result=_store,
+                    )
+                _check_cancel(cancel_event)
 
             subtitle_lines: list[SubtitleLine] = []
             full_text_parts: list[str] = []
             total_segments = 0
 
             for idx, (start_sample, end_sample, _chunk_wav) in enumerate(regions):
-                _check_cancel(cancel_event)
-                asr = results[idx]
+                asr = results.get(idx) or ASRResult(text="", segments=[])
                 full_text_parts.append((asr.text or "").strip())
 
                 if output_format in {"srt", "vtt"}:
@@ -505,8 +949,12 @@ def transcribe_to_subtitles(
             preview = subtitle_text[:5000]
             debug = (
                 f"backend=qwen3asr, model={cfg.model}, device={cfg.device}, "
+                f"int8={'on' if cfg.quantize else 'off'}, "
+                f"auto_batch={'on' if cfg.auto_batch else 'off'}, "
+                f"tokens_per_s={cfg.max_new_tokens_per_s:g}(min={cfg.min_new_tokens}), "
                 f"chunks={len(regions)}, segments={total_segments}, "
-                f"timeline=vad_speech(used={used_vad}), max_chunk_s={max_chunk_s}"
+                f"timeline=vad_speech(used={used_vad}), max_chunk_s={max_chunk_s}, "
+                f"{_cache_debug(cache, cache_before)}, {_model_debug(model_before, server)}"
             )
             logger.info(
                 "转写完成(qwen3asr): out=%s, chunks=%d, segments=%d",
@@ -522,11 +970,137 @@ def transcribe_to_subtitles(
             )
         finally:
             try:
-                release_qwen3_resources()
+                get_model_residency().evict_idle()
             except Exception as e:  # pragma: no cover
                 logger.info("Qwen3-ASR 资源清理失败(忽略): %s", e)
 
-    client = make_openai_client(api_key=openai_api_key, base_url=openai_base_url)
+    # `api_concurrency` is the starting point; with adaptive concurrency the limiter grows it
+    # while latency is stable (up to `api_concurrency_max`) and halves it on 429/5xx.
+    # Extra servers in `openai_endpoints` join the primary endpoint in a load-balanced pool;
+    # concurrency scales with the number of servers.
+    fleet = 1 + len(openai_endpoints or [])
+    limiter = AIMDLimiter(
+        initial=api_concurrency * fleet,
+        max_limit=(api_concurrency_max if adaptive_concurrency else api_concurrency) * fleet,
+        adaptive=bool(adaptive_concurrency),
+    )
+    client = make_openai_client(
+        api_key=openai_api_key, base_url=openai_base_url, max_connections=limiter.max_limit
+    )
+    # Retries are driven by the region executor (so the limiter sees every 429).
+    asr_client = client.with_options(max_retries=0)
+    pool: EndpointPool | None = None
+    if openai_endpoints:
+        members = [(EndpointConfig(base_url=openai_base_url or "", api_key=openai_api_key), client)]
+        members += [
+            (
+                cfg,
+                make_openai_client(
+                    api_key=cfg.api_key, base_url=cfg.base_url, max_connections=limiter.max_limit
+                ),
+            )
+            for cfg in openai_endpoints
+        ]
+        pool = EndpointPool([(cfg, c.with_options(max_retries=0)) for (cfg, c) in members])
+        logger.info("ASR 多端点负载均衡: endpoints=%d", len(pool))
+
+    reporter: _ProgressReporter | None = None
+
+    def _transcribe(
+        upload_path: str, audio_seconds: float, *, stream_label: str | None = None
+    ) -> ASRResult:
+        on_partial_text = None
+        if stream_label is not None and reporter is not None:
+
+            def on_partial_text(text: str) -> None:
+                reporter.partial(stream_label, text)
+
+        def _do(c: OpenAI) -> ASRResult:
+            return transcribe_file_verbose(
+                c,
+                file_path=upload_path,
+                model=model,
+                language=language,
+                prompt=prompt,
+                audio_seconds=audio_seconds,
+                on_partial_text=on_partial_text,
+                cancel_event=cancel_event,
+            )
+
+        return pool.call(_do) if pool is not None else _do(asr_client)
+
+    retry_policy = RetryPolicy(
+        max_attempts=max(1, int(region_max_attempts)),
+        backoff_base_s=max(0.0, float(region_retry_base_s)),
+        backoff_cap_s=max(0.0, float(region_retry_cap_s)),
+    )
+    failures: list[FailedRegion] = []
+    # Hedging duplicates straggling requests (extra API cost, bounded by the budget ratio).
+    hedge = (
+        HedgePolicy(
+            percentile=min(0.999, max(0.5, float(hedge_percentile))),
+            budget_ratio=min(1.0, max(0.0, float(hedge_budget_ratio))),
+        )
+        if hedge_requests
+        else None
+    )
+    hedge_stats: list[HedgeStats] = []
+
+    # Speeding clear speech up before upload shrinks files and upstream compute; segment times are
+    # scaled back by the actual length ratio. 1.0 disables it.
+    tempo = min(2.0, max(1.0, float(upload_tempo or 1.0)))
+
+    def _apply_tempo(wav_part: np.ndarray) -> tuple[np.ndarray, float]:
+        """Return (audio to upload, factor mapping uploaded time back to `wav_part` time)."""
+        if tempo > 1.0:
+            try:
+                fast = change_tempo(wav_part, tempo)
+                if len(fast):
+                    return fast, len(wav_part) / float(len(fast))
+            except Exception as e:
+                logger.info("上传前变速失败，按原速上传: %s", e)
+        return wav_part, 1.0
+
+    # Upload WAV path -> (uploaded seconds, time scale). Retries and hedge copies reuse the file
+    # written by the first attempt and its scale, so a tempo failure on a later attempt can't
+    # pair the sped-up file with scale 1.0.
+    prepared: dict[str, tuple[float, float]] = {}
+    prepared_locks: dict[str, Lock] = {}
+    prepared_guard = Lock()
+
+    def _prepare_upload(wav_part: np.ndarray, wav_path: str) -> tuple[float, float]:
+        with prepared_guard:
+            path_lock = prepared_locks.setdefault(wav_path, Lock())
+        with path_lock:
+            done = prepared.get(wav_path)
+            if done is None:
+                up_wav, scale = _apply_tempo(wav_part)
+                save_audio_file(up_wav, wav_path)
+                done = prepared[wav_path] = (len(up_wav) / float(WAV_SAMPLE_RATE), scale)
+            return done
+
+    def _openai_key(wav_part: np.ndarray, upload_format: str, stream: bool) -> str | None:
+        if cache is None:
+            return None
+        return make_cache_key(
+            wav_part,
+            backend="openai",
+            model=model,
+            language=language,
+            prompt=prompt,
+            # Pooled servers are assumed to serve the same model: key on the primary endpoint.
+            # Streamed results have no segments, so they must not satisfy a non-streamed run.
+            extra={
+                "base_url": str(client.base_url),
+                "upload": upload_format,
+                "stream": stream,
+                "tempo": round(tempo, 3),
+            },
+        )
+
+    # Streaming only pays off with a progress sink. Streamed results carry no segment timestamps,
+    # so they are used where the time axis comes from elsewhere: VAD speech regions and txt output.
+    stream_regions = bool(stream_asr) and on_progress is not None
 
     # Speed optimization for "vad_speech" timeline strategy:
     # - do VAD once on the full waveform
@@ -557,6 +1131,8 @@ def transcribe_to_subtitles(
                 total_segments = 0
                 used_vad_speech = True
                 used_vad = True
+                if on_progress is not None:
+                    reporter = _ProgressReporter(on_progress, len(regions))
 
                 logger.info(
                     "VAD 语音段模式(单次VAD): regions=%d, concurrency=%d, "
@@ -567,76 +1143,72 @@ def transcribe_to_subtitles(
                     int(vad_speech_merge_gap_ms),
                 )
 
-                _tl = thread_local()
-
-                def _get_thread_client():
-                    c = getattr(_tl, "client", None)
-                    if c is None:
-                        c = make_openai_client(api_key=openai_api_key, base_url=openai_base_url)
-                        _tl.client = c
-                    return c
-
                 with TemporaryDirectory(prefix="auto-asr-") as tmp_dir:
-                    results: dict[int, tuple[float, float, Any]] = {}
 
-                    def _worker(
-                        r_idx: int, r_start: int, r_end: int, r_wav: Any
-                    ) -> tuple[int, float, float, Any]:
+                    def _worker(task: tuple[int, int, int, np.ndarray]) -> ASRResult:
+                        r_idx, _r_start, _r_end, r_wav = task
                         _check_cancel(cancel_event)
-                        abs_start_s = r_start / float(WAV_SAMPLE_RATE)
-                        abs_end_s = r_end / float(WAV_SAMPLE_RATE)
 
                         region_wav_path = os.path.join(tmp_dir, f"region_{r_idx:06d}.wav")
-                        save_audio_file(r_wav, region_wav_path)
+                        upload_s, scale = _prepare_upload(r_wav, region_wav_path)
 
                         # For speed: always upload speech regions as WAV (PCM_16).
                         upload_path = region_wav_path
 
                         _check_cancel(cancel_event)
-                        asr = transcribe_file_verbose(
-                            _get_thread_client(),
-                            file_path=upload_path,
-                            model=model,
-                            language=language,
-                            prompt=prompt,
+                        asr = _transcribe(
+                            upload_path,
+                            upload_s,
+                            stream_label=f"语音段 {r_idx + 1}" if stream_regions else None,
                         )
-                        return r_idx, abs_start_s, abs_end_s, asr
+                        return _rescale_result(asr, scale)
+
+                    def _on_result(r_idx: int, asr: ASRResult) -> None:
+                        r_start, r_end, _w = regions[r_idx]
+                        logger.info(
+                            "语音段 %d/%d 完成: text_len=%d, start=%.2fs end=%.2fs",
+                            r_idx + 1,
+                            len(regions),
+                            len(asr.text or ""),
+                            r_start / float(WAV_SAMPLE_RATE),
+                            r_end / float(WAV_SAMPLE_RATE),
+                        )
+                        if reporter is not None:
+                            reporter.region_done()
 
                     tasks = [(i, s, e, w) for i, (s, e, w) in enumerate(regions)]
-                    ex = ThreadPoolExecutor(max_workers=api_concurrency)
-                    futures = [ex.submit(_worker, *t) for t in tasks]
-                    cancelled = False
+                    keys = [_openai_key(w, "wav", stream_regions) for (_s, _e, w) in regions]
+                    spans = [
+                        (s / float(WAV_SAMPLE_RATE), e / float(WAV_SAMPLE_RATE))
+                        for (s, e, _w) in regions
+                    ]
                     try:
-                        for fut in as_completed(futures):
-                            if cancel_event is not None and cancel_event.is_set():
-                                cancelled = True
-                                break
-                            try:
-                                r_idx, abs_start_s, abs_end_s, asr = fut.result()
-                            except Exception as e:
-                                raise RuntimeError(f"语音段并发转写失败：{e}") from e
-
-                            results[int(r_idx)] = (abs_start_s, abs_end_s, asr)
-                            logger.info(
-                                "语音段 %d/%d 完成: text_len=%d, start=%.2fs end=%.2fs",
-                                r_idx + 1,
-                                len(regions),
-                                len(getattr(asr, "text", "") or ""),
-                                abs_start_s,
-                                abs_end_s,
-                            )
-                    finally:
-                        if cancelled:
-                            for f in futures:
-                                f.cancel()
-                            ex.shutdown(wait=False, cancel_futures=True)
-                        else:
-                            ex.shutdown(wait=True, cancel_futures=True)
-
-                    _check_cancel(cancel_event)
+                        results = _run_cached_region_tasks(
+                            tasks,
+                            _worker,
+                            cache=cache,
+                            keys=keys,
+                            on_result=_on_result,
+                            on_failure=(
+                                _failure_recorder(spans, failures) if partial_results else None
+                            ),
+                            limiter=limiter,
+                            cancel_event=cancel_event,
+                            policy=retry_policy,
+                            hedge=hedge,
+                            on_hedge_stats=hedge_stats.append,
+                        )
+                    except Exception as e:
+                        _check_cancel(cancel_event)
+                        raise RuntimeError(f"语音段并发转写失败：{e}") from e
 
-                    for r_idx in range(len(regions)):
-                        abs_start_s, abs_end_s, asr = results[r_idx]
+                    failed_idx = {f.index for f in failures}
+                    for r_idx, (r_start, r_end, _w) in enumerate(regions):
+                        if r_idx in failed_idx:
+                            continue
+                        asr = results[r_idx]
+                        abs_start_s = r_start / float(WAV_SAMPLE_RATE)
+                        abs_end_s = r_end / float(WAV_SAMPLE_RATE)
                         # Preserve chronological text order (matches region order).
                         full_text_parts.append(asr.text.strip())
 
@@ -674,8 +1246,14 @@ def transcribe_to_subtitles(
                 out_base = f"{_safe_stem(input_audio_path)}-{time.strftime('%Y%m%d-%H%M%S')}"
                 out_path = Path(outputs_dir) / f"{out_base}.{ext}"
                 _write_text(out_path, subtitle_text)
+                failed_path = (
+                    _write_failed_regions(out_path, input_audio_path, failures)
+                    if failures
+                    else None
+                )
 
                 preview = subtitle_text[:5000]
+                limiter_stats = limiter.stats()
                 debug = (
                     f"regions={len(regions)}, segments={total_segments}, "
                     f"vad=on(used={used_vad}), vad_speech_used={used_vad_speech}, "
@@ -686,7 +1264,15 @@ def transcribe_to_subtitles(
                     f"vad_speech_max_utterance_s={int(vad_speech_max_utterance_s)}, "
                     f"vad_speech_merge_gap_ms={int(vad_speech_merge_gap_ms)}, "
                     f"timeline_strategy={timeline_strategy}, upload_audio_format=wav, "
-                    f"api_concurrency={api_concurrency}"
+                    f"upload_tempo={tempo:.2f}, "
+                    f"api_concurrency={api_concurrency}, "
+                    f"adaptive_concurrency={'on' if adaptive_concurrency else 'off'}"
+                    f"(final_limit={limiter_stats.limit}, "
+                    f"max_seen={limiter_stats.max_limit_seen}, "
+                    f"throttles={limiter_stats.throttles}), "
+                    f"{_cache_debug(cache, cache_before)}, "
+                    f"{_failure_debug(failed_path, failures, cache)}, "
+                    f"{_hedge_debug(hedge, hedge_stats)}, {_pool_debug(pool)}"
                 )
                 logger.info(
                     "转写完成(vad_speech): out=%s, regions=%d, segments=%d",
@@ -722,149 +1308,138 @@ def transcribe_to_subtitles(
 
     logger.info("分段信息: chunks=%d, used_vad=%s", len(chunks), used_vad)
 
-    with TemporaryDirectory(prefix="auto-asr-") as tmp_dir:
-        vad_model = get_vad_model() if enable_vad and timeline_strategy == "vad_speech" else None
-        for idx, chunk in enumerate(chunks):
-            _check_cancel(cancel_event)
-            logger.info(
-                "处理分段 %d/%d: start=%.2fs end=%.2fs duration=%.2fs",
-                idx + 1,
-                len(chunks),
-                chunk.start_s,
-                chunk.end_s,
-                chunk.duration_s,
+    # Plan all uploads first (VAD is local and cheap), then run them through the same concurrent
+    # region executor as the vad_speech path, and finally reassemble results in order.
+    units: list[_UploadUnit] = []
+    vad_model = get_vad_model() if enable_vad and timeline_strategy == "vad_speech" else None
+    silence_vad_model = get_vad_model() if silence_compress else None
+    if silence_compress and silence_vad_model is None:
+        logger.info("VAD 模型不可用，跳过静音压缩。")
+    removed_silence_s = 0.0
+    for idx, chunk in enumerate(chunks):
+        _check_cancel(cancel_event)
+        logger.info(
+            "处理分段 %d/%d: start=%.2fs end=%.2fs duration=%.2fs",
+            idx + 1,
+            len(chunks),
+            chunk.start_s,
+            chunk.end_s,
+            chunk.duration_s,
+        )
+
+        # When upstream doesn't return segments, we can improve subtitle time axis by
+        # transcribing VAD speech regions and using VAD timestamps as SRT/VTT axis.
+        #
+        # Note: this increases API calls a lot (one call per speech region).
+        if output_format in {"srt", "vtt"} and timeline_strategy == "vad_speech" and vad_model:
+            regions = process_vad_speech(
+                chunk.wav,
+                vad_model,
+                max_utterance_s=int(vad_speech_max_utterance_s),
+                merge_gap_ms=int(vad_speech_merge_gap_ms),
+                vad_threshold=float(vad_threshold),
+                vad_min_speech_duration_ms=int(vad_min_speech_duration_ms),
+                vad_min_silence_duration_ms=int(vad_min_silence_duration_ms),
+                vad_speech_pad_ms=int(vad_speech_pad_ms),
             )
-
-            # When upstream doesn't return segments, we can improve subtitle time axis by
-            # transcribing VAD speech regions and using VAD timestamps as SRT/VTT axis.
-            #
-            # Note: this increases API calls a lot (one call per speech region).
-            if (
-                output_format in {"srt", "vtt"}
-                and timeline_strategy == "vad_speech"
-                and vad_model is not None
-            ):
-                _check_cancel(cancel_event)
-                regions = process_vad_speech(
+            if regions:
+                used_vad_speech = True
+                logger.info(
+                    "VAD 语音段模式: regions=%d, max_utterance=%ss, merge_gap=%dms",
+                    len(regions),
+                    int(vad_speech_max_utterance_s),
+                    int(vad_speech_merge_gap_ms),
+                )
+                for r_idx, (r_start, r_end, r_wav) in enumerate(regions):
+                    units.append(
+                        _UploadUnit(
+                            name=f"region_{idx:04d}_{r_idx:04d}",
+                            label=f"分段 {idx + 1} 语音段 {r_idx + 1}/{len(regions)}",
+                            start_sample=chunk.start_sample + r_start,
+                            end_sample=chunk.start_sample + r_end,
+                            wav=r_wav,
+                        )
+                    )
+                continue
+            logger.info("VAD 未检测到语音段，降级为整段转写。")
+
+        upload_wav = chunk.wav
+        offset_map: OffsetMap | None = None
+        if silence_vad_model is not None:
+            # Gaps shorter than the threshold are merged away, so only long silences remain.
+            spans = process_vad_speech(
+                chunk.wav,
+                silence_vad_model,
+                max_utterance_s=0,
+                merge_gap_ms=int(float(silence_compress_min_s) * 1000),
+                vad_threshold=float(vad_threshold),
+                vad_min_speech_duration_ms=int(vad_min_speech_duration_ms),
+                vad_min_silence_duration_ms=int(vad_min_silence_duration_ms),
+                vad_speech_pad_ms=int(vad_speech_pad_ms),
+            )
+            if spans:
+                compressed, cmap = compress_silence(
                     chunk.wav,
-                    vad_model,
-                    max_utterance_s=int(vad_speech_max_utterance_s),
-                    merge_gap_ms=int(vad_speech_merge_gap_ms),
-                    vad_threshold=float(vad_threshold),
-                    vad_min_speech_duration_ms=int(vad_min_speech_duration_ms),
-                    vad_min_silence_duration_ms=int(vad_min_silence_duration_ms),
-                    vad_speech_pad_ms=int(vad_speech_pad_ms),
+                    [(s, e) for (s, e, _w) in spans],
+                    min_silence_s=float(silence_compress_min_s),
+                    keep_silence_s=float(silence_compress_keep_s),
                 )
-                if regions:
-                    used_vad_speech = True
+                if cmap.removed_s > 0:
+                    upload_wav, offset_map = compressed, cmap
+                    removed_silence_s += cmap.removed_s
                     logger.info(
-                        "VAD 语音段模式: regions=%d, max_utterance=%ss, merge_gap=%dms",
-                        len(regions),
-                        int(vad_speech_max_utterance_s),
-                        int(vad_speech_merge_gap_ms),
+                        "分段 %d 静音压缩: %.1fs -> %.1fs",
+                        idx + 1,
+                        chunk.duration_s,
+                        len(compressed) / float(WAV_SAMPLE_RATE),
                     )
-                    for r_idx, (r_start, r_end, r_wav) in enumerate(regions):
-                        _check_cancel(cancel_event)
-                        abs_start_s = (chunk.start_sample + r_start) / float(WAV_SAMPLE_RATE)
-                        abs_end_s = (chunk.start_sample + r_end) / float(WAV_SAMPLE_RATE)
-                        region_wav_path = os.path.join(tmp_dir, f"region_{idx:04d}_{r_idx:04d}.wav")
-                        save_audio_file(r_wav, region_wav_path)
-                        upload_path = region_wav_path
-                        if upload_audio_format == "mp3":
-                            upload_path = os.path.join(tmp_dir, f"region_{idx:04d}_{r_idx:04d}.mp3")
-                            try:
-                                transcode_wav_to_mp3(
-                                    input_wav_path=region_wav_path,
-                                    output_mp3_path=upload_path,
-                                    bitrate_kbps=int(upload_mp3_bitrate_kbps),
-                                )
-                            except Exception as e:
-                                logger.info("MP3 转码失败，改用 WAV 上传: %s", e)
-                                upload_path = region_wav_path
-
-                        try:
-                            size_bytes = os.path.getsize(upload_path)
-                            logger.info(
-                                "语音段 %d/%d 文件大小: %.2f MiB (%d bytes)",
-                                r_idx + 1,
-                                len(regions),
-                                size_bytes / 1024.0 / 1024.0,
-                                size_bytes,
-                            )
-                        except Exception:
-                            pass
 
-                        _check_cancel(cancel_event)
-                        asr = transcribe_file_verbose(
-                            client,
-                            file_path=upload_path,
-                            model=model,
-                            language=language,
-                            prompt=prompt,
-                        )
-                        full_text_parts.append(asr.text.strip())
+        units.append(
+            _UploadUnit(
+                name=f"chunk_{idx:04d}",
+                label=f"分段 {idx + 1}/{len(chunks)}",
+                start_sample=chunk.start_sample,
+                end_sample=chunk.end_sample,
+                wav=upload_wav,
+                offset_map=offset_map,
+            )
+        )
 
-                        if asr.segments:
-                            for seg in asr.segments:
-                                subtitle_lines.append(
-                                    SubtitleLine(
-                                        start_s=abs_start_s + seg.start_s,
-                                        end_s=abs_start_s + seg.end_s,
-                                        text=seg.text,
-                                    )
-                                )
-                            total_segments += len(asr.segments)
-                            logger.info(
-                                "语音段 %d/%d 完成: segments=%d, text_len=%d, "
-                                "start=%.2fs end=%.2fs",
-                                r_idx + 1,
-                                len(regions),
-                                len(asr.segments),
-                                len(asr.text or ""),
-                                abs_start_s,
-                                abs_end_s,
-                            )
-                        else:
-                            subtitle_lines.append(
-                                SubtitleLine(
-                                    start_s=abs_start_s,
-                                    end_s=abs_end_s,
-                                    text=asr.text,
-                                )
-                            )
-                            total_segments += 1
-                            logger.info(
-                                "语音段 %d/%d 完成: segments=0(用VAD时间轴), text_len=%d, "
-                                "start=%.2fs end=%.2fs",
-                                r_idx + 1,
-                                len(regions),
-                                len(asr.text or ""),
-                                abs_start_s,
-                                abs_end_s,
-                            )
-                    continue
-                logger.info("VAD 未检测到语音段，降级为整段转写。")
+    stream_units = stream_regions and output_format == "txt"
+    if on_progress is not None:
+        reporter = _ProgressReporter(on_progress, len(units))
+    logger.info(
+        "分段上传任务: units=%d, concurrency=%d(adaptive=%s)",
+        len(units),
+        limiter.limit,
+        adaptive_concurrency,
+    )
 
+    with TemporaryDirectory(prefix="auto-asr-") as tmp_dir:
+
+        def _unit_worker(unit: _UploadUnit) -> ASRResult:
             _check_cancel(cancel_event)
-            chunk_wav_path = os.path.join(tmp_dir, f"chunk_{idx:04d}.wav")
-            save_audio_file(chunk.wav, chunk_wav_path)
-            upload_path = chunk_wav_path
+            wav_path = os.path.join(tmp_dir, f"{unit.name}.wav")
+            upload_path = wav_path
+            upload_s, scale = _prepare_upload(unit.wav, wav_path)
             if upload_audio_format == "mp3":
-                upload_path = os.path.join(tmp_dir, f"chunk_{idx:04d}.mp3")
-                try:
-                    transcode_wav_to_mp3(
-                        input_wav_path=chunk_wav_path,
-                        output_mp3_path=upload_path,
-                        bitrate_kbps=int(upload_mp3_bitrate_kbps),
-                    )
-                except Exception as e:
-                    logger.info("MP3 转码失败，改用 WAV 上传: %s", e)
-                    upload_path = chunk_wav_path
+                upload_path = os.path.join(tmp_dir, f"{unit.name}.mp3")
+                if not os.path.exists(upload_path):
+                    try:
+                        transcode_wav_to_mp3(
+                            input_wav_path=wav_path,
+                            output_mp3_path=upload_path,
+                            bitrate_kbps=int(upload_mp3_bitrate_kbps),
+                        )
+                    except Exception as e:
+                        logger.info("MP3 转码失败，改用 WAV 上传: %s", e)
+                        upload_path = wav_path
 
             try:
                 size_bytes = os.path.getsize(upload_path)
                 logger.info(
-                    "分段文件大小: %.2f MiB (%d bytes)",
+                    "%s 文件大小: %.2f MiB (%d bytes)",
+                    unit.label,
                     size_bytes / 1024.0 / 1024.0,
                     size_bytes,
                 )
@@ -872,50 +1447,72 @@ def transcribe_to_subtitles(
                 pass
 
             _check_cancel(cancel_event)
-            asr = transcribe_file_verbose(
-                client,
-                file_path=upload_path,
-                model=model,
-                language=language,
-                prompt=prompt,
+            asr = _transcribe(
+                upload_path,
+                upload_s,
+                stream_label=unit.label if stream_units else None,
             )
+            # Tempo first (upload -> unit audio), then the unit's silence offset map at assembly.
+            return _rescale_result(asr, scale)
 
-            full_text_parts.append(asr.text.strip())
+        def _on_unit_result(u_idx: int, asr: ASRResult) -> None:
+            unit = units[u_idx]
+            logger.info(
+                "%s 完成: segments=%d, text_len=%d, start=%.2fs end=%.2fs",
+                unit.label,
+                len(asr.segments),
+                len(asr.text or ""),
+                unit.start_s,
+                unit.end_s,
+            )
+            if reporter is not None:
+                reporter.region_done()
 
-            offset_s = chunk.start_sample / float(WAV_SAMPLE_RATE)
-            if asr.segments:
-                for seg in asr.segments:
-                    subtitle_lines.append(
-                        SubtitleLine(
-                            start_s=offset_s + seg.start_s,
-                            end_s=offset_s + seg.end_s,
-                            text=seg.text,
-                        )
-                    )
-                total_segments += len(asr.segments)
-                logger.info(
-                    "分段 %d/%d 完成: segments=%d, text_len=%d",
-                    idx + 1,
-                    len(chunks),
-                    len(asr.segments),
-                    len(asr.text or ""),
-                )
-            else:
-                # Fallback: coarse chunk-level subtitle.
+        try:
+            unit_results = _run_cached_region_tasks(
+                units,
+                _unit_worker,
+                cache=cache,
+                keys=[_openai_key(u.wav, upload_audio_format, stream_units) for u in units],
+                on_result=_on_unit_result,
+                on_failure=(
+                    _failure_recorder([(u.start_s, u.end_s) for u in units], failures)
+                    if partial_results
+                    else None
+                ),
+                limiter=limiter,
+                cancel_event=cancel_event,
+                policy=retry_policy,
+                hedge=hedge,
+                on_hedge_stats=hedge_stats.append,
+                label="分段",
+            )
+        except Exception as e:
+            _check_cancel(cancel_event)
+            raise RuntimeError(f"分段并发转写失败：{e}") from e
+
+    failed_idx = {f.index for f in failures}
+    for u_idx, (unit, asr) in enumerate(zip(units, unit_results, strict=True)):
+        if u_idx in failed_idx:
+            continue
+        full_text_parts.append(asr.text.strip())
+
+        if asr.segments:
+            for seg in asr.segments:
                 subtitle_lines.append(
                     SubtitleLine(
-                        start_s=chunk.start_s,
-                        end_s=chunk.end_s,
-                        text=asr.text,
+                        start_s=unit.to_abs_s(seg.start_s),
+                        end_s=unit.to_abs_s(seg.end_s),
+                        text=seg.text,
                     )
                 )
-                total_segments += 1
-                logger.info(
-                    "分段 %d/%d 完成: segments=0(降级为整段), text_len=%d",
-                    idx + 1,
-                    len(chunks),
-                    len(asr.text or ""),
-                )
+            total_segments += len(asr.segments)
+        else:
+            # Fallback: use the VAD region / chunk as a coarse subtitle time axis.
+            subtitle_lines.append(
+                SubtitleLine(start_s=unit.start_s, end_s=unit.end_s, text=asr.text)
+            )
+            total_segments += 1
 
     _check_cancel(cancel_event)
     subtitle_lines.sort(key=lambda x: (x.start_s, x.end_s))
@@ -935,6 +1532,7 @@ def transcribe_to_subtitles(
     out_base = f"{_safe_stem(input_audio_path)}-{time.strftime('%Y%m%d-%H%M%S')}"
     out_path = Path(outputs_dir) / f"{out_base}.{ext}"
     _write_text(out_path, subtitle_text)
+    failed_path = _write_failed_regions(out_path, input_audio_path, failures) if failures else None
 
     preview = subtitle_text[:5000]
     debug = (
@@ -948,7 +1546,13 @@ def transcribe_to_subtitles(
         f"vad_min_silence_duration_ms={int(vad_min_silence_duration_ms)}, "
         f"vad_speech_pad_ms={int(vad_speech_pad_ms)}, "
         f"timeline_strategy={timeline_strategy}, "
-        f"upload_audio_format={upload_audio_format}"
+        f"upload_audio_format={upload_audio_format}, upload_tempo={tempo:.2f}, "
+        f"uploads={len(units)}, api_concurrency={api_concurrency}, "
+        f"silence_compress={'on' if silence_vad_model is not None else 'off'}"
+        f"(removed={removed_silence_s:.1f}s), "
+        f"{_cache_debug(cache, cache_before)}, "
+        f"{_failure_debug(failed_path, failures, cache)}, "
+        f"{_hedge_debug(hedge, hedge_stats)}, {_pool_debug(pool)}"
     )
     logger.info(
         "转写完成: out=%s, chunks=%d, segments=%d, used_vad=%s, vad_speech=%s",
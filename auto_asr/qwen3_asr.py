@@ -1,15 +1,35 @@
 from __future__ import annotations
 
+import contextlib
+import inspect
 import logging
+import math
+import time
+from collections.abc import Callable, Iterator
 from dataclasses import dataclass
-from gc import collect as gc_collect
 from pathlib import Path
+from threading import Event, Lock
 from typing import Any
 
 import numpy as np
 
+from auto_asr.batching import (
+    AutoBatchSizer,
+    is_oom_error,
+    padding_ratio,
+    plan_length_batches,
+    plan_sequential_batches,
+)
 from auto_asr.model_hub import configure_model_cache_env, snapshot_download
+from auto_asr.model_residency import (
+    available_memory_mb,
+    free_device_memory,
+    get_model_residency,
+    process_rss_mb,
+)
 from auto_asr.openai_asr import ASRResult
+from auto_asr.quantization import quantize_dynamic_int8
+from auto_asr.runtime_tuning import apply_backend_threads, get_runtime_tuning
 
 logger = logging.getLogger(__name__)
 
@@ -20,10 +40,29 @@ class Qwen3ASRConfig:
     device: str = "auto"
     max_inference_batch_size: int = 8
     max_new_tokens: int = 1024
-
-
-_MODEL_CACHE: dict[tuple[str, str, int, int], Any] = {}
+    # Dynamic int8 quantization of linear layers on CPU (see `auto_asr.quantization`).
+    quantize: bool = False
+    # Size batches by padded audio seconds from measured memory use (see
+    # `auto_asr.batching.AutoBatchSizer`); `max_inference_batch_size` still caps the item count.
+    auto_batch: bool = False
+    # Memory batches may use, in MiB; 0 uses the free RAM/VRAM when the job starts.
+    batch_memory_mb: float = 0.0
+    # Per-batch generation cap from region duration: max(min_new_tokens, duration x
+    # max_new_tokens_per_s), never above `max_new_tokens`; 0 tokens/s disables it. Stops a
+    # looping decode on a short region from running the whole batch to `max_new_tokens`.
+    max_new_tokens_per_s: float = 15.0
+    min_new_tokens: int = 48
+
+
+# Loaded models live in the shared residency registry under this owner, keyed by
+# (model dir, device, max batch, max new tokens, quantize).
+_OWNER = "qwen3"
 _MODEL_DIR_CACHE: dict[str, str] = {}
+# Per model (by id): when `transcribe()` takes no `max_new_tokens`, a batch's cap is set on the
+# shared (resident) model itself, so batches on that model take turns.
+_TOKEN_CAP_LOCKS: dict[int, Lock] = {}
+_TOKEN_CAP_LOCKS_GUARD = Lock()
+_TOKEN_CAP_UNSUPPORTED_LOGGED = False
 
 
 def resolve_qwen3_model_dir(model: str) -> str:
@@ -122,19 +161,41 @@ def download_qwen3_models(*, model: str) -> str:
     return resolve_qwen3_model_dir(model)
 
 
-def _make_model(cfg: Qwen3ASRConfig) -> Any:
-    model_dir_or_id = resolve_qwen3_model_dir(cfg.model)
-    key = (
-        model_dir_or_id,
+def _model_key(cfg: Qwen3ASRConfig) -> tuple:
+    return (
+        resolve_qwen3_model_dir(cfg.model),
         _resolve_device(cfg.device),
         int(cfg.max_inference_batch_size),
         int(cfg.max_new_tokens),
+        bool(cfg.quantize),
     )
-    cached = _MODEL_CACHE.get(key)
-    if cached is not None:
-        return cached
 
-    device_map = key[1]
+
+def _dtype_name(device: str, quantize: bool) -> str:
+    """Weights dtype a model loaded for `device` runs in (int8 only applies on CPU)."""
+    if quantize and not str(device).startswith("cuda"):
+        return "int8"
+    dtype = _resolve_dtype(device)
+    return str(dtype).removeprefix("torch.") if dtype is not None else "default"
+
+
+def _make_model(cfg: Qwen3ASRConfig) -> Any:
+    key = _model_key(cfg)
+    return get_model_residency().get_or_load(
+        _OWNER, key, lambda: _load_model(cfg, key[0], key[1]), device=key[1]
+    )
+
+
+def _use_model(cfg: Qwen3ASRConfig) -> contextlib.AbstractContextManager[Any]:
+    """`_make_model`, leased for one inference call so it isn't evicted while the call runs."""
+    key = _model_key(cfg)
+    return get_model_residency().use(
+        _OWNER, key, lambda: _load_model(cfg, key[0], key[1]), device=key[1]
+    )
+
+
+def _load_model(cfg: Qwen3ASRConfig, model_dir_or_id: str, device_map: str) -> Any:
+    apply_backend_threads("qwen3")
     dtype = _resolve_dtype(device_map)
 
     Qwen3ASRModel = _import_qwen_asr()
@@ -154,32 +215,116 @@ def _make_model(cfg: Qwen3ASRConfig) -> Any:
     }
 
     model = Qwen3ASRModel.from_pretrained(model_dir_or_id, **kwargs)
-
-    _MODEL_CACHE[key] = model
+    if cfg.quantize:
+        if str(device_map).startswith("cuda"):
+            logger.warning("Qwen3-ASR int8 量化仅支持 CPU，已按原精度加载: device=%s", device_map)
+        else:
+            count = quantize_dynamic_int8(model)
+            logger.info("Qwen3-ASR 动态 int8 量化完成: linear_layers=%d", count)
+    if get_runtime_tuning().warmup:
+        _warmup(model)
     return model
 
 
+def _warmup(model: Any) -> None:
+    """One pass over 1 s of silence, so lazy initialization isn't billed to the first chunk."""
+    started = time.monotonic()
+    try:
+        model.transcribe(
+            audio=[(np.zeros(16000, dtype=np.float32), 16000)],
+            language=[None],
+            return_time_stamps=False,
+        )
+    except Exception as e:
+        logger.warning("Qwen3-ASR 预热失败(已忽略): %s", e)
+        return
+    logger.info("Qwen3-ASR 预热完成: %.2fs", time.monotonic() - started)
+
+
 def preload_qwen3_model(cfg: Qwen3ASRConfig) -> Any:
     """Preload model into cache (used by WebUI 'load model' button)."""
     return _make_model(cfg)
 
 
 def release_qwen3_resources() -> int:
-    """Release cached Qwen3-ASR models and try to free GPU memory."""
-    cleared = len(_MODEL_CACHE)
-    _MODEL_CACHE.clear()
-    gc_collect()
+    """Release cached Qwen3-ASR models and try to free GPU memory.
+
+    Models otherwise stay resident between jobs (see `auto_asr.model_residency`).
+    """
+    cleared = get_model_residency().release(_OWNER)
+    logger.info("Qwen3-ASR 资源清理完成: cleared_models=%d", cleared)
+    return cleared
+
+
+def region_token_cap(duration_s: float, cfg: Qwen3ASRConfig) -> int:
+    """`max_new_tokens` for a region of `duration_s` seconds under `cfg`."""
+    ceiling = max(1, int(cfg.max_new_tokens))
+    if cfg.max_new_tokens_per_s <= 0:
+        return ceiling
+    cap = max(int(cfg.min_new_tokens), math.ceil(float(duration_s) * cfg.max_new_tokens_per_s))
+    return max(1, min(ceiling, cap))
+
 
+def _takes_kwarg(func: Any, name: str) -> bool:
     try:
-        import torch  # type: ignore
+        return name in inspect.signature(func).parameters
+    except Exception:  # pragma: no cover
+        return False
 
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-    except Exception:
-        pass
 
-    logger.info("Qwen3-ASR 资源清理完成: cleared_models=%d", cleared)
-    return cleared
+@contextlib.contextmanager
+def _token_cap(model: Any, cap: int) -> Iterator[dict[str, Any]]:
+    """Yield the extra `transcribe()` kwargs that cap this call at `cap` new tokens.
+
+    Passed per call when `transcribe()` names a `max_new_tokens` parameter. Otherwise
+    `model.max_new_tokens` is lowered for the duration (under a per-model lock, so concurrent
+    jobs on the same resident model serialize) and nothing extra is passed.
+    """
+    global _TOKEN_CAP_UNSUPPORTED_LOGGED
+    if _takes_kwarg(getattr(model, "transcribe", None), "max_new_tokens"):
+        yield {"max_new_tokens": int(cap)}
+        return
+    current = getattr(model, "max_new_tokens", None)
+    if not isinstance(current, int):
+        if not _TOKEN_CAP_UNSUPPORTED_LOGGED:
+            _TOKEN_CAP_UNSUPPORTED_LOGGED = True
+            logger.warning("当前 qwen-asr 版本不支持按段限制 max_new_tokens，已忽略")
+        yield {}
+        return
+    with _TOKEN_CAP_LOCKS_GUARD:
+        lock = _TOKEN_CAP_LOCKS.setdefault(id(model), Lock())
+    with lock:
+        current = model.max_new_tokens
+        model.max_new_tokens = min(int(cap), current)
+        try:
+            yield {}
+        finally:
+            model.max_new_tokens = current
+
+
+def _memory_mark(device: str) -> float:
+    """Start a peak-memory measurement; returns the baseline in MiB."""
+    if str(device).startswith("cuda"):
+        try:
+            import torch  # type: ignore
+
+            torch.cuda.reset_peak_memory_stats(device)
+            return torch.cuda.memory_allocated(device) / (1024.0 * 1024.0)
+        except Exception:
+            return 0.0
+    return process_rss_mb()
+
+
+def _memory_used_since(device: str, mark: float) -> float:
+    """Peak CUDA allocation (or RSS growth on CPU) since `_memory_mark`, in MiB."""
+    if str(device).startswith("cuda"):
+        try:
+            import torch  # type: ignore
+
+            return torch.cuda.max_memory_allocated(device) / (1024.0 * 1024.0) - mark
+        except Exception:
+            return 0.0
+    return process_rss_mb() - mark
 
 
 def transcribe_chunks_qwen3(
@@ -188,33 +333,148 @@ def transcribe_chunks_qwen3(
     cfg: Qwen3ASRConfig,
     language: str | None,
     sample_rate: int,
+    length_bucketing: bool = True,
+    cancel_event: Event | None = None,
+    on_result: Callable[[int, ASRResult], None] | None = None,
+) -> list[ASRResult]:
+    """Transcribe audio chunks with Qwen3-ASR (transformers backend).
+
+    With `length_bucketing`, chunks are sorted by duration and fed in batches of
+    `max_inference_batch_size` similar-length chunks, so short VAD regions aren't padded to the
+    longest region of a chronological batch; results come back in input order.
+    `cancel_event` is checked between batches and `on_result(index, result)` is called as each
+    batch finishes, so callers can report progress and keep finished chunks of a stopped job.
+    With `cfg.auto_batch`, batch sizes come from an `AutoBatchSizer` instead, and a batch that
+    runs out of memory is retried in smaller batches. Each batch decodes at most
+    `region_token_cap` of its longest chunk; sorting by length keeps chunks with similar caps
+    in the same batch.
+    """
+    with _use_model(cfg) as model:
+        return _transcribe_chunks(
+            model,
+            chunks=chunks,
+            cfg=cfg,
+            language=language,
+            sample_rate=sample_rate,
+            length_bucketing=length_bucketing,
+            cancel_event=cancel_event,
+            on_result=on_result,
+        )
+
+
+def _transcribe_chunks(
+    model: Any,
+    *,
+    chunks: list[np.ndarray],
+    cfg: Qwen3ASRConfig,
+    language: str | None,
+    sample_rate: int,
+    length_bucketing: bool,
+    cancel_event: Event | None,
+    on_result: Callable[[int, ASRResult], None] | None,
 ) -> list[ASRResult]:
-    """Transcribe audio chunks with Qwen3-ASR (transformers backend)."""
-    model = _make_model(cfg)
+    apply_backend_threads("qwen3")
 
     lang_name = resolve_qwen3_language(language)
-    lang_list = [lang_name for _ in chunks]
-
-    audio_inputs = [(w, int(sample_rate)) for w in chunks]
-    results = model.transcribe(
-        audio=audio_inputs,
-        language=lang_list,
-        # Forced aligner is intentionally not used; subtitle timeline should
-        # come from Silero VAD segmentation in our pipeline.
-        return_time_stamps=False,
-    )
-
-    out: list[ASRResult] = []
-    for r in results:
-        text = str(getattr(r, "text", "") or "").strip()
-        out.append(ASRResult(text=text, segments=[]))
-    return out
+    durations = [len(w) / float(sample_rate) for w in chunks]
+    device = _resolve_device(cfg.device)
+    sizer: AutoBatchSizer | None = None
+    batches: list[list[int]] = []
+    if cfg.auto_batch:
+        order = list(range(len(chunks)))
+        if length_bucketing:
+            order.sort(key=durations.__getitem__)
+        memory_mb = float(cfg.batch_memory_mb) or available_memory_mb(device)
+        sizer = AutoBatchSizer(
+            (cfg.model, device, _dtype_name(device, cfg.quantize)), memory_mb=memory_mb
+        )
+        logger.info(
+            "Qwen3-ASR 自动批量推理: chunks=%d, memory=%.0fMB, start=%.0fs, ceiling=%.0fs",
+            len(chunks),
+            memory_mb,
+            sizer.budget_s,
+            sizer.ceiling_s,
+        )
+    else:
+        if length_bucketing:
+            batches = plan_length_batches(
+                durations, batch_size_s=float("inf"), max_batch_size=cfg.max_inference_batch_size
+            )
+        else:
+            batches = plan_sequential_batches(
+                len(chunks), max_batch_size=cfg.max_inference_batch_size
+            )
+        logger.info(
+            "Qwen3-ASR 批量推理: chunks=%d, batches=%d, bucketing=%s, padding=%.2fx",
+            len(chunks),
+            len(batches),
+            length_bucketing,
+            padding_ratio(durations, batches),
+        )
+
+    out: list[ASRResult | None] = [None] * len(chunks)
+    done = 0
+    batches_done = 0
+    while done < len(chunks):
+        if cancel_event is not None and cancel_event.is_set():
+            logger.info("Qwen3-ASR 推理已停止: chunks_done=%d/%d", done, len(chunks))
+            # Activations of the finished batches are garbage now; the model stays resident.
+            free_device_memory()
+            raise RuntimeError("已停止转写。")
+        if sizer is None:
+            batch = batches[batches_done]
+        else:
+            batch = sizer.take(durations, order, done, max_items=cfg.max_inference_batch_size)
+        padded_s = len(batch) * max(durations[i] for i in batch)
+        mark = _memory_mark(device) if sizer is not None else 0.0
+        try:
+            cap = region_token_cap(max(durations[i] for i in batch), cfg)
+            with _token_cap(model, cap) as cap_kwargs:
+                results = model.transcribe(
+                    audio=[(chunks[i], int(sample_rate)) for i in batch],
+                    language=[lang_name for _ in batch],
+                    # Forced aligner is intentionally not used; subtitle timeline should
+                    # come from Silero VAD segmentation in our pipeline.
+                    return_time_stamps=False,
+                    **cap_kwargs,
+                )
+        except Exception as e:
+            if sizer is None or len(batch) == 1 or not is_oom_error(e):
+                raise
+            oom = True
+        else:
+            oom = False
+        if oom:
+            # Retry the same chunks in a smaller batch (outside the handler, so the failed
+            # batch's tensors are no longer referenced by the traceback).
+            free_device_memory()
+            sizer.backoff(padded_s)
+            continue
+        if sizer is not None:
+            sizer.observe(padded_s, _memory_used_since(device, mark))
+        for i, r in zip(batch, results, strict=True):
+            text = str(getattr(r, "text", "") or "").strip()
+            out[i] = ASRResult(text=text, segments=[])
+            if on_result is not None:
+                on_result(i, out[i])
+        done += len(batch)
+        batches_done += 1
+    if sizer is not None:
+        logger.info(
+            "Qwen3-ASR 自动批量完成: batches=%d, last=%.0fs, mb_per_s=%.1f, ceiling=%.0fs",
+            batches_done,
+            sizer.budget_s,
+            sizer.mb_per_s,
+            sizer.ceiling_s,
+        )
+    return [r if r is not None else ASRResult(text="", segments=[]) for r in out]
 
 
 __all__ = [
     "Qwen3ASRConfig",
     "download_qwen3_models",
     "preload_qwen3_model",
+    "region_token_cap",
     "release_qwen3_resources",
     "resolve_qwen3_language",
     "transcribe_chunks_qwen3",
@@ -0,0 +1,238 @@
+"""Adaptive concurrency (AIMD) and error classification for upstream API calls."""
+
+from __future__ import annotations
+
+import logging
+import random
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from threading import Condition, Event
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+def status_code_of(err: BaseException) -> int | None:
+    """Best-effort extract an HTTP status code from SDK/httpx exceptions."""
+    code = getattr(err, "status_code", None)
+    if isinstance(code, int):
+        return code
+    resp = getattr(err, "response", None)
+    if resp is not None:
+        code = getattr(resp, "status_code", None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def _is_connection_error(err: BaseException) -> bool:
+    try:
+        from openai import APIConnectionError  # APITimeoutError is a subclass.
+
+        if isinstance(err, APIConnectionError):
+            return True
+    except Exception:  # pragma: no cover
+        pass
+    try:
+        import httpx
+
+        if isinstance(err, httpx.TransportError):
+            return True
+    except Exception:  # pragma: no cover
+        pass
+    return isinstance(err, (ConnectionError, TimeoutError))
+
+
+def is_throttle_error(err: BaseException) -> bool:
+    """429 or 5xx: the upstream is overloaded, so we should back off."""
+    code = status_code_of(err)
+    return code is not None and (code == 429 or code >= 500)
+
+
+def is_retryable_error(err: BaseException) -> bool:
+    """Errors worth retrying for the same request (throttling, 5xx, 408, network)."""
+    code = status_code_of(err)
+    if code is not None:
+        return code == 408 or is_throttle_error(err)
+    return _is_connection_error(err)
+
+
+def retry_after_s(err: BaseException) -> float | None:
+    """Parse `Retry-After` / `retry-after-ms` from an error response, in seconds."""
+    resp = getattr(err, "response", None)
+    headers: Any = getattr(resp, "headers", None)
+    if not headers:
+        return None
+
+    try:
+        raw_ms = headers.get("retry-after-ms")
+        if raw_ms:
+            return max(0.0, float(raw_ms) / 1000.0)
+    except Exception:
+        pass
+
+    raw = headers.get("retry-after")
+    if not raw:
+        return None
+    try:
+        return max(0.0, float(raw))
+    except Exception:
+        pass
+    try:
+        # HTTP-date form.
+        return max(0.0, parsedate_to_datetime(str(raw)).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def backoff_delay_s(attempt: int, *, base_s: float = 1.0, cap_s: float = 30.0) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))."""
+    upper = min(float(cap_s), float(base_s) * (2.0 ** max(0, int(attempt))))
+    return random.uniform(0.0, max(0.0, upper))
+
+
+@dataclass(frozen=True)
+class LimiterStats:
+    limit: int
+    max_limit_seen: int
+    in_flight: int
+    successes: int
+    throttles: int
+    latency_ewma_s: float
+
+
+class AIMDLimiter:
+    """Additive-increase / multiplicative-decrease concurrency limiter.
+
+    - Every `limit` successes with stable latency -> limit += 1 (up to `max_limit`).
+    - A throttle signal (429/5xx) -> limit halves (down to `min_limit`), and new requests are
+      held back until `Retry-After` expires.
+
+    Latency counts as "stable" while a sample stays within `latency_tolerance` x the EWMA
+    baseline; a slowing upstream therefore stops growth before it starts rejecting requests.
+    """
+
+    def __init__(
+        self,
+        *,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: int = 16,
+        latency_tolerance: float = 1.5,
+        adaptive: bool = True,
+    ) -> None:
+        self._min = max(1, int(min_limit))
+        self._max = max(self._min, int(max_limit))
+        self._limit = max(self._min, min(self._max, int(initial)))
+        self._tolerance = max(1.0, float(latency_tolerance))
+        self._adaptive = bool(adaptive)
+
+        self._cond = Condition()
+        self._in_flight = 0
+        self._cooldown_until = 0.0
+        self._last_decrease = 0.0
+        self._successes_since_change = 0
+        self._latency_ewma_s = 0.0
+        self._successes = 0
+        self._throttles = 0
+        self._max_limit_seen = self._limit
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def max_limit(self) -> int:
+        return self._max if self._adaptive else self._limit
+
+    def acquire(self, cancel_event: Event | None = None) -> None:
+        with self._cond:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise RuntimeError("已停止转写。")
+                wait_s = self._cooldown_until - time.monotonic()
+                if wait_s <= 0 and self._in_flight < self._limit:
+                    self._in_flight += 1
+                    return
+                # Wake up periodically to observe cancellation / cooldown expiry.
+                self._cond.wait(timeout=min(0.5, wait_s) if wait_s > 0 else 0.5)
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now (used for optional extra requests)."""
+        with self._cond:
+            if time.monotonic() >= self._cooldown_until and self._in_flight < self._limit:
+                self._in_flight += 1
+                return True
+            return False
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._cond.notify_all()
+
+    def on_success(self, latency_s: float) -> None:
+        with self._cond:
+            self._successes += 1
+            latency_s = max(0.0, float(latency_s))
+            baseline = self._latency_ewma_s
+            self._latency_ewma_s = (
+                latency_s if baseline <= 0 else (0.8 * baseline + 0.2 * latency_s)
+            )
+            if not self._adaptive:
+                return
+            if baseline > 0 and latency_s > baseline * self._tolerance:
+                # Latency is drifting up: hold the current limit.
+                self._successes_since_change = 0
+                return
+            self._successes_since_change += 1
+            if self._successes_since_change >= self._limit and self._limit < self._max:
+                self._limit += 1
+                self._successes_since_change = 0
+                self._max_limit_seen = max(self._max_limit_seen, self._limit)
+                self._cond.notify_all()
+
+    def on_throttle(self, retry_after: float | None = None) -> None:
+        with self._cond:
+            self._throttles += 1
+            old = self._limit
+            now = time.monotonic()
+            # Requests already in flight tend to fail together; halve at most once per
+            # latency window so a single burst of 429s doesn't collapse the limit to 1.
+            window_s = max(1.0, self._latency_ewma_s)
+            if self._adaptive and now - self._last_decrease >= window_s:
+                self._limit = max(self._min, self._limit // 2)
+                self._last_decrease = now
+            self._successes_since_change = 0
+            if retry_after is not None and retry_after > 0:
+                self._cooldown_until = max(self._cooldown_until, now + float(retry_after))
+            new = self._limit
+        if new != old:
+            logger.warning(
+                "上游限流/过载，并发上限调整: %d -> %d, retry_after=%s",
+                old,
+                new,
+                f"{retry_after:.1f}s" if retry_after is not None else "n/a",
+            )
+
+    def stats(self) -> LimiterStats:
+        with self._cond:
+            return LimiterStats(
+                limit=self._limit,
+                max_limit_seen=self._max_limit_seen,
+                in_flight=self._in_flight,
+                successes=self._successes,
+                throttles=self._throttles,
+                latency_ewma_s=self._latency_ewma_s,
+            )
+
+
+__all__ = [
+    "AIMDLimiter",
+    "LimiterStats",
+    "backoff_delay_s",
+    "is_retryable_error",
+    "is_throttle_error",
+    "retry_after_s",
+    "status_code_of",
+]
@@ -0,0 +1,382 @@
+"""Concurrent executor for per-region upstream ASR requests.
+
+Regions are submitted to a thread pool, but the number of requests actually in flight is
+governed by an `AIMDLimiter`. Throttled/transient failures are retried for the affected region
+only (jittered backoff, honoring `Retry-After`), so one 429 no longer aborts the whole job.
+
+With `on_failure`, a region that still fails after its retries is isolated instead of aborting
+the job: the callback records it and supplies a placeholder result, and every other region
+completes normally.
+
+With a `HedgePolicy`, a region whose request runs longer than the job's latency percentile gets
+one duplicate request (within a budget) and the first response wins, so a few stragglers no
+longer decide when a long job finishes.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, field
+from threading import Event, Lock
+from typing import TypeVar
+
+from auto_asr.rate_control import (
+    AIMDLimiter,
+    backoff_delay_s,
+    is_retryable_error,
+    is_throttle_error,
+    retry_after_s,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_MAX_ATTEMPTS = 5
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Per-region retry policy.
+
+    `retryable` classifies errors; anything it rejects fails the region immediately.
+    """
+
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    backoff_base_s: float = 1.0
+    backoff_cap_s: float = 30.0
+    retryable: Callable[[BaseException], bool] = field(default=is_retryable_error)
+
+
+@dataclass(frozen=True)
+class HedgePolicy:
+    """When to duplicate a straggling request.
+
+    A hedge is sent once a request has been running longer than the `percentile` of this job's
+    observed latencies (after `min_samples` successes), for at most `budget_ratio` of the tasks.
+    """
+
+    percentile: float = 0.95
+    budget_ratio: float = 0.1
+    min_samples: int = 5
+
+
+@dataclass(frozen=True)
+class HedgeStats:
+    issued: int
+    won: int
+    saved_s: float
+
+
+class _HedgeTracker:
+    """Per-job latency distribution, hedge budget and hedge statistics."""
+
+    def __init__(self, policy: HedgePolicy, total_tasks: int) -> None:
+        self._policy = policy
+        self._lock = Lock()
+        self._latencies: list[float] = []
+        ratio = max(0.0, float(policy.budget_ratio))
+        self._budget = max(1, int(total_tasks * ratio)) if ratio > 0 else 0
+        self._issued = 0
+        self._won = 0
+        # One (hedge answered, losing primary finished) interval per won hedge; the end stays
+        # None while the primary is still running.
+        self._wins: list[list[float | None]] = []
+        self._ended_at: float | None = None
+
+    @property
+    def percentile(self) -> float:
+        return min(1.0, max(0.0, float(self._policy.percentile)))
+
+    def record(self, latency_s: float) -> None:
+        with self._lock:
+            self._latencies.append(max(0.0, float(latency_s)))
+
+    def threshold_s(self) -> float | None:
+        with self._lock:
+            if len(self._latencies) < max(1, int(self._policy.min_samples)):
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def try_take(self) -> bool:
+        with self._lock:
+            if self._issued >= self._budget:
+                return False
+            self._issued += 1
+            return True
+
+    def hedge_won(self, primary: Future) -> None:
+        win: list[float | None] = [time.monotonic(), None]
+        with self._lock:
+            self._won += 1
+            self._wins.append(win)
+
+        def _done(_f: Future) -> None:
+            with self._lock:
+                win[1] = time.monotonic()
+
+        primary.add_done_callback(_done)
+
+    def finish(self) -> HedgeStats:
+        """Freeze the stats at the end of the job (losing primaries may still be running).
+
+        `saved_s` is the wall time inside the job during which at least one region had its
+        answer from a hedge while its primary was still running; parallel regions saving the
+        same second count it once. It is a lower bound: a primary still running when the job
+        ends only counts up to that point.
+        """
+        with self._lock:
+            if self._ended_at is None:
+                self._ended_at = time.monotonic()
+            end = self._ended_at
+            spans = sorted((float(a), min(end, b if b is not None else end)) for a, b in self._wins)
+            issued, won = self._issued, self._won
+        saved_s = 0.0
+        cur_start = cur_end = None
+        for a, b in spans:
+            if cur_end is None or a > cur_end:
+                if cur_end is not None:
+                    saved_s += cur_end - cur_start
+                cur_start, cur_end = a, b
+            else:
+                cur_end = max(cur_end, b)
+        if cur_end is not None:
+            saved_s += cur_end - cur_start
+        return HedgeStats(issued=issued, won=won, saved_s=max(0.0, saved_s))
+
+
+def _check_cancel(cancel_event: Event | None) -> None:
+    if cancel_event is not None and cancel_event.is_set():
+        raise RuntimeError("已停止转写。")
+
+
+def _sleep(delay_s: float, cancel_event: Event | None) -> None:
+    if delay_s <= 0:
+        return
+    if cancel_event is None:
+        time.sleep(delay_s)
+        return
+    if cancel_event.wait(delay_s):
+        raise RuntimeError("已停止转写。")
+
+
+def run_region_tasks(
+    tasks: Sequence[T],
+    worker: Callable[[T], R],
+    *,
+    limiter: AIMDLimiter,
+    cancel_event: Event | None = None,
+    policy: RetryPolicy | None = None,
+    on_result: Callable[[int, R], None] | None = None,
+    on_failure: Callable[[int, BaseException, int], R] | None = None,
+    hedge: HedgePolicy | None = None,
+    on_hedge_stats: Callable[[HedgeStats], None] | None = None,
+    label: str = "语音段",
+) -> list[R]:
+    """Run `worker(task)` for every task concurrently and return results in task order.
+
+    A region that hits a non-retryable error (or exhausts `policy.max_attempts`) raises, unless
+    `on_failure(index, error, attempts)` is given: then its return value is used as that region's
+    result and the remaining regions keep running. Cancellation always raises.
+    `on_result(index, result)` is called from the calling thread as successful results complete.
+    With `hedge`, straggling requests are duplicated per `HedgePolicy`; the final `HedgeStats`
+    are passed to `on_hedge_stats`. `worker` must then be safe to run twice for the same task.
+    """
+    policy = policy or RetryPolicy()
+    max_attempts = max(1, int(policy.max_attempts))
+    failed: set[int] = set()
+    pool_size = max(1, min(limiter.max_limit, len(tasks) or 1))
+    tracker = _HedgeTracker(hedge, len(tasks)) if hedge is not None else None
+    # Hedged requests run on their own pool so the region thread can wait on both copies.
+    hedge_pool = ThreadPoolExecutor(max_workers=pool_size * 2) if tracker is not None else None
+
+    def _call(idx: int, item: T) -> R:
+        try:
+            return worker(item)
+        finally:
+            limiter.release()
+
+    # Set when the job ends: hedge-pool copies that haven't started yet must not start.
+    job_done = Event()
+
+    def _copy(item: T) -> R:
+        if job_done.is_set():
+            raise RuntimeError(f"{label}任务已结束，跳过请求副本")
+        _check_cancel(cancel_event)
+        return worker(item)
+
+    def _copy_done(f: Future) -> None:
+        # Every copy holds its limiter slot until it actually finishes, even if it lost, and
+        # every throttled copy slows the limiter down, including one whose twin succeeded.
+        limiter.release()
+        err = None if f.cancelled() else f.exception()
+        if err is not None and is_throttle_error(err):
+            limiter.on_throttle(retry_after_s(err))
+
+    def _call_hedged(
+        idx: int, item: T, tracker: _HedgeTracker, hedge_pool: ThreadPoolExecutor
+    ) -> R:
+        primary = hedge_pool.submit(_copy, item)
+        primary.add_done_callback(_copy_done)
+        pending: set[Future] = {primary}
+        started = time.monotonic()
+        hedged: Future | None = None
+        first_error: BaseException | None = None
+        while pending:
+            timeout = 0.5
+            if hedged is None and first_error is None:
+                # The threshold follows the job's latency distribution as it fills in.
+                threshold = tracker.threshold_s()
+                elapsed = time.monotonic() - started
+                if threshold is not None and elapsed >= threshold:
+                    # Hedges only use spare capacity and budget; otherwise keep waiting and
+                    # re-check on the next wake-up.
+                    if limiter.try_acquire():
+                        if tracker.try_take():
+                            logger.info(
+                                "%s %d 已请求 %.1fs(>p%d=%.1fs)，发起对冲请求",
+                                label,
+                                idx + 1,
+                                elapsed,
+                                int(tracker.percentile * 100),
+                                threshold,
+                            )
+                            hedged = hedge_pool.submit(_copy, item)
+                            hedged.add_done_callback(_copy_done)
+                            pending.add(hedged)
+                        else:
+                            limiter.release()
+                elif threshold is not None:
+                    timeout = min(timeout, threshold - elapsed)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            _check_cancel(cancel_event)
+            for f in done:
+                err = f.exception()
+                if err is None:
+                    if f is hedged and primary in pending:
+                        tracker.hedge_won(primary)
+                    return f.result()
+                if first_error is None or f is primary:
+                    first_error = err
+        raise first_error or RuntimeError(f"{label} {idx + 1} 请求失败")
+
+    def _run_one(idx: int, item: T) -> R:
+        attempt = 0
+        while True:
+            limiter.acquire(cancel_event)
+            started = time.monotonic()
+            try:
+                if tracker is None or hedge_pool is None:
+                    out = _call(idx, item)
+                else:
+                    out = _call_hedged(idx, item, tracker, hedge_pool)
+            except Exception as e:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise
+                if not policy.retryable(e) or attempt + 1 >= max_attempts:
+                    if on_failure is None:
+                        raise
+                    logger.warning(
+                        "%s %d 最终失败(已尝试 %d 次)，记录为失败段: %s",
+                        label,
+                        idx + 1,
+                        attempt + 1,
+                        e,
+                    )
+                    failed.add(idx)
+                    return on_failure(idx, e, attempt + 1)
+                retry_after = retry_after_s(e)
+                if is_throttle_error(e) and tracker is None:
+                    # Hedged copies already reported their throttling in `_copy_done`.
+                    limiter.on_throttle(retry_after)
+                delay_s = max(
+                    retry_after or 0.0,
+                    backoff_delay_s(
+                        attempt, base_s=policy.backoff_base_s, cap_s=policy.backoff_cap_s
+                    ),
+                )
+                logger.warning(
+                    "%s %d 请求失败(第 %d/%d 次)，%.1fs 后重试: %s",
+                    label,
+                    idx + 1,
+                    attempt + 1,
+                    max_attempts,
+                    delay_s,
+                    e,
+                )
+                _sleep(delay_s, cancel_event)
+                attempt += 1
+                continue
+            latency_s = time.monotonic() - started
+            limiter.on_success(latency_s)
+            if tracker is not None:
+                tracker.record(latency_s)
+            return out
+
+    results: dict[int, R] = {}
+    ex = ThreadPoolExecutor(max_workers=pool_size)
+    futures = {ex.submit(_run_one, i, t): i for i, t in enumerate(tasks)}
+    cancelled = False
+    try:
+        for fut in as_completed(futures):
+            if cancel_event is not None and cancel_event.is_set():
+                cancelled = True
+                break
+            idx = futures[fut]
+            results[idx] = fut.result()
+            if on_result is not None and idx not in failed:
+                on_result(idx, results[idx])
+    finally:
+        if cancelled:
+            for f in futures:
+                f.cancel()
+            ex.shutdown(wait=False, cancel_futures=True)
+        else:
+            ex.shutdown(wait=True, cancel_futures=True)
+        job_done.set()
+        hedge_stats = tracker.finish() if tracker is not None else None
+        if hedge_pool is not None:
+            # Don't wait for losing copies still in flight: that would give back the tail
+            # latency the hedge just saved. They finish (or fail) in the background.
+            hedge_pool.shutdown(wait=False, cancel_futures=True)
+
+    _check_cancel(cancel_event)
+
+    if hedge_stats is not None:
+        logger.info(
+            "%s对冲请求: issued=%d, won=%d, saved=%.1fs",
+            label,
+            hedge_stats.issued,
+            hedge_stats.won,
+            hedge_stats.saved_s,
+        )
+        if on_hedge_stats is not None:
+            on_hedge_stats(hedge_stats)
+
+    stats = limiter.stats()
+    logger.info(
+        "%s并发执行完成: tasks=%d, failed=%d, limit=%d(max_seen=%d), throttles=%d, "
+        "latency_ewma=%.2fs",
+        label,
+        len(tasks),
+        len(failed),
+        stats.limit,
+        stats.max_limit_seen,
+        stats.throttles,
+        stats.latency_ewma_s,
+    )
+    return [results[i] for i in range(len(tasks))]
+
+
+__all__ = [
+    "DEFAULT_MAX_ATTEMPTS",
+    "HedgePolicy",
+    "HedgeStats",
+    "RetryPolicy",
+    "run_region_tasks",
+]
@@ -0,0 +1,155 @@
+"""Thread and allocator settings for local (torch) inference.
+
+By default torch sizes its intra-op pool to every core, so FunASR/Qwen3 inference competes with
+VAD and the Gradio worker threads, and the allocators run with library defaults. The settings
+here are applied at model load and before each inference call, so runs get predictable
+throughput:
+
+- `funasr_threads` / `qwen3_threads`: `torch.set_num_threads` while that backend runs (0 keeps
+  the torch default). torch's pool is process-wide, so the backend in use sets it.
+- `interop_threads`: `torch.set_num_interop_threads`, applied once (torch only accepts it
+  before the first parallel op).
+- `allocator_env`: environment variables such as `PYTORCH_CUDA_ALLOC_CONF` or
+  `MALLOC_ARENA_MAX`, set if not already present. CUDA allocator settings take effect if set
+  before the first CUDA allocation; glibc malloc settings only affect child processes (the
+  FunASR CPU pool and the inference server), which inherit the environment.
+- `warmup`: run one deterministic pass (1 s of silence) right after a model loads, so the first
+  real region doesn't pay for lazy kernel/graph initialization.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+from collections.abc import Mapping
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Environment variables shown in the startup report.
+_REPORTED_ENV = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MALLOC_ARENA_MAX",
+    "MALLOC_TRIM_THRESHOLD_",
+    "PYTORCH_CUDA_ALLOC_CONF",
+)
+
+
+@dataclass(frozen=True)
+class RuntimeTuning:
+    funasr_threads: int = 0
+    qwen3_threads: int = 0
+    interop_threads: int = 0
+    allocator_env: tuple[tuple[str, str], ...] = ()
+    warmup: bool = True
+
+
+_TUNING = RuntimeTuning()
+_INTEROP_APPLIED = False
+_LOCK = Lock()
+
+
+def tuning_from_config(config: Mapping[str, Any]) -> RuntimeTuning:
+    """Read `runtime_*` keys of the saved config (invalid values fall back to defaults)."""
+
+    def _threads(key: str) -> int:
+        try:
+            return max(0, min(256, int(config.get(key) or 0)))
+        except Exception:
+            return 0
+
+    env = config.get("runtime_allocator_env")
+    return RuntimeTuning(
+        funasr_threads=_threads("runtime_funasr_threads"),
+        qwen3_threads=_threads("runtime_qwen3_threads"),
+        interop_threads=_threads("runtime_interop_threads"),
+        allocator_env=tuple(
+            (str(k), str(v)) for k, v in (env.items() if isinstance(env, dict) else [])
+        ),
+        warmup=bool(config.get("runtime_warmup", True)),
+    )
+
+
+def configure_runtime_tuning(tuning: RuntimeTuning) -> None:
+    global _TUNING
+    with _LOCK:
+        _TUNING = tuning
+    for key, value in tuning.allocator_env:
+        if key in os.environ and os.environ[key] != value:
+            logger.info("运行时环境变量已存在，保留原值: %s=%s", key, os.environ[key])
+            continue
+        os.environ[key] = value
+    _apply_interop(tuning)
+
+
+def get_runtime_tuning() -> RuntimeTuning:
+    return _TUNING
+
+
+def _apply_interop(tuning: RuntimeTuning) -> None:
+    global _INTEROP_APPLIED
+    if tuning.interop_threads <= 0 or _INTEROP_APPLIED:
+        return
+    try:
+        import torch  # type: ignore
+    except Exception:
+        return
+    with _LOCK:
+        if _INTEROP_APPLIED:
+            return
+        _INTEROP_APPLIED = True
+        try:
+            torch.set_num_interop_threads(int(tuning.interop_threads))
+        except RuntimeError as e:
+            # Already started parallel work in this process; keep torch's value.
+            logger.warning("设置 interop 线程数失败(已忽略): %s", e)
+
+
+def apply_backend_threads(backend: str) -> None:
+    """Set torch's intra-op thread count for `backend` ("funasr" / "qwen3"), if configured."""
+    tuning = _TUNING
+    threads = tuning.funasr_threads if backend == "funasr" else tuning.qwen3_threads
+    _apply_interop(tuning)
+    if threads <= 0:
+        return
+    with contextlib.suppress(Exception):
+        import torch  # type: ignore
+
+        if torch.get_num_threads() != threads:
+            torch.set_num_threads(int(threads))
+
+
+def runtime_report() -> str:
+    """One-line summary of the effective settings (configured values and what torch reports)."""
+    tuning = _TUNING
+    parts = [
+        f"funasr_threads={tuning.funasr_threads or 'default'}",
+        f"qwen3_threads={tuning.qwen3_threads or 'default'}",
+        f"warmup={'on' if tuning.warmup else 'off'}",
+        f"cpu_count={os.cpu_count()}",
+    ]
+    try:
+        import torch  # type: ignore
+
+        parts.append(f"torch_threads={torch.get_num_threads()}")
+        parts.append(f"torch_interop={torch.get_num_interop_threads()}")
+    except Exception:
+        parts.append("torch=unavailable")
+    env = [f"{k}={os.environ[k]}" for k in _REPORTED_ENV if k in os.environ]
+    parts.append(f"env=[{', '.join(env)}]")
+    return ", ".join(parts)
+
+
+__all__ = [
+    "RuntimeTuning",
+    "apply_backend_threads",
+    "configure_runtime_tuning",
+    "get_runtime_tuning",
+    "runtime_report",
+    "tuning_from_config",
+]
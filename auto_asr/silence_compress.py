@@ -0,0 +1,110 @@
+"""Remove long silences from a chunk before upload, and map timestamps back afterwards.
+
+Chunk-mode uploads are 2-3 minutes long and often contain long pauses, which still cost upload
+bytes, billed audio seconds and upstream compute. Given the speech spans of a chunk, every gap
+longer than `min_silence_s` is shortened to `keep_silence_s` (half kept on each side so word
+edges and the pause itself stay audible). The returned `OffsetMap` converts times on the
+compressed audio (as returned by the ASR endpoint) back to the original chunk timeline.
+"""
+
+from __future__ import annotations
+
+import bisect
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+import numpy as np
+
+from auto_asr.audio_tools import WAV_SAMPLE_RATE
+
+
+@dataclass(frozen=True)
+class OffsetMap:
+    """Piecewise-linear map from compressed time to original time (both in seconds)."""
+
+    # Parallel lists, one entry per kept piece, sorted by time.
+    compressed_starts: tuple[float, ...]
+    original_starts: tuple[float, ...]
+    durations: tuple[float, ...]
+    original_duration_s: float = 0.0
+
+    @property
+    def removed_s(self) -> float:
+        if not self.durations:
+            return 0.0
+        return max(0.0, self.original_duration_s - sum(self.durations))
+
+    def to_original(self, t: float) -> float:
+        if not self.compressed_starts:
+            return t
+        i = max(0, bisect.bisect_right(self.compressed_starts, t) - 1)
+        offset = min(max(0.0, t - self.compressed_starts[i]), self.durations[i])
+        return self.original_starts[i] + offset
+
+
+def compress_silence(
+    wav: np.ndarray,
+    speech_spans: Sequence[tuple[int, int]],
+    *,
+    min_silence_s: float = 2.0,
+    keep_silence_s: float = 0.5,
+    sample_rate: int = WAV_SAMPLE_RATE,
+) -> tuple[np.ndarray, OffsetMap]:
+    """Shorten silences longer than `min_silence_s` (leading/trailing ones included).
+
+    `speech_spans` are (start, end) sample offsets within `wav`.
+    """
+    total = len(wav)
+    min_gap = max(0, int(float(min_silence_s) * sample_rate))
+    keep = max(0, int(float(keep_silence_s) * sample_rate))
+    keep = min(keep, min_gap)
+
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted((max(0, int(s)), min(total, int(e))) for (s, e) in speech_spans):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    if not merged:
+        return wav, OffsetMap((), (), ())
+
+    # Silences between (and around) speech; each long one loses its middle part.
+    bounds = [0, *[x for span in merged for x in span], total]
+    head = keep - keep // 2
+    tail = keep // 2
+    removed: list[tuple[int, int]] = []
+    for gap_start, gap_end in zip(bounds[0::2], bounds[1::2], strict=True):
+        if gap_end - gap_start > min_gap:
+            removed.append((gap_start + head, gap_end - tail))
+
+    pieces: list[tuple[int, int]] = []
+    cursor = 0
+    for r_start, r_end in removed:
+        if r_start > cursor:
+            pieces.append((cursor, r_start))
+        cursor = r_end
+    if cursor < total:
+        pieces.append((cursor, total))
+
+    compressed_starts: list[float] = []
+    original_starts: list[float] = []
+    durations: list[float] = []
+    out_pos = 0
+    for start, end in pieces:
+        compressed_starts.append(out_pos / float(sample_rate))
+        original_starts.append(start / float(sample_rate))
+        durations.append((end - start) / float(sample_rate))
+        out_pos += end - start
+
+    compressed = np.concatenate([wav[s:e] for (s, e) in pieces]) if pieces else wav
+    return compressed, OffsetMap(
+        compressed_starts=tuple(compressed_starts),
+        original_starts=tuple(original_starts),
+        durations=tuple(durations),
+        original_duration_s=total / float(sample_rate),
+    )
+
+
+__all__ = ["OffsetMap", "compress_silence"]
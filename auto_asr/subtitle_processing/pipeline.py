@@ -8,9 +8,10 @@ from dataclasses import dataclass
 from pathlib import Path
 from threading import Lock
 
-from openai import OpenAI
-
+from auto_asr.endpoint_limits import estimate_chat_tokens, get_endpoint_limiter
+from auto_asr.http_pool import get_openai_client
 from auto_asr.llm.client import call_chat_json_agent_loop, normalize_base_url
+from auto_asr.rate_control import retry_after_s, status_code_of
 from auto_asr.subtitle_io import load_subtitle_file
 from auto_asr.subtitle_processing.base import ProcessorContext, get_processor
 from auto_asr.subtitles import SubtitleLine, compose_srt, compose_vtt
@@ -30,14 +31,26 @@ def _write_text(path: Path, text: str) -> None:
     path.write_text(text, encoding="utf-8")
 
 
+def _max_connections(options: dict | None) -> int | None:
+    # Processors run up to `concurrency` LLM requests at once; size the pool to match.
+    try:
+        cc = int((options or {}).get("concurrency") or 0)
+    except Exception:
+        return None
+    return max(1, min(32, cc)) if cc > 0 else None
+
+
 def _make_openai_chat_json(
     *,
     api_key: str,
     base_url: str | None,
     llm_model: str,
     llm_temperature: float = 0.2,
+    max_connections: int | None = None,
 ) -> Callable[..., dict[str, str]]:
-    chat_fn = _make_openai_chat_fn(api_key=api_key, base_url=base_url)
+    chat_fn = _make_openai_chat_fn(
+        api_key=api_key, base_url=base_url, max_connections=max_connections
+    )
 
     def chat_json(*, system_prompt: str, payload: dict[str, str], **kwargs) -> dict[str, str]:
         temperature = float(kwargs.get("temperature", llm_temperature))
@@ -54,7 +67,7 @@ def _make_openai_chat_json(
     return chat_json
 
 
-def _make_openai_chat_fn(*, api_key: str, base_url: str | None):
+def _make_openai_chat_fn(*, api_key: str, base_url: str | None, max_connections: int | None = None):
     api_key = (api_key or "").strip()
     if not api_key:
         raise RuntimeError("请在 Web UI 中填写 OpenAI API Key。")
@@ -63,34 +76,27 @@ def _make_openai_chat_fn(*, api_key: str, base_url: str | None):
     if base_url and base_url.strip():
         base_url_norm = normalize_base_url(base_url)
 
-    client = (
-        OpenAI(api_key=api_key, base_url=base_url_norm)
-        if base_url_norm
-        else OpenAI(api_key=api_key)
+    # Pooled client shared with ASR (and other jobs) for the same endpoint/key.
+    client = get_openai_client(
+        api_key=api_key, base_url=base_url_norm, max_connections=max_connections
     )
 
+    # Shared with ASR and other jobs hitting the same endpoint (None if no limits configured).
+    endpoint = get_endpoint_limiter(client.base_url)
+
     # Basic progressive backoff for rate limits:
-    # - On 429: sleep 2s -> 4s -> 8s -> ... up to 10s
+    # - On 429: sleep 2s -> 4s -> 8s -> ... up to 10s (or `Retry-After`, if longer)
     # - On any successful request: reset backoff to 2s
     # - On 401/403: fail fast
     backoff_lock = Lock()
     backoff_s = 2.0
 
-    def _status_code(err: BaseException) -> int | None:
-        code = getattr(err, "status_code", None)
-        if isinstance(code, int):
-            return code
-        resp = getattr(err, "response", None)
-        if resp is not None:
-            code = getattr(resp, "status_code", None)
-            if isinstance(code, int):
-                return code
-        return None
-
     def chat_fn(messages, *, model: str, temperature: float):
         nonlocal backoff_s
 
         while True:
+            if endpoint is not None:
+                endpoint.acquire(tokens=estimate_chat_tokens(messages))
             try:
                 resp = client.chat.completions.create(
                     model=model,
@@ -103,19 +109,22 @@ def _make_openai_chat_fn(*, api_key: str, base_url: str | None):
 
                 return resp.choices[0].message.content or ""
             except Exception as e:
-                code = _status_code(e)
+                code = status_code_of(e)
                 if code in {401, 403}:
                     err = RuntimeError(f"LLM 提供商鉴权失败（HTTP {code}）。")
                     with contextlib.suppress(Exception):
                         err.status_code = int(code)  # type: ignore[attr-defined]
                     raise err from e
                 if code == 429:
+                    retry_after = retry_after_s(e)
                     with backoff_lock:
                         delay_s = max(0.0, min(10.0, float(backoff_s)))
                         backoff_s = min(backoff_s * 2.0, 10.0)
-                    logger.warning(
-                        "LLM 请求触发限流(HTTP 429)，将暂停 %.1fs 后重试（最大 10s）。", delay_s
-                    )
+                    delay_s = max(delay_s, retry_after or 0.0)
+                    if endpoint is not None:
+                        # Hold back ASR and other LLM callers of this endpoint as well.
+                        endpoint.pause(retry_after)
+                    logger.warning("LLM 请求触发限流(HTTP 429)，将暂停 %.1fs 后重试。", delay_s)
                     time.sleep(delay_s)
                     continue
                 raise
@@ -129,8 +138,11 @@ def _make_openai_chat_text(
     base_url: str | None,
     llm_model: str,
     llm_temperature: float = 0.2,
+    max_connections: int | None = None,
 ) -> Callable[..., str]:
-    chat_fn = _make_openai_chat_fn(api_key=api_key, base_url=base_url)
+    chat_fn = _make_openai_chat_fn(
+        api_key=api_key, base_url=base_url, max_connections=max_connections
+    )
 
     def chat_text(
         *,
@@ -175,6 +187,7 @@ def process_subtitle_file(
     """
     processor_cls = get_processor(processor)
     proc = processor_cls()
+    max_connections = _max_connections(options)
 
     in_path_p = Path(in_path)
     lines: list[SubtitleLine] = load_subtitle_file(str(in_path_p))
@@ -191,6 +204,7 @@ def process_subtitle_file(
             base_url=openai_base_url,
             llm_model=(llm_model or "").strip() or "gpt-4o-mini",
             llm_temperature=float(llm_temperature),
+            max_connections=max_connections,
         )
 
     if chat_json is None:
@@ -199,6 +213,7 @@ def process_subtitle_file(
             base_url=openai_base_url,
             llm_model=(llm_model or "").strip() or "gpt-4o-mini",
             llm_temperature=float(llm_temperature),
+            max_connections=max_connections,
         )
 
     ctx = ProcessorContext(chat_json=chat_json, chat_text=chat_text)
@@ -247,6 +262,13 @@ def process_subtitle_file_multi(
 
     in_path_p = Path(in_path)
     lines: list[SubtitleLine] = load_subtitle_file(str(in_path_p))
+    max_connections = (
+        max(
+            (_max_connections(opts) or 0 for opts in (options_by_processor or {}).values()),
+            default=0,
+        )
+        or None
+    )
 
     if chat_text is None and chat_json is not None:
         def chat_text(*, system_prompt: str, user_prompt: str, **kwargs) -> str:
@@ -259,6 +281,7 @@ def process_subtitle_file_multi(
             base_url=openai_base_url,
             llm_model=(llm_model or "").strip() or "gpt-4o-mini",
             llm_temperature=float(llm_temperature),
+            max_connections=max_connections,
         )
 
     if chat_json is None:
@@ -267,6 +290,7 @@ def process_subtitle_file_multi(
             base_url=openai_base_url,
             llm_model=(llm_model or "").strip() or "gpt-4o-mini",
             llm_temperature=float(llm_temperature),
+            max_connections=max_connections,
         )
 
     ctx = ProcessorContext(chat_json=chat_json, chat_text=chat_text)